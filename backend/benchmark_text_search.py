@@ -0,0 +1,131 @@
+# backend/benchmark_text_search.py
+# Compares ILIKE scans with the tsvector + GIN search from migration 008 on a synthetic corpus
+#
+#   python benchmark_text_search.py --database-url postgresql://... [--rows 100000]
+#
+# Everything is created in a scratch schema (dropped afterwards unless --keep).
+
+import argparse
+import os
+import random
+import statistics
+import string
+import time
+
+from sqlalchemy import create_engine, text
+
+SCHEMA = "fts_bench"
+
+def make_vocabulary(size: int, rng: random.Random):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10))))
+    return sorted(words)
+
+def make_corpus(rows: int, words_per_doc: int, vocabulary, rng: random.Random):
+    # Zipf-like word frequencies, like real text
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+    for doc in range(rows):
+        body = " ".join(rng.choices(vocabulary, weights=weights, k=rng.randint(words_per_doc // 2, words_per_doc * 3 // 2)))
+        filename = f"{rng.choice(vocabulary)}_{rng.choice(vocabulary)}_{doc}.pdf"
+        yield {"filename": filename, "body": body}
+
+def load(engine, rows: int, words_per_doc: int, seed: int):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(20000, rng)
+    with engine.begin() as conn:
+        conn.execute(text(f"drop schema if exists {SCHEMA} cascade"))
+        conn.execute(text(f"create schema {SCHEMA}"))
+        conn.execute(text(f"""
+            create table {SCHEMA}.docs (
+                id bigserial primary key,
+                filename text not null,
+                body text not null,
+                search_vector tsvector
+            )"""))
+
+    started = time.time()
+    batch = []
+    with engine.begin() as conn:
+        for row in make_corpus(rows, words_per_doc, vocabulary, rng):
+            batch.append(row)
+            if len(batch) == 2000:
+                conn.execute(text(f"insert into {SCHEMA}.docs (filename, body) values (:filename, :body)"), batch)
+                batch = []
+        if batch:
+            conn.execute(text(f"insert into {SCHEMA}.docs (filename, body) values (:filename, :body)"), batch)
+    print(f"📦 Loaded {rows:,} documents in {time.time() - started:.1f}s")
+
+    started = time.time()
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            update {SCHEMA}.docs set search_vector =
+                setweight(to_tsvector('english', regexp_replace(filename, '[_.\\-]+', ' ', 'g')), 'A') ||
+                setweight(to_tsvector('english', body), 'C')"""))
+        conn.execute(text(f"create index docs_search_vector on {SCHEMA}.docs using gin (search_vector)"))
+        conn.execute(text(f"analyze {SCHEMA}.docs"))
+    print(f"🗂️ Built tsvectors and GIN index in {time.time() - started:.1f}s")
+    return vocabulary
+
+def timed(conn, sql: str, params: dict, repeats: int):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        rows = conn.execute(text(sql), params).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), len(rows)
+
+def benchmark(engine, vocabulary, repeats: int):
+    # Same shape as the old ILIKE listing: a total count plus the first page
+    ilike_sql = f"""
+        select count(*) over () as total, id, filename from {SCHEMA}.docs
+         where filename ilike :pattern or body ilike :pattern
+         limit 20"""
+    fts_sql = f"""
+        select id, filename, ts_rank_cd(search_vector, query) as rank,
+               ts_headline('english', left(body, 100000), query, 'MaxFragments=2, MaxWords=30, MinWords=10')
+          from (select id, filename, body, search_vector, query
+                  from {SCHEMA}.docs, websearch_to_tsquery('english', :query) query
+                 where search_vector @@ query
+                 order by ts_rank_cd(search_vector, query) desc, id desc
+                 limit 20) page"""
+
+    # Vocabulary is sorted alphabetically, so frequency rank is the Zipf rank used when generating
+    cases = [
+        ("common word", vocabulary[10]),
+        ("mid-frequency word", vocabulary[1000]),
+        ("rare word", vocabulary[15000]),
+        ("two words", f"{vocabulary[500]} {vocabulary[2000]}"),
+        ("no match", "zzzzqqqq"),
+    ]
+
+    print(f"\n{'query':<22}{'ILIKE ms':>12}{'FTS ms':>12}{'speedup':>10}")
+    with engine.connect() as conn:
+        for label, query in cases:
+            ilike_ms, _ = timed(conn, ilike_sql, {"pattern": f"%{query.split()[0]}%"}, repeats)
+            fts_ms, _ = timed(conn, fts_sql, {"query": query}, repeats)
+            print(f"{label:<22}{ilike_ms:>12.1f}{fts_ms:>12.1f}{ilike_ms / max(fts_ms, 0.001):>9.1f}x")
+    print("\nILIKE returns unranked substring matches; FTS returns the top 20 by rank with highlighted snippets.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ILIKE vs tsvector full-text search")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"))
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--words", type=int, default=200, help="Average words per document")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url (or DATABASE_URL) is required")
+
+    engine = create_engine(args.database_url)
+    print("🔍 Benchmarking ILIKE vs full-text search...")
+    try:
+        vocabulary = load(engine, args.rows, args.words, args.seed)
+        benchmark(engine, vocabulary, args.repeats)
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"drop schema if exists {SCHEMA} cascade"))
+    print("🎉 Benchmark complete.")
@@ -49,7 +49,7 @@
 
 # backend/config/settings.py
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Dict, List
 import os
 
 class Settings(BaseSettings):
@@ -69,22 +69,135 @@ class Settings(BaseSettings):
     
     # LLM Configuration - FIXED: Added type annotation
     gemini_api_key: str  # This will automatically read from GEMINI_API_KEY env var
+    gemini_base_url: str = "https://generativelanguage.googleapis.com"  # Point at a stub server in tests
+    gemini_timeout: float = 30.0  # Per-call deadline in seconds
+    gemini_max_connections: int = 20  # Pooled keep-alive connections to the Gemini API
     max_tokens: int = 2000
     
     # Embedding Configuration
     embedding_model: str = "all-MiniLM-L6-v2"
     embedding_dimension: int = 384
+    embedding_hashing_dimension: int = 2048  # Fallback hashing embeddings when sentence-transformers isn't installed
+    embedding_max_chars: int = 4000  # Text embedded per document/query
+    
+    # Local subject classifier (nearest centroid, tried before Gemini)
+    enable_local_classifier: bool = True
+    subject_classifier_min_similarity: float = 0.2  # Best centroid must be at least this similar
+    subject_classifier_min_margin: float = 0.05  # ...and lead the runner-up by this much
+    subject_classifier_keyword_weight: float = 0.3  # Keyword text share of a centroid once documents exist
+    subject_classifier_docs_per_subject: int = 200  # Assigned documents averaged into each centroid
+    
+    # Semantic search (passage vectors in a memory-mapped matrix)
+    search_index_path: str = "cache/search_index"
+    search_passage_tokens: int = 256
+    search_passage_overlap_tokens: int = 32
+    search_ivf_threshold: int = 50000  # Passages above which queries use the approximate IVF index
+    search_ivf_nprobe: int = 8  # IVF lists scanned per query
+    related_documents_k: int = 10  # Neighbours kept per document in the related-documents graph
+    related_documents_sync_overlap: float = 60.0  # Seconds of vectors re-read on each sync, for writes that commit late
+    
+    # Local keyword extraction (TF-IDF keyphrases used as classification tags)
+    keyword_tags_count: int = 8
+    keyword_stats_path: str = "cache/keyword_stats.sqlite3"  # Corpus document frequencies; empty for memory only
+    keyword_stats_refresh_interval: float = 60.0  # seconds between reloads of other processes' counts
+    
+    # Prompt excerpts (most informative passages instead of the first N characters)
+    classification_excerpt_tokens: int = 750  # per document in classify_topic / classify_batch
+    subject_suggestion_excerpt_tokens: int = 400
+    excerpt_passage_tokens: int = 96  # Size of the passages excerpts are built from
+    
+    # LLM usage accounting and daily budget
+    llm_daily_token_budget: int = 0  # Tokens per UTC day across all workers; 0 for no budget
+    llm_budget_defer_ratio: float = 0.9  # Background (non-interactive) tasks wait once this share is used
+    llm_usage_flush_interval: float = 30.0  # seconds between usage rollup writes
+    
+    # Model routing (light model for small inputs, fallbacks on errors, escalation on low confidence)
+    llm_light_model: str = "gemini-1.5-flash-8b"
+    llm_standard_model: str = "gemini-1.5-flash"
+    llm_strong_model: str = "gemini-1.5-pro"
+    router_light_max_tokens: int = 2000  # Largest prompt a light task sends to the light model
+    router_escalation_confidence: float = 0.6  # Classifications below this are re-asked on the strong model
+    llm_model_prices: Dict[str, List[float]] = {  # USD per 1M input / output tokens
+        "gemini-1.5-flash-8b": [0.0375, 0.15],
+        "gemini-1.5-flash": [0.075, 0.30],
+        "gemini-1.5-pro": [1.25, 5.00]
+    }
+    
+    # Near-duplicate detection (MinHash + LSH over character shingles)
+    enable_near_duplicates: bool = True
+    near_duplicate_threshold: float = 0.7  # Estimated Jaccard similarity to reuse another document's results
+    near_duplicate_bands: int = 32
+    near_duplicate_rows: int = 4  # bands x rows = MinHash permutations
+    near_duplicate_shingle_size: int = 5
+    near_duplicate_min_chars: int = 200  # Shorter texts match too easily by chance
     
     # Processing Settings
     max_chunk_size: int = 2000
     max_summary_length: int = 500
-    background_processing_enabled: bool = True
+    background_processing_enabled: bool = True  # Master switch: False stops task processing in the API and in workers
+    # Whether the API process also runs the processor; unset follows background_processing_enabled.
+    # Set False when running `python -m services.worker` separately. Never overrides the master switch.
+    api_background_processing: Optional[bool] = None
+    extraction_max_workers: int = 2  # Process pool size for OCR/PDF extraction
+    worker_max_concurrent_tasks: Optional[int] = None  # Overrides max_concurrent_tasks in the worker
+    worker_health_port: int = 8081
     max_retry_attempts: int = 3
     
+    # Adaptive LLM concurrency (AIMD)
+    initial_concurrent_tasks: int = 3
+    min_concurrent_tasks: int = 1
+    max_concurrent_tasks: int = 16
+    llm_latency_target: float = 8.0  # seconds
+    
+    # Client-side Gemini rate limits
+    llm_requests_per_minute: int = 60
+    llm_tokens_per_minute: int = 1000000
+    llm_batch_reserve: float = 0.2  # Share of capacity batch work leaves for interactive calls
+    rate_limit_redis_url: Optional[str] = None  # Share limits across workers when set
+    llm_map_concurrency: int = 4  # Parallel chunk calls per long document (map-reduce summarization)
+    classify_batch_size: int = 8  # Classify tasks packed into one prompt by the processor (1 disables batching)
+    
+    # Document chunking (token counts from the calibrated local tokenizer)
+    chunk_max_tokens: int = 7500
+    chunk_overlap_tokens: int = 200
+    
+    # Fair task scheduling
+    scheduler_source_weights: Dict[str, float] = {"interactive": 8.0, "upload": 2.0, "bulk": 1.0}
+    scheduler_type_weights: Dict[str, float] = {"enrich": 1.0, "summarize": 1.0, "classify": 1.0}
+    scheduler_aging_seconds: float = 120.0  # Waiting this long raises a task one priority level
+    scheduler_lookahead: int = 20  # Pending tasks fetched per queue on each poll
+    
+    # Task liveness and shutdown
+    task_heartbeat_interval: float = 15.0  # seconds between heartbeats for running tasks
+    task_stale_after: float = 120.0  # heartbeat age after which a task is requeued
+    task_reaper_interval: float = 60.0
+    shutdown_drain_timeout: float = 25.0  # seconds to let in-flight tasks finish on shutdown
+    
+    # Per-document working-set cache
+    document_cache_max_bytes: int = 67108864  # 64MB of text and derived artifacts
+    document_cache_ttl: float = 600.0  # seconds
+    
+    # Subject catalogue cache
+    subject_catalogue_check_interval: float = 30.0  # seconds between version checks against the database
+    subject_catalogue_max_age: float = 600.0  # hard refresh even if the version row is unavailable
+    
+    # LLM response cache
+    llm_cache_enabled: bool = True
+    llm_cache_max_entries: int = 2000  # in-memory LRU entries
+    llm_cache_ttl: float = 604800.0  # 7 days
+    llm_cache_path: str = "cache/llm_responses.sqlite3"  # empty to keep the cache in memory only
+    llm_cache_max_disk_bytes: int = 268435456  # 256MB
+    
     # Feature Flags
     enable_summarization: bool = True
     enable_classification: bool = True
     enable_semantic_search: bool = True
+    enable_enrichment: bool = True  # One combined LLM call per upload instead of summarize + classify + suggest
+    
+    @property
+    def processor_in_api(self) -> bool:
+        """Run the background processor inside the API process"""
+        return self.background_processing_enabled and self.api_background_processing is not False
     
     class Config:
         env_file = ".env"
@@ -1,25 +1,43 @@
 # backend/main.py
 from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import json
+import time
 import uuid
 from pathlib import Path
 import logging
-from typing import Optional
+from typing import Literal, Optional
 from uuid import UUID
 from typing import Optional, List  # Add List to your existing typing imports
 
 # Imports
-from services.text_extractor import TextExtractor, ExtractionResult
+from services.text_extractor import ExtractionResult
 from services.database import db_service
 from services.background_processor import background_processor
 from services.subject_service import subject_service
 from services.file_storage import file_storage
+from services.concurrency_controller import concurrency_controller
+from services.extraction_executor import extraction_executor
+from services.document_cache import document_cache
+from services.llm_cache import llm_cache
+from services.subject_classifier import subject_classifier
+from services.semantic_search import semantic_search
+from services.text_search import text_search
+from services.near_duplicates import near_duplicates
+from services.related_documents import related_documents
+from services.keyword_engine import keyword_engine
+from services.usage_tracker import usage_tracker
+from services.model_router import model_router
+from services.llm_service import llm_service
+from services.chunk_store import chunk_store
+from services.rate_limiter import rate_limiter, LLMPriority
 from models.schemas import (
     ExtractionResponse, DocumentCreate, ExtractedTextCreate,
     DocumentListResponse, DocumentDetailResponse, DocumentSummaryResponse,
     DocumentClassificationResponse, SummarizeRequest, ClassifyRequest, TaskStatus,
+    DocumentSummaryCreate,
     SubjectCreate, SubjectUpdate, SubjectResponse, SubjectWithStats,
     TaskType  # Add this missing import
 )
@@ -45,8 +63,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-text_extractor = TextExtractor()
-
 SUPPORTED_EXTENSIONS = {'.pdf', '.png', '.jpg', '.jpeg'}
 
 # Background task to start processor
@@ -67,12 +83,20 @@ async def startup_background_processor():
 @app.on_event("startup")
 async def startup_event():
     logger.info("🌊 Starting ClutterFlow API...")
-    await startup_background_processor()
+    if settings.processor_in_api:
+        await startup_background_processor()
+    elif settings.background_processing_enabled:
+        logger.info("Background processing runs in separate workers (python -m services.worker)")
+    else:
+        logger.info("Background processing is disabled")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("🛑 Shutting down ClutterFlow API...")
-    await background_processor.stop()
+    if settings.processor_in_api:
+        await background_processor.stop()
+    extraction_executor.shutdown()
+    await llm_service.transport.aclose()
 
 @app.get("/")
 async def health_check():
@@ -114,9 +138,89 @@ async def delete_document(document_id: UUID):
     success = await db_service.delete_document(document_id)
     if not success:
         raise HTTPException(status_code=404, detail="Document not found")
+    document_cache.invalidate(document_id)
+    await semantic_search.remove_document(document_id)
+    related_documents.remove(document_id)
     
     return {"message": "Document deleted successfully"}
 
+@app.get("/search")
+async def search_documents(
+    q: str = Query(..., min_length=1, description="Natural-language query"),
+    k: int = Query(10, ge=1, le=50, description="Number of documents to return")
+):
+    """Semantic search: documents whose passages are closest in meaning to the query"""
+    if not settings.enable_semantic_search:
+        raise HTTPException(status_code=404, detail="Semantic search is disabled")
+    
+    hits = await semantic_search.search(q, k)
+    if not hits:
+        return {"query": q, "results": []}
+    
+    documents = db_service.supabase.table('documents')\
+        .select("id, filename, file_type, upload_date")\
+        .in_('id', [hit['document_id'] for hit in hits])\
+        .execute()
+    documents_by_id = {doc['id']: doc for doc in documents.data or []}
+    
+    results = []
+    for hit in hits:
+        document = documents_by_id.get(hit['document_id'])
+        if not document:
+            continue  # Deleted since it was indexed
+        text = await document_cache.get_text(UUID(hit['document_id'])) or ""
+        passage = " ".join(text[hit['start']:hit['end']].split())
+        results.append({
+            **document,
+            "score": hit['score'],
+            "snippet": passage[:300] + ("..." if len(passage) > 300 else "")
+        })
+    
+    return {"query": q, "results": results}
+
+@app.get("/search/text")
+async def search_documents_text(
+    q: str = Query(..., min_length=1, description='Web-style query: words, "quoted phrases", -excluded'),
+    limit: int = Query(20, ge=1, le=100, description="Results per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
+    """Ranked full-text search over filenames, summaries and extracted text"""
+    try:
+        return await text_search.search(q, page_size=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"❌ Full-text search failed: {e}")
+        raise HTTPException(status_code=500, detail="Full-text search failed")
+
+@app.get("/documents/{document_id}/related")
+async def get_related_documents(
+    document_id: UUID,
+    k: int = Query(5, ge=1, le=50, description="Number of related documents")
+):
+    """Documents most similar to this one, from the precomputed neighbour graph"""
+    neighbors = await related_documents.related(document_id, min(k, related_documents.k))
+    if not neighbors:
+        document = await db_service.get_document(document_id)
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        return {"document_id": str(document_id), "related": []}
+    
+    documents = db_service.supabase.table('documents')\
+        .select("id, filename, file_type, upload_date")\
+        .in_('id', [neighbor['neighbor_id'] for neighbor in neighbors])\
+        .execute()
+    documents_by_id = {doc['id']: doc for doc in documents.data or []}
+    
+    return {
+        "document_id": str(document_id),
+        "related": [
+            {**documents_by_id[neighbor['neighbor_id']], "similarity": neighbor['similarity']}
+            for neighbor in neighbors
+            if neighbor['neighbor_id'] in documents_by_id
+        ]
+    }
+
 @app.get("/documents/{document_id}/summary")
 async def get_document_summary(document_id: UUID):
     """Get the summary for a document"""
@@ -154,7 +258,11 @@ async def get_document_classification(document_id: UUID):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/documents/{document_id}/summarize")
-async def trigger_summarization(document_id: UUID, request: SummarizeRequest = SummarizeRequest()):
+async def trigger_summarization(
+    document_id: UUID,
+    request: SummarizeRequest = SummarizeRequest(),
+    fresh: bool = Query(False, description="Ignore existing results and run the LLM again")
+):
     """Manually trigger summarization for a document"""
     try:
         # Check if document exists
@@ -162,26 +270,107 @@ async def trigger_summarization(document_id: UUID, request: SummarizeRequest = S
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        # Add summarization task
-        success = await background_processor.add_task(
+        # Add summarization task (duplicates coalesce, identical text reuses prior results)
+        outcome = await background_processor.enqueue_task(
             document_id,
             TaskType.summarize,
             priority=1,
-            task_data={'summary_type': request.summary_type}
+            task_data={'summary_type': request.summary_type, 'source': 'interactive', 'fresh': fresh}
         )
         
-        if success:
-            return {"message": "Summarization task queued", "document_id": document_id}
-        else:
+        if outcome['status'] == 'failed':
             raise HTTPException(status_code=500, detail="Failed to queue summarization task")
+        
+        messages = {
+            'queued': "Summarization task queued",
+            'coalesced': "Summarization already in progress",
+            'cached': "Summarization already available"
+        }
+        return {
+            "message": messages[outcome['status']],
+            "status": outcome['status'],
+            "document_id": document_id,
+            "task_id": outcome.get('task_id'),
+            "result": outcome.get('result')
+        }
             
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.get("/documents/{document_id}/summarize/stream")
+async def stream_summarization(
+    document_id: UUID,
+    summary_type: Literal["brief", "detailed", "bullet_points"] = Query("brief", description="brief, detailed or bullet_points")
+):
+    """Stream a summary as Server-Sent Events; the full text is saved when the stream completes"""
+    document = await db_service.get_document(document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    working_set = await document_cache.get(document_id)
+    if not working_set or len(working_set.text.strip()) < 50:
+        raise HTTPException(status_code=400, detail="Insufficient text for summarization")
+    
+    async def events():
+        start_time = time.time()
+        pieces = []
+        stream_info = {}
+        try:
+            chunks = None
+            if llm_service.needs_chunking(working_set.text):
+                yield _sse("status", {"message": "Summarizing document sections..."})
+                document_chunks = await chunk_store.get_chunks(document_id)
+                chunks = [chunk.text for chunk in document_chunks] if document_chunks else None
+            
+            with usage_tracker.attribute('summarize', [document_id]):
+                async for piece in llm_service.stream_summary(
+                    working_set.text, summary_type, LLMPriority.interactive, chunks, stream_info
+                ):
+                    pieces.append(piece)
+                    yield _sse("token", {"text": piece})
+            
+            summary_text = "".join(pieces).strip()
+            summary_data = DocumentSummaryCreate(
+                document_id=document_id,
+                summary_text=summary_text,
+                summary_type=summary_type,
+                model_used=stream_info.get('model_used', llm_service.model_name),
+                tokens_used=stream_info.get('tokens_used') or llm_service.estimate_tokens(summary_text),
+                processing_time=time.time() - start_time
+            )
+            summary_dict = summary_data.model_dump()
+            summary_dict['document_id'] = str(summary_dict['document_id'])
+            summary_dict['text_hash'] = working_set.text_hash
+            
+            result = db_service.supabase.table('document_summaries').insert(summary_dict).execute()
+            if not result.data:
+                raise Exception("Failed to save summary to database")
+            
+            logger.info(f"✅ Streamed summary saved for document {document_id}")
+            yield _sse("done", result.data[0])
+            
+        except Exception as e:
+            logger.error(f"❌ Streaming summarization failed for document {document_id}: {e}")
+            yield _sse("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/documents/{document_id}/classify")
-async def trigger_classification(document_id: UUID, request: ClassifyRequest = ClassifyRequest()):
+async def trigger_classification(
+    document_id: UUID,
+    request: ClassifyRequest = ClassifyRequest(),
+    fresh: bool = Query(False, description="Ignore existing results and run the LLM again")
+):
     """Manually trigger classification for a document"""
     try:
         # Check if document exists
@@ -189,18 +378,29 @@ async def trigger_classification(document_id: UUID, request: ClassifyRequest = C
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        # Add classification task
-        success = await background_processor.add_task(
+        # Add classification task (duplicates coalesce, identical text reuses prior results)
+        outcome = await background_processor.enqueue_task(
             document_id,
             TaskType.classify,
             priority=1,
-            task_data={'categories': request.categories}
+            task_data={'categories': request.categories, 'source': 'interactive', 'fresh': fresh}
         )
         
-        if success:
-            return {"message": "Classification task queued", "document_id": document_id}
-        else:
+        if outcome['status'] == 'failed':
             raise HTTPException(status_code=500, detail="Failed to queue classification task")
+        
+        messages = {
+            'queued': "Classification task queued",
+            'coalesced': "Classification already in progress",
+            'cached': "Classification already available"
+        }
+        return {
+            "message": messages[outcome['status']],
+            "status": outcome['status'],
+            "document_id": document_id,
+            "task_id": outcome.get('task_id'),
+            "result": outcome.get('result')
+        }
             
     except HTTPException:
         raise
@@ -264,6 +464,67 @@ async def get_analytics_overview():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/analytics/llm-usage")
+async def get_llm_usage(days: int = Query(7, ge=1, le=90, description="Days of history")):
+    """Get Gemini token usage per day and task type, with today's spend against the budget"""
+    try:
+        daily = await usage_tracker.daily_usage(days)  # Flushes first, so today's total is current
+        return {"today": usage_tracker.snapshot(), "daily": daily}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics/model-routes")
+async def get_model_route_metrics():
+    """Get per-route model usage, fallbacks, escalations, latency and estimated cost"""
+    return model_router.snapshot()
+
+@app.get("/metrics/concurrency")
+async def get_concurrency_metrics():
+    """Get the adaptive LLM concurrency limit and its recent history"""
+    snapshot = concurrency_controller.snapshot()
+    snapshot["in_flight"] = len(background_processor.processing_tasks)
+    return snapshot
+
+@app.get("/metrics/rate-limiter")
+async def get_rate_limiter_metrics():
+    """Get Gemini rate limiter lanes, grants and bucket levels"""
+    return rate_limiter.snapshot()
+
+@app.get("/metrics/document-cache")
+async def get_document_cache_metrics():
+    """Get working-set cache size and hit rate"""
+    return document_cache.snapshot()
+
+@app.get("/metrics/llm-cache")
+async def get_llm_cache_metrics():
+    """Get LLM response cache size and hit/miss counters"""
+    return await llm_cache.snapshot()
+
+@app.get("/metrics/subject-classifier")
+async def get_subject_classifier_metrics():
+    """Get local subject classifier centroid and fast-path counters"""
+    return subject_classifier.snapshot()
+
+@app.get("/metrics/near-duplicates")
+async def get_near_duplicate_metrics():
+    """Get near-duplicate lookup and match counters"""
+    return near_duplicates.snapshot()
+
+@app.get("/metrics/related-documents")
+async def get_related_documents_metrics():
+    """Get related-documents graph counters"""
+    return related_documents.snapshot()
+
+@app.get("/metrics/keywords")
+async def get_keyword_metrics():
+    """Get keyword engine corpus statistics"""
+    return keyword_engine.snapshot()
+
+@app.get("/metrics/search-index")
+async def get_search_index_metrics():
+    """Get semantic search index size and mode (brute force or IVF)"""
+    return semantic_search.snapshot()
+
 def validate_file(file: UploadFile):
     ext = Path(file.filename).suffix.lower()
     return ext in SUPPORTED_EXTENSIONS
@@ -364,8 +625,8 @@ async def extract(background_tasks: BackgroundTasks, file: UploadFile = File(...
         temp_file_path = await save_temp_file_from_content(file_content, file.filename)
         
         try:
-            # Extract text from temporary file
-            result = text_extractor.extract_text(temp_file_path)
+            # Extract text from temporary file in the extraction pool (keeps the event loop free)
+            result = await extraction_executor.extract(temp_file_path)
             
             # Save extracted text
             text_data = ExtractedTextCreate(
@@ -380,6 +641,13 @@ async def extract(background_tasks: BackgroundTasks, file: UploadFile = File(...
             
             extracted_text = await db_service.create_extracted_text(text_data)
             
+            # Seed the working-set cache so the LLM tasks don't re-read the text
+            document_cache.put_text(document.id, result.text)
+            
+            # Fingerprint before queuing, so OCR'd copies of already processed pages reuse their results
+            if settings.enable_near_duplicates:
+                await near_duplicates.register(document.id)
+            
             # Update status to completed
             await db_service.update_document_status(document.id, "completed")
             
@@ -521,7 +789,10 @@ async def get_unclassified_documents(limit: int = Query(20, ge=1, le=100)):
 async def suggest_subject_for_document(document_id: UUID):
     """Get AI suggestion for document subject assignment"""
     try:
-        suggestion = await subject_service.suggest_subject_for_document(document_id)
+        with usage_tracker.attribute('suggest_subject', [document_id]):
+            suggestion = await subject_service.suggest_subject_for_document(
+                document_id, priority=LLMPriority.interactive
+            )
         if suggestion:
             return suggestion
         return {"message": "No suitable subject found", "suggestion": None}
@@ -0,0 +1,18 @@
+-- backend/migrations/001_task_idempotency.sql
+-- Idempotency keys for coalescing duplicate processing_queue work, and text
+-- hashes so finished summaries/classifications can be reused for identical text.
+
+alter table processing_queue add column if not exists idempotency_key text;
+
+-- At most one live (pending or processing) task per idempotency key
+create unique index if not exists processing_queue_active_idempotency_key
+    on processing_queue (idempotency_key)
+    where status in ('pending', 'processing');
+
+alter table document_summaries add column if not exists text_hash text;
+create index if not exists document_summaries_text_hash
+    on document_summaries (text_hash, summary_type);
+
+alter table document_classifications add column if not exists text_hash text;
+create index if not exists document_classifications_text_hash
+    on document_classifications (text_hash);
@@ -0,0 +1,29 @@
+-- backend/migrations/002_fair_scheduling.sql
+-- Per-source queues for the fair task scheduler.
+
+alter table processing_queue add column if not exists source text not null default 'upload';
+
+create index if not exists processing_queue_pending_queues
+    on processing_queue (task_type, source, priority, created_at)
+    where status = 'pending';
+
+-- Returns up to `lookahead` pending tasks from every (task_type, source) queue,
+-- ordered within each queue by priority aged one level per `aging_seconds`.
+-- One round trip gives the scheduler a view of every queue, so a deep
+-- backlog in one queue can't hide the others.
+create or replace function pending_tasks_by_queue(lookahead int, aging_seconds float)
+returns setof processing_queue
+language sql stable as $$
+    select (ranked.q).*
+    from (
+        select q,
+               row_number() over (
+                   partition by q.task_type, q.source
+                   order by q.priority - extract(epoch from now() - q.created_at) / aging_seconds,
+                            q.created_at
+               ) as queue_rank
+        from processing_queue q
+        where q.status = 'pending'
+    ) ranked
+    where ranked.queue_rank <= lookahead;
+$$;
@@ -0,0 +1,10 @@
+-- backend/migrations/003_task_heartbeats.sql
+-- Liveness tracking so tasks orphaned by a dead worker can be requeued.
+
+alter table processing_queue add column if not exists heartbeat_at timestamptz;
+alter table processing_queue add column if not exists worker_id text;
+alter table processing_queue add column if not exists attempts int not null default 0;
+
+create index if not exists processing_queue_processing_heartbeat
+    on processing_queue (heartbeat_at)
+    where status = 'processing';
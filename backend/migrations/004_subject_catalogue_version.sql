@@ -0,0 +1,30 @@
+-- backend/migrations/004_subject_catalogue_version.sql
+-- Version stamp for the cached subject catalogue: any change to user_subjects
+-- bumps it, so every worker notices edits made through another process.
+
+create table if not exists subject_catalogue_version (
+    id int primary key default 1 check (id = 1),
+    version bigint not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+insert into subject_catalogue_version (id, version) values (1, 0)
+    on conflict (id) do nothing;
+
+create or replace function bump_subject_catalogue_version()
+returns trigger
+language plpgsql
+as $$
+begin
+    update subject_catalogue_version
+       set version = version + 1,
+           updated_at = now()
+     where id = 1;
+    return null;
+end;
+$$;
+
+drop trigger if exists user_subjects_catalogue_version on user_subjects;
+create trigger user_subjects_catalogue_version
+    after insert or update or delete on user_subjects
+    for each statement execute function bump_subject_catalogue_version();
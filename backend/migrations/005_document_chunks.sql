@@ -0,0 +1,19 @@
+-- backend/migrations/005_document_chunks.sql
+-- Persisted chunk boundaries (offsets into extracted_text) shared by LLM tasks and indexes.
+
+create table if not exists document_chunks (
+    id uuid primary key default gen_random_uuid(),
+    document_id uuid not null references documents(id) on delete cascade,
+    chunk_index int not null,
+    start_offset int not null,
+    end_offset int not null,
+    token_count int not null,
+    chunk_hash text not null,
+    text_hash text not null,
+    max_tokens int not null,
+    overlap_tokens int not null,
+    created_at timestamptz not null default now(),
+    unique (document_id, chunk_index)
+);
+
+create index if not exists document_chunks_chunk_hash on document_chunks (chunk_hash);
@@ -0,0 +1,11 @@
+-- backend/migrations/006_chunk_summaries.sql
+-- Type-independent map-phase summaries, reused across summary types and re-extractions.
+
+create table if not exists chunk_summaries (
+    chunk_hash text not null,
+    model_used text not null,
+    prompt_version int not null,
+    summary_text text not null,
+    created_at timestamptz not null default now(),
+    primary key (chunk_hash, model_used, prompt_version)
+);
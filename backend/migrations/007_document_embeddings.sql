@@ -0,0 +1,11 @@
+-- backend/migrations/007_document_embeddings.sql
+-- One embedding per document for the local subject classifier, tagged with the embedding backend.
+
+create table if not exists document_embeddings (
+    document_id uuid primary key references documents(id) on delete cascade,
+    model_id text not null,
+    vector real[] not null,
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists idx_document_embeddings_model on document_embeddings (model_id);
@@ -0,0 +1,100 @@
+-- backend/migrations/008_full_text_search.sql
+-- Ranked full-text search: one weighted tsvector per document behind a GIN index,
+-- kept current by triggers on the tables it's built from.
+--   A: filename   B: latest summary   C: extracted text
+
+create table if not exists document_search (
+    document_id uuid primary key references documents(id) on delete cascade,
+    search_vector tsvector not null,
+    updated_at timestamptz not null default now()
+);
+
+create index if not exists document_search_vector on document_search using gin (search_vector);
+
+create or replace function refresh_document_search(doc uuid)
+returns void
+language sql
+as $$
+    insert into document_search (document_id, search_vector, updated_at)
+    select d.id,
+           setweight(to_tsvector('english', regexp_replace(coalesce(d.filename, ''), '[_.\-]+', ' ', 'g')), 'A') ||
+           setweight(to_tsvector('english', coalesce((
+               select s.summary_text from document_summaries s
+                where s.document_id = d.id
+                order by s.created_at desc
+                limit 1), '')), 'B') ||
+           -- tsvectors are capped at 1MB; the head of a very long text is plenty to match on
+           setweight(to_tsvector('english', left(coalesce((
+               select e.raw_text from extracted_text e
+                where e.document_id = d.id
+                limit 1), ''), 500000)), 'C'),
+           now()
+      from documents d
+     where d.id = doc
+    on conflict (document_id) do update
+        set search_vector = excluded.search_vector,
+            updated_at = excluded.updated_at;
+$$;
+
+create or replace function document_search_refresh_trigger()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_table_name = 'documents' then
+        perform refresh_document_search(new.id);
+    else
+        perform refresh_document_search(new.document_id);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists documents_search_refresh on documents;
+create trigger documents_search_refresh
+    after insert or update of filename on documents
+    for each row execute function document_search_refresh_trigger();
+
+drop trigger if exists extracted_text_search_refresh on extracted_text;
+create trigger extracted_text_search_refresh
+    after insert or update of raw_text on extracted_text
+    for each row execute function document_search_refresh_trigger();
+
+drop trigger if exists document_summaries_search_refresh on document_summaries;
+create trigger document_summaries_search_refresh
+    after insert on document_summaries
+    for each row execute function document_search_refresh_trigger();
+
+-- Backfill existing documents
+select refresh_document_search(id) from documents;
+
+-- One page of ranked matches for a web-style query ("exam notes" -draft "cell wall").
+-- Pages are keyset-paginated on (rank, document_id): pass the last row's
+-- values as after_rank/after_id to get the next page. Only the rows on the
+-- page pay for ts_headline.
+create or replace function search_documents(search_query text, page_size int default 20,
+                                            after_rank real default null, after_id uuid default null)
+returns table (document_id uuid, filename text, upload_date timestamptz, rank real, headline text)
+language sql stable
+as $$
+    with q as (
+        select websearch_to_tsquery('english', search_query) as query
+    ),
+    page as (
+        select s.document_id, ts_rank_cd(s.search_vector, q.query) as rank
+          from document_search s, q
+         where s.search_vector @@ q.query
+           and (after_rank is null
+                or (ts_rank_cd(s.search_vector, q.query), s.document_id) < (after_rank, after_id))
+         order by rank desc, s.document_id desc
+         limit page_size
+    )
+    select p.document_id, d.filename::text, d.upload_date::timestamptz, p.rank,
+           ts_headline('english', left(coalesce(e.raw_text, ''), 100000), q.query,
+                       'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10, FragmentDelimiter=" … "')
+      from page p
+     cross join q
+      join documents d on d.id = p.document_id
+      left join extracted_text e on e.document_id = p.document_id
+     order by p.rank desc, p.document_id desc;
+$$;
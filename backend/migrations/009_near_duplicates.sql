@@ -0,0 +1,21 @@
+-- backend/migrations/009_near_duplicates.sql
+-- MinHash fingerprints and LSH buckets for spotting OCR'd copies of the same pages,
+-- plus provenance for results copied from a near-duplicate.
+
+create table if not exists document_fingerprints (
+    document_id uuid primary key references documents(id) on delete cascade,
+    text_hash text not null,
+    minhash bigint[] not null,
+    created_at timestamptz not null default now()
+);
+
+create table if not exists document_lsh_buckets (
+    bucket text not null,
+    document_id uuid not null references documents(id) on delete cascade,
+    primary key (bucket, document_id)
+);
+
+alter table document_summaries
+    add column if not exists reused_from uuid references documents(id) on delete set null;
+alter table document_classifications
+    add column if not exists reused_from uuid references documents(id) on delete set null;
@@ -0,0 +1,17 @@
+-- backend/migrations/010_document_neighbors.sql
+-- Precomputed k-nearest-neighbour graph over document vectors for "related documents".
+-- Edges to a deleted document disappear with it; the endpoint repairs short lists lazily.
+
+create table if not exists document_neighbors (
+    document_id uuid not null references documents(id) on delete cascade,
+    neighbor_id uuid not null references documents(id) on delete cascade,
+    similarity real not null,
+    model_id text not null,
+    updated_at timestamptz not null default now(),
+    primary key (document_id, neighbor_id)
+);
+
+create index if not exists document_neighbors_ranked on document_neighbors (document_id, similarity desc);
+create index if not exists document_neighbors_reverse on document_neighbors (neighbor_id);
+
+create index if not exists document_embeddings_sync on document_embeddings (model_id, updated_at);
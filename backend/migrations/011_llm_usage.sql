@@ -0,0 +1,53 @@
+-- backend/migrations/011_llm_usage.sql
+-- Daily rollup of Gemini token usage (from the API's usage metadata) per task type,
+-- document and model. Rows outlive their documents so past spend stays accountable.
+
+create table if not exists llm_usage_daily (
+    usage_date date not null,
+    task_type text not null,
+    document_id uuid,  -- null for calls not tied to a document
+    model text not null,
+    calls integer not null default 0,
+    prompt_tokens bigint not null default 0,
+    output_tokens bigint not null default 0,
+    estimated_calls integer not null default 0,  -- calls whose counts were estimated locally
+    updated_at timestamptz not null default now()
+);
+
+create unique index if not exists llm_usage_daily_key
+    on llm_usage_daily (usage_date, task_type, (coalesce(document_id, '00000000-0000-0000-0000-000000000000'::uuid)), model);
+
+create index if not exists llm_usage_daily_document on llm_usage_daily (document_id) where document_id is not null;
+
+-- Adds a batch of rollups from one worker and returns the total tokens used on
+-- `for_date` by every worker, which the daily budget is checked against.
+create or replace function record_llm_usage(usage jsonb, for_date date)
+returns bigint
+language plpgsql as $$
+begin
+    insert into llm_usage_daily as daily
+        (usage_date, task_type, document_id, model, calls, prompt_tokens, output_tokens, estimated_calls)
+    select (item->>'usage_date')::date,
+           item->>'task_type',
+           nullif(item->>'document_id', '')::uuid,
+           item->>'model',
+           (item->>'calls')::int,
+           (item->>'prompt_tokens')::bigint,
+           (item->>'output_tokens')::bigint,
+           (item->>'estimated_calls')::int
+    from jsonb_array_elements(coalesce(usage, '[]'::jsonb)) as item
+    on conflict (usage_date, task_type, (coalesce(document_id, '00000000-0000-0000-0000-000000000000'::uuid)), model)
+    do update set
+        calls = daily.calls + excluded.calls,
+        prompt_tokens = daily.prompt_tokens + excluded.prompt_tokens,
+        output_tokens = daily.output_tokens + excluded.output_tokens,
+        estimated_calls = daily.estimated_calls + excluded.estimated_calls,
+        updated_at = now();
+
+    return (
+        select coalesce(sum(prompt_tokens + output_tokens), 0)
+        from llm_usage_daily
+        where usage_date = for_date
+    );
+end;
+$$;
@@ -0,0 +1,18 @@
+-- backend/migrations/012_embedding_sync_stamps.sql
+-- document_embeddings.updated_at drives incremental sync of the related-documents graph,
+-- so it must come from the database clock rather than each writer's: stamp it on every
+-- insert and update. Readers re-read an overlap window for writes that commit late.
+
+create or replace function stamp_updated_at()
+returns trigger
+language plpgsql as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$;
+
+drop trigger if exists document_embeddings_updated_at on document_embeddings;
+create trigger document_embeddings_updated_at
+    before insert or update on document_embeddings
+    for each row execute function stamp_updated_at();
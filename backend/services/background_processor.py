@@ -1,14 +1,30 @@
 # backend/services/background_processor.py
 import asyncio
+import hashlib
 import logging
-from datetime import datetime
-from typing import Optional, List
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any
 from uuid import UUID
 import json
 
-from services.llm_service import llm_service
+from services.llm_service import llm_service, LLMResult
 from services.database import db_service
 from services.subject_service import subject_service  # ADD THIS IMPORT
+from services.subject_catalogue import subject_catalogue
+from services.subject_classifier import subject_classifier
+from services.semantic_search import semantic_search
+from services.near_duplicates import near_duplicates
+from services.related_documents import related_documents
+from services.keyword_engine import keyword_engine
+from services.usage_tracker import usage_tracker
+from services.chunk_store import chunk_store
+from services.concurrency_controller import concurrency_controller
+from services.rate_limiter import LLMPriority
+from services.task_scheduler import FairTaskScheduler, DEFAULT_SOURCE
+from services.document_cache import document_cache
 from models.schemas import (
     ProcessingQueueCreate, ProcessingQueueUpdate, TaskType, TaskStatus,
     DocumentSummaryCreate, DocumentClassificationCreate, SummaryType
@@ -17,16 +33,196 @@ from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# task_data fields that describe who asked, not what work is done
+IDEMPOTENCY_IGNORED_FIELDS = {'source', 'fresh'}
+
+# Auto-assign a document to the suggested subject at or above this confidence
+AUTO_ASSIGN_CONFIDENCE_THRESHOLD = 0.6
+
 class BackgroundProcessor:
     def __init__(self):
         self.is_running = False
-        self.max_concurrent_tasks = 3
-        self.processing_tasks = set()
+        self.concurrency = concurrency_controller
+        self.scheduler = FairTaskScheduler(
+            source_weights=settings.scheduler_source_weights,
+            type_weights=settings.scheduler_type_weights,
+            aging_seconds=settings.scheduler_aging_seconds
+        )
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.processing_tasks: Dict[str, asyncio.Task] = {}  # queue task id -> running asyncio task
+        self._stop_event = asyncio.Event()
+        self._maintenance_tasks: List[asyncio.Task] = []
+        self._budget_deferring = False
+    
+    @property
+    def max_concurrent_tasks(self) -> int:
+        """Current parallelism, adjusted by the adaptive concurrency controller"""
+        return self.concurrency.limit
         
-    async def add_task(self, document_id: UUID, task_type: TaskType, priority: int = 1, task_data: dict = None) -> bool:
-        """Add a new task to the processing queue"""
+    @staticmethod
+    def _idempotency_key(document_id: UUID, task_type: TaskType, task_data: dict) -> str:
+        """Key identifying the work a task does, independent of who requested it"""
+        work_data = {k: v for k, v in task_data.items() if k not in IDEMPOTENCY_IGNORED_FIELDS}
+        payload = json.dumps(
+            [str(document_id), str(getattr(task_type, 'value', task_type)), work_data],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    async def _find_active_task(self, idempotency_key: str) -> Optional[dict]:
+        """Find a pending or processing task doing the same work"""
+        result = db_service.supabase.table('processing_queue')\
+            .select("id, status, priority, source, task_data")\
+            .eq('idempotency_key', idempotency_key)\
+            .in_('status', ['pending', 'processing'])\
+            .limit(1)\
+            .execute()
+        
+        return result.data[0] if result.data else None
+    
+    async def _coalesce_into(self, existing: dict, priority: int, task_data: dict):
+        """Let a duplicate request upgrade the priority of the pending task that absorbs it"""
+        if existing['status'] != 'pending':
+            return
+        
+        existing_data = existing.get('task_data') or {}
+        update_data = {}
+        
+        if priority < existing['priority']:
+            update_data['priority'] = priority
+        if task_data.get('source') == 'interactive' and existing.get('source') != 'interactive':
+            # The scheduler queues by the source column; task_data keeps the LLM priority in step
+            update_data['source'] = 'interactive'
+            update_data['task_data'] = {**existing_data, 'source': 'interactive'}
+        
+        if update_data:
+            db_service.supabase.table('processing_queue')\
+                .update(update_data)\
+                .eq('id', existing['id'])\
+                .eq('status', 'pending')\
+                .execute()
+    
+    async def _lookup_result(self, table: str, text_hash: str, summary_type: Optional[str] = None) -> Optional[dict]:
+        """Most recent stored result for this text hash"""
+        query = db_service.supabase.table(table)\
+            .select("*")\
+            .eq('text_hash', text_hash)
+        if summary_type:
+            query = query.eq('summary_type', summary_type)
+        result = query.order('created_at', desc=True).limit(1).execute()
+        
+        return result.data[0] if result.data else None
+    
+    async def _link_result(self, table: str, existing: dict, document_id: UUID,
+                           text_hash: Optional[str] = None) -> Optional[dict]:
+        """Give ``document_id`` its own copy of a result computed for identical text
+        
+        ``text_hash`` is set when the source is a near-duplicate: the copy is
+        stamped with this document's own hash and where it was reused from.
+        """
+        if existing['document_id'] == str(document_id):
+            return existing
+        
+        if table == 'document_classifications':
+            existing_for_document = db_service.supabase.table(table)\
+                .select("id")\
+                .eq('document_id', str(document_id))\
+                .execute()
+            if existing_for_document.data:
+                # Never overwrite a classification the document already has
+                return None
+        
+        # Same text under another document - link a copy instead of asking the LLM again
+        copy = {k: v for k, v in existing.items() if k not in ('id', 'created_at', 'updated_at')}
+        copy['document_id'] = str(document_id)
+        if text_hash and text_hash != existing.get('text_hash'):
+            copy['text_hash'] = text_hash
+            copy['reused_from'] = existing['document_id']
+        
+        copied = db_service.supabase.table(table).insert(copy).execute()
+        return copied.data[0] if copied.data else None
+    
+    async def _find_existing_result(self, document_id: UUID, task_type: TaskType, task_data: dict) -> Optional[dict]:
+        """Return a stored result for identical text and parameters, copying it to this document if needed"""
+        task_type = str(getattr(task_type, 'value', task_type))
+        
+        # Custom category lists aren't stored with the result, so only the default classify run is reusable
+        if task_type not in ('summarize', 'classify', 'enrich') or (task_type == 'classify' and task_data.get('categories')):
+            return None
+        
+        working_set = await document_cache.get(document_id)
+        if not working_set or not working_set.text:
+            return None
+        
+        text_hash = working_set.text_hash
+        
+        existing = await self._reuse_result(document_id, task_type, task_data, text_hash)
+        if not existing and settings.enable_near_duplicates:
+            # Rescans of the same pages differ by OCR noise - try near-duplicate documents next
+            for duplicate in await near_duplicates.find(document_id):
+                existing = await self._reuse_result(document_id, task_type, task_data, duplicate.text_hash, text_hash)
+                if existing:
+                    logger.info(f"🪞 Document {document_id} is a near-duplicate of {duplicate.document_id} (similarity {duplicate.similarity:.2f})")
+                    break
+        
+        if existing and task_type != 'summarize':
+            classification = existing['classification'] if task_type == 'enrich' else existing
+            await self._index_reused(document_id, classification, working_set.text)
+        return existing
+    
+    async def _index_reused(self, document_id: UUID, classification: dict, raw_text: str):
+        """Index a document whose classification was copied, as a processed one would be (local embeddings only)"""
+        if await subject_classifier.store_vector(document_id, raw_text) and classification.get('subject_id'):
+            await subject_classifier.observe(document_id, classification['subject_id'])
+        await self._index_document(document_id, raw_text)
+    
+    async def _reuse_result(self, document_id: UUID, task_type: str, task_data: dict,
+                            source_hash: str, text_hash: Optional[str] = None) -> Optional[dict]:
+        """Copy results stored for ``source_hash`` to this document; None when there aren't any"""
+        if task_type == 'summarize':
+            existing = await self._lookup_result('document_summaries', source_hash, task_data.get('summary_type', 'brief'))
+            return await self._link_result('document_summaries', existing, document_id, text_hash) if existing else None
+        
+        if task_type == 'classify':
+            existing = await self._lookup_result('document_classifications', source_hash)
+            return await self._link_result('document_classifications', existing, document_id, text_hash) if existing else None
+        
+        # Enrichment is only skippable when both of its outputs already exist
+        summary = await self._lookup_result('document_summaries', source_hash, 'brief')
+        classification = await self._lookup_result('document_classifications', source_hash)
+        if not summary or not classification:
+            return None
+        
+        linked_summary = await self._link_result('document_summaries', summary, document_id, text_hash)
+        linked_classification = await self._link_result('document_classifications', classification, document_id, text_hash)
+        if not linked_summary or not linked_classification:
+            return None
+        return {'summary': linked_summary, 'classification': linked_classification}
+    
+    async def enqueue_task(self, document_id: UUID, task_type: TaskType, priority: int = 1,
+                           task_data: dict = None) -> Dict[str, Any]:
+        """Queue a task unless identical work is already queued or already done
+        
+        Returns a dict whose 'status' is 'queued', 'coalesced', 'cached' or 'failed'.
+        Pass task_data['fresh'] = True to skip reuse of existing results.
+        """
         try:
             task_data = task_data or {}
+            idempotency_key = self._idempotency_key(document_id, task_type, task_data)
+            
+            # A matching pending/processing task absorbs this request
+            existing = await self._find_active_task(idempotency_key)
+            if existing:
+                await self._coalesce_into(existing, priority, task_data)
+                logger.info(f"🔗 Coalesced {task_type} request for document {document_id} into task {existing['id']}")
+                return {'status': 'coalesced', 'task_id': existing['id']}
+            
+            # Identical text with identical parameters was already processed
+            if not task_data.get('fresh'):
+                cached_result = await self._find_existing_result(document_id, task_type, task_data)
+                if cached_result:
+                    logger.info(f"♻️ Reused existing {task_type} result for document {document_id}")
+                    return {'status': 'cached', 'result': cached_result}
             
             task = ProcessingQueueCreate(
                 document_id=document_id,
@@ -38,35 +234,64 @@ class BackgroundProcessor:
             # Convert UUID to string for JSON serialization
             task_dict = task.model_dump()
             task_dict['document_id'] = str(task_dict['document_id'])
+            task_dict['idempotency_key'] = idempotency_key
+            task_dict['source'] = task_data.get('source', DEFAULT_SOURCE)
             
             # Use Supabase REST API to insert task
-            result = db_service.supabase.table('processing_queue').insert(task_dict).execute()
+            try:
+                result = db_service.supabase.table('processing_queue').insert(task_dict).execute()
+            except Exception as insert_error:
+                # Another request inserted the same work between our check and insert
+                if '23505' not in str(insert_error) and 'duplicate key' not in str(insert_error):
+                    raise
+                existing = await self._find_active_task(idempotency_key)
+                if existing:
+                    return {'status': 'coalesced', 'task_id': existing['id']}
+                raise
             
             if result.data:
                 logger.info(f"✅ Added {task_type} task for document {document_id}")
-                return True
-            return False
+                return {'status': 'queued', 'task_id': result.data[0]['id']}
+            return {'status': 'failed'}
             
         except Exception as e:
             logger.error(f"❌ Failed to add task: {e}")
-            return False
+            return {'status': 'failed', 'error': str(e)}
+    
+    async def add_task(self, document_id: UUID, task_type: TaskType, priority: int = 1, task_data: dict = None) -> bool:
+        """Add a new task to the processing queue"""
+        outcome = await self.enqueue_task(document_id, task_type, priority, task_data)
+        return outcome['status'] != 'failed'
     
     async def get_pending_tasks(self, limit: int = 10) -> List[dict]:
-        """Get pending tasks ordered by priority and creation time"""
+        """Get the next pending tasks in weighted fair order across queues"""
         try:
-            result = db_service.supabase.table('processing_queue')\
-                .select("*")\
-                .eq('status', 'pending')\
-                .order('priority')\
-                .order('created_at')\
-                .limit(limit)\
-                .execute()
-            
-            return result.data if result.data else []
+            # One window of aged-priority candidates per (task_type, source) queue
+            result = db_service.supabase.rpc('pending_tasks_by_queue', {
+                'lookahead': max(limit, settings.scheduler_lookahead),
+                'aging_seconds': settings.scheduler_aging_seconds
+            }).execute()
+            candidates = result.data if result.data else []
             
         except Exception as e:
-            logger.error(f"❌ Failed to get pending tasks: {e}")
-            return []
+            logger.warning(f"⚠️ Queue view unavailable, falling back to priority order: {e}")
+            try:
+                result = db_service.supabase.table('processing_queue')\
+                    .select("*")\
+                    .eq('status', 'pending')\
+                    .order('priority')\
+                    .order('created_at')\
+                    .limit(max(limit, settings.scheduler_lookahead))\
+                    .execute()
+                candidates = result.data if result.data else []
+            except Exception as fallback_error:
+                logger.error(f"❌ Failed to get pending tasks: {fallback_error}")
+                return []
+        
+        # Deferred work is dropped before ordering so it can't crowd out tasks that may run;
+        # queues are charged in process_pending_tasks, once we know which tasks were claimed
+        candidates = await self._within_budget(candidates)
+        return self.scheduler.order(candidates, limit)
     
     async def update_task_status(self, task_id: UUID, status: TaskStatus, 
                                error_message: str = None, 
@@ -94,6 +319,83 @@ class BackgroundProcessor:
             logger.error(f"❌ Failed to update task status: {e}")
             return False
     
+    @staticmethod
+    def _task_priority(task: dict) -> LLMPriority:
+        """Tasks queued from a user action get the interactive rate limiter lane"""
+        task_data = task.get('task_data') or {}
+        if task_data.get('source') == 'interactive':
+            return LLMPriority.interactive
+        return LLMPriority.batch
+    
+    async def _map_chunks(self, document_id: UUID, raw_text: str) -> Optional[List[str]]:
+        """Map-phase chunks for long documents, split once per document and shared between tasks"""
+        if not llm_service.needs_chunking(raw_text):
+            return None
+        chunks = await chunk_store.get_chunks(document_id)
+        return [chunk.text for chunk in chunks] if chunks else None
+    
+    @staticmethod
+    def _assign_subject(classification_dict: dict, catalogue, metadata: dict, document_id: UUID):
+        """Set the subject on a classification row directly when the LLM's pick is confident enough"""
+        subject = catalogue.by_name.get(metadata.get('primary_topic'))
+        confidence = metadata.get('confidence', 0.0)
+        if subject and confidence >= AUTO_ASSIGN_CONFIDENCE_THRESHOLD:
+            classification_dict['subject_id'] = subject['id']
+            classification_dict['subject_confidence'] = confidence
+            classification_dict['auto_assigned'] = True
+            logger.info(f"✅ Auto-assigned document {document_id} to subject '{subject['subject_name']}' (confidence: {confidence:.2%})")
+        else:
+            logger.info(f"🔄 No confident subject match for document {document_id}. Document remains unclassified.")
+    
+    async def _local_classification(self, document_id: UUID, raw_text: str) -> Optional[LLMResult]:
+        """Classification from the local nearest-centroid classifier when its match is clear
+        
+        Returns None when the match is ambiguous (or the classifier is
+        unavailable) and Gemini should decide.
+        """
+        prediction = await subject_classifier.classify_document(document_id, raw_text)
+        if not prediction or not prediction.confident or prediction.confidence < AUTO_ASSIGN_CONFIDENCE_THRESHOLD:
+            return None
+        
+        logger.info(f"⚡ Local classifier matched document {document_id} to '{prediction.subject['subject_name']}' "
+                    f"(similarity {prediction.similarity:.2f}, margin {prediction.margin:.2f})")
+        return LLMResult(
+            content="",
+            model_used=f"local:{prediction.model_id}",
+            tokens_used=0,
+            processing_time=0.0,
+            metadata={
+                'primary_topic': prediction.subject['subject_name'],
+                'confidence': round(prediction.confidence, 3),
+                'category': 'other'
+            }
+        )
+    
+    async def _document_tags(self, document_id: UUID, raw_text: str) -> List[str]:
+        """Classification tags from the local keyword engine, computed once per document"""
+        try:
+            tags = await document_cache.get_artifact(
+                document_id, 'keywords', lambda text: keyword_engine.keywords_for(document_id, text)
+            )
+            if tags is None:  # Text not in the working-set cache
+                tags = await keyword_engine.keywords_for(document_id, raw_text)
+            return tags
+        except Exception as e:
+            logger.warning(f"⚠️ Keyword extraction failed for document {document_id}: {e}")
+            return []
+    
+    async def _index_document(self, document_id: UUID, raw_text: str):
+        """Add the document to the semantic search index and related-documents graph (best effort)"""
+        if settings.enable_semantic_search:
+            try:
+                await semantic_search.index_document(document_id, raw_text)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not index document {document_id} for search: {e}")
+        try:
+            await related_documents.add_document(document_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not update related documents for {document_id}: {e}")
+    
     async def process_summarization_task(self, task: dict) -> bool:
         """Process a summarization task"""
         try:
@@ -102,19 +404,13 @@ class BackgroundProcessor:
             
             logger.info(f"🔄 Processing summarization for document {document_id}")
             
-            # Mark task as processing
-            await self.update_task_status(task_id, TaskStatus.processing, started_at=datetime.utcnow())
+            # Get extracted text (shared with the document's other tasks)
+            working_set = await document_cache.get(document_id)
             
-            # Get extracted text
-            extracted_text_result = db_service.supabase.table('extracted_text')\
-                .select("raw_text")\
-                .eq('document_id', str(document_id))\
-                .execute()
-            
-            if not extracted_text_result.data:
+            if not working_set:
                 raise Exception("No extracted text found for document")
             
-            raw_text = extracted_text_result.data[0]['raw_text']
+            raw_text = working_set.text
             
             if not raw_text or len(raw_text.strip()) < 50:
                 raise Exception("Insufficient text for summarization")
@@ -123,7 +419,11 @@ class BackgroundProcessor:
             summary_type = task.get('task_data', {}).get('summary_type', 'brief')
             
             # Generate summary using LLM
-            summary_result = await llm_service.summarize_text(raw_text, summary_type)
+            summary_result = await llm_service.summarize_text(
+                raw_text, summary_type, priority=self._task_priority(task),
+                chunks=await self._map_chunks(document_id, raw_text),
+                use_cache=not task.get('task_data', {}).get('fresh')
+            )
             
             # Save summary to database
             summary_data = DocumentSummaryCreate(
@@ -138,6 +438,7 @@ class BackgroundProcessor:
             # Convert UUID to string for JSON serialization
             summary_dict = summary_data.model_dump()
             summary_dict['document_id'] = str(summary_dict['document_id'])
+            summary_dict['text_hash'] = working_set.text_hash
             
             db_result = db_service.supabase.table('document_summaries')\
                 .insert(summary_dict)\
@@ -156,33 +457,43 @@ class BackgroundProcessor:
             await self.update_task_status(task_id, TaskStatus.failed, error_message=str(e))
             return False
     
-    async def process_classification_task(self, task: dict) -> bool:
-        """Process a classification task"""
+    async def process_classification_task(self, task: dict, batch_result: Optional[LLMResult] = None,
+                                          local_checked: bool = False) -> bool:
+        """Process a classification task
+        
+        ``batch_result`` is this document's entry from a batched classification;
+        without one the local classifier is tried first (unless ``local_checked``
+        says the batch already did) and Gemini classifies the document on its own.
+        """
         try:
             document_id = UUID(task['document_id'])
             task_id = UUID(task['id'])
             
             logger.info(f"🔄 Processing classification for document {document_id}")
             
-            # Mark task as processing
-            await self.update_task_status(task_id, TaskStatus.processing, started_at=datetime.utcnow())
-            
-            # Get extracted text
-            extracted_text_result = db_service.supabase.table('extracted_text')\
-                .select("raw_text")\
-                .eq('document_id', str(document_id))\
-                .execute()
+            # Get extracted text (shared with the document's other tasks)
+            working_set = await document_cache.get(document_id)
             
-            if not extracted_text_result.data:
+            if not working_set:
                 raise Exception("No extracted text found for document")
             
-            raw_text = extracted_text_result.data[0]['raw_text']
+            raw_text = working_set.text
             
             if not raw_text or len(raw_text.strip()) < 20:
                 raise Exception("Insufficient text for classification")
             
             # Generate classification using LLM with database subjects
-            classification_result = await llm_service.classify_with_db_subjects(raw_text, db_service)
+            priority = self._task_priority(task)
+            classification_result = batch_result
+            if classification_result is None and not local_checked:
+                classification_result = await self._local_classification(document_id, raw_text)
+            # Batched and local results already pick from the catalogue's subjects
+            subject_chosen = classification_result is not None
+            if classification_result is None:
+                classification_result = await llm_service.classify_with_db_subjects(
+                    raw_text, db_service, priority=priority,
+                    use_cache=not (task.get('task_data') or {}).get('fresh')
+                )
             # Extract classification data from LLM metadata
             metadata = classification_result.metadata
             
@@ -192,13 +503,18 @@ class BackgroundProcessor:
                 primary_topic=metadata.get('primary_topic', 'unknown'),
                 confidence=metadata.get('confidence', 0.5),
                 category=metadata.get('category', 'other'),
-                tags=metadata.get('tags', []),
+                tags=await self._document_tags(document_id, raw_text),
                 model_used=classification_result.model_used
             )
             
             # Convert UUID to string for JSON serialization
             classification_dict = classification_data.model_dump()
             classification_dict['document_id'] = str(classification_dict['document_id'])
+            classification_dict['text_hash'] = working_set.text_hash
+            
+            # Skip the extra suggestion call when the subject was already chosen
+            if subject_chosen:
+                self._assign_subject(classification_dict, await subject_catalogue.get(), metadata, document_id)
             
             db_result = db_service.supabase.table('document_classifications')\
                 .insert(classification_dict)\
@@ -206,43 +522,47 @@ class BackgroundProcessor:
             
             if db_result.data:
                 logger.info(f"✅ Classification completed for document {document_id}")
+                if classification_dict.get('subject_id'):
+                    await subject_classifier.observe(document_id, classification_dict['subject_id'])
+                await self._index_document(document_id, raw_text)
                 
-                # 🚀 NEW: AUTO-ASSIGNMENT LOGIC
-                try:
-                    logger.info(f"🎯 Attempting auto-assignment for document {document_id}")
-                    
-                    # Get AI suggestion for best subject
-                    suggestion = await subject_service.suggest_subject_for_document(document_id)
-                    
-                    if suggestion and suggestion.get('subject_id'):
-                        confidence = suggestion.get('confidence', 0.0)
-                        subject_name = suggestion.get('subject_name', 'Unknown')
+                # 🚀 NEW: AUTO-ASSIGNMENT LOGIC (single classifications only)
+                if not subject_chosen:
+                    try:
+                        logger.info(f"🎯 Attempting auto-assignment for document {document_id}")
                         
-                        logger.info(f"🤖 AI suggests subject '{subject_name}' with confidence {confidence:.2%}")
+                        # Get AI suggestion for best subject
+                        suggestion = await subject_service.suggest_subject_for_document(
+                            document_id, priority=priority, use_local=False  # Already tried above
+                        )
                         
-                        # Auto-assign if confidence is high enough
-                        CONFIDENCE_THRESHOLD = 0.6  # 60% confidence threshold
-                        
-                        if confidence >= CONFIDENCE_THRESHOLD:
-                            success = await subject_service.assign_document_to_subject(
-                                document_id=document_id,
-                                subject_id=UUID(suggestion['subject_id']),
-                                confidence=confidence,
-                                auto_assigned=True  # Mark as auto-assigned
-                            )
+                        if suggestion and suggestion.get('subject_id'):
+                            confidence = suggestion.get('confidence', 0.0)
+                            subject_name = suggestion.get('subject_name', 'Unknown')
+                            
+                            logger.info(f"🤖 AI suggests subject '{subject_name}' with confidence {confidence:.2%}")
                             
-                            if success:
-                                logger.info(f"✅ Auto-assigned document {document_id} to subject '{subject_name}' (confidence: {confidence:.2%})")
+                            # Auto-assign if confidence is high enough
+                            if confidence >= AUTO_ASSIGN_CONFIDENCE_THRESHOLD:
+                                success = await subject_service.assign_document_to_subject(
+                                    document_id=document_id,
+                                    subject_id=UUID(suggestion['subject_id']),
+                                    confidence=confidence,
+                                    auto_assigned=True  # Mark as auto-assigned
+                                )
+                                
+                                if success:
+                                    logger.info(f"✅ Auto-assigned document {document_id} to subject '{subject_name}' (confidence: {confidence:.2%})")
+                                else:
+                                    logger.warning(f"⚠️ Failed to auto-assign document {document_id} to subject '{subject_name}'")
                             else:
-                                logger.warning(f"⚠️ Failed to auto-assign document {document_id} to subject '{subject_name}'")
+                                logger.info(f"🔄 Confidence too low ({confidence:.2%}) for auto-assignment. Document remains unclassified.")
                         else:
-                            logger.info(f"🔄 Confidence too low ({confidence:.2%}) for auto-assignment. Document remains unclassified.")
-                    else:
-                        logger.info(f"🔄 No suitable subject found for document {document_id}. Document remains unclassified.")
-                        
-                except Exception as assignment_error:
-                    logger.error(f"❌ Auto-assignment failed for document {document_id}: {assignment_error}")
-                    # Don't fail the entire classification task if auto-assignment fails
+                            logger.info(f"🔄 No suitable subject found for document {document_id}. Document remains unclassified.")
+                            
+                    except Exception as assignment_error:
+                        logger.error(f"❌ Auto-assignment failed for document {document_id}: {assignment_error}")
+                        # Don't fail the entire classification task if auto-assignment fails
                 
                 # Mark task as completed
                 await self.update_task_status(task_id, TaskStatus.completed, completed_at=datetime.utcnow())
@@ -255,11 +575,189 @@ class BackgroundProcessor:
             await self.update_task_status(task_id, TaskStatus.failed, error_message=str(e))
             return False
     
+    async def process_enrichment_task(self, task: dict) -> bool:
+        """Process an enrichment task: summary, classification and subject from one LLM call"""
+        try:
+            document_id = UUID(task['document_id'])
+            task_id = UUID(task['id'])
+            
+            logger.info(f"🔄 Processing enrichment for document {document_id}")
+            
+            # Get extracted text (shared with the document's other tasks)
+            working_set = await document_cache.get(document_id)
+            
+            if not working_set:
+                raise Exception("No extracted text found for document")
+            
+            raw_text = working_set.text
+            
+            if not raw_text or len(raw_text.strip()) < 50:
+                raise Exception("Insufficient text for enrichment")
+            
+            catalogue = await subject_catalogue.get()
+            task_data = task.get('task_data') or {}
+            
+            try:
+                enrichment_result = await llm_service.enrich_document(
+                    raw_text, catalogue, priority=self._task_priority(task),
+                    chunks=await self._map_chunks(document_id, raw_text),
+                    use_cache=not task_data.get('fresh')
+                )
+            except ValueError as parse_error:
+                # Unusable structured output - fall back to the separate summarize/classify tasks
+                logger.warning(f"⚠️ Enrichment output unusable for document {document_id} ({parse_error}); queuing separate tasks")
+                await self._queue_separate_tasks(document_id, task_data.get('source', DEFAULT_SOURCE))
+                await self.update_task_status(task_id, TaskStatus.completed, completed_at=datetime.utcnow())
+                return True
+            
+            metadata = enrichment_result.metadata
+            text_hash = working_set.text_hash
+            
+            # Save summary to database
+            summary_data = DocumentSummaryCreate(
+                document_id=document_id,
+                summary_text=metadata['summary'],
+                summary_type='brief',
+                model_used=enrichment_result.model_used,
+                tokens_used=enrichment_result.tokens_used,
+                processing_time=enrichment_result.processing_time
+            )
+            summary_dict = summary_data.model_dump()
+            summary_dict['document_id'] = str(summary_dict['document_id'])
+            summary_dict['text_hash'] = text_hash
+            
+            summary_result = db_service.supabase.table('document_summaries')\
+                .insert(summary_dict)\
+                .execute()
+            if not summary_result.data:
+                raise Exception("Failed to save summary to database")
+            
+            # Save classification, assigning the subject directly when confident enough
+            classification_data = DocumentClassificationCreate(
+                document_id=document_id,
+                primary_topic=metadata.get('primary_topic', 'unknown'),
+                confidence=metadata.get('confidence', 0.5),
+                category=metadata.get('category', 'other'),
+                tags=await self._document_tags(document_id, raw_text),
+                model_used=enrichment_result.model_used
+            )
+            classification_dict = classification_data.model_dump()
+            classification_dict['document_id'] = str(classification_dict['document_id'])
+            classification_dict['text_hash'] = text_hash
+            
+            self._assign_subject(classification_dict, catalogue, metadata, document_id)
+            
+            classification_result = db_service.supabase.table('document_classifications')\
+                .insert(classification_dict)\
+                .execute()
+            if not classification_result.data:
+                raise Exception("Failed to save classification to database")
+            
+            # The summary needs Gemini anyway; just keep the document's vector for the local classifier
+            if await subject_classifier.store_vector(document_id, raw_text) and classification_dict.get('subject_id'):
+                await subject_classifier.observe(document_id, classification_dict['subject_id'])
+            await self._index_document(document_id, raw_text)
+            
+            await self.update_task_status(task_id, TaskStatus.completed, completed_at=datetime.utcnow())
+            logger.info(f"✅ Enrichment completed for document {document_id}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Enrichment failed for document {document_id}: {e}")
+            await self.update_task_status(task_id, TaskStatus.failed, error_message=str(e))
+            return False
+    
+    async def process_classification_batch(self, tasks: List[dict]) -> int:
+        """Classify a group of claimed tasks with one batched prompt
+        
+        Documents the batch couldn't classify (invalid item, failed call,
+        missing text) go through process_classification_task on their own.
+        Returns the number of tasks completed.
+        """
+        texts = []
+        for task in tasks:
+            try:
+                working_set = await document_cache.get(UUID(task['document_id']))
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load text for document {task['document_id']}: {e}")
+                working_set = None
+            texts.append(working_set.text if working_set else None)
+        
+        batchable = [i for i, text in enumerate(texts) if text and len(text.strip()) >= 20]
+        batch_results: Dict[int, Optional[LLMResult]] = {}
+        
+        # Tags for the whole group in one vectorized keyword pass
+        try:
+            tags = await keyword_engine.keywords_batch([(UUID(tasks[i]['document_id']), texts[i]) for i in batchable])
+            for i, document_tags in zip(batchable, tags):
+                await document_cache.get_artifact(UUID(tasks[i]['document_id']), 'keywords', lambda _, value=document_tags: value)
+        except Exception as e:
+            logger.warning(f"⚠️ Batch keyword extraction failed: {e}")
+        
+        # Clear local matches don't need a seat in the prompt
+        for i in batchable:
+            local_result = await self._local_classification(UUID(tasks[i]['document_id']), texts[i])
+            if local_result is not None:
+                batch_results[i] = local_result
+        batchable = [i for i in batchable if i not in batch_results]
+        
+        if len(batchable) > 1:
+            first = tasks[batchable[0]]
+            results = await llm_service.classify_batch_with_db_subjects(
+                [texts[i] for i in batchable],
+                priority=self._task_priority(first),
+                use_cache=not (first.get('task_data') or {}).get('fresh')
+            )
+            batch_results.update(zip(batchable, results))
+        
+        completed = 0
+        for i, task in enumerate(tasks):
+            if await self.process_classification_task(task, batch_results.get(i), local_checked=i in batchable):
+                completed += 1
+        return completed
+    
+    @staticmethod
+    def _batch_key(task: dict) -> Optional[tuple]:
+        """Classify tasks with the same key can share one batched prompt"""
+        if task['task_type'] != 'classify':
+            return None
+        task_data = task.get('task_data') or {}
+        return (task_data.get('source') == 'interactive', bool(task_data.get('fresh')))
+    
+    def _plan_work(self, pending_tasks: List[dict], free_slots: int) -> List[List[dict]]:
+        """Turn scheduler-ordered tasks into at most ``free_slots`` units of work
+        
+        A unit is a single task, or up to classify_batch_size classify tasks
+        from the same lane that run as one batched LLM call.
+        """
+        units: List[List[dict]] = []
+        taken = set()
+        for i, task in enumerate(pending_tasks):
+            if len(units) >= free_slots:
+                break
+            if task['id'] in taken:
+                continue
+            taken.add(task['id'])
+            unit = [task]
+            
+            key = self._batch_key(task)
+            if key is not None and settings.classify_batch_size > 1:
+                for other in pending_tasks[i + 1:]:
+                    if len(unit) >= settings.classify_batch_size:
+                        break
+                    if other['id'] not in taken and self._batch_key(other) == key:
+                        taken.add(other['id'])
+                        unit.append(other)
+            units.append(unit)
+        return units
+    
     async def process_single_task(self, task: dict) -> bool:
         """Process a single task based on its type"""
         task_type = task['task_type']
         
-        if task_type == 'summarize':
+        if task_type == 'enrich':
+            return await self.process_enrichment_task(task)
+        elif task_type == 'summarize':
             return await self.process_summarization_task(task)
         elif task_type == 'classify':
             return await self.process_classification_task(task)
@@ -267,8 +765,90 @@ class BackgroundProcessor:
             logger.warning(f"⚠️ Unknown task type: {task_type}")
             return False
     
+    async def claim_task(self, task: dict) -> Optional[dict]:
+        """Atomically move a pending task to processing for this worker
+        
+        Returns the claimed row, or None if another worker got there first.
+        """
+        now = datetime.utcnow().isoformat()
+        try:
+            result = db_service.supabase.table('processing_queue')\
+                .update({
+                    'status': TaskStatus.processing,
+                    'started_at': now,
+                    'heartbeat_at': now,
+                    'worker_id': self.worker_id,
+                    'attempts': (task.get('attempts') or 0) + 1
+                })\
+                .eq('id', task['id'])\
+                .eq('status', 'pending')\
+                .execute()
+            
+            return result.data[0] if result.data else None
+            
+        except Exception as e:
+            logger.error(f"❌ Failed to claim task {task['id']}: {e}")
+            return None
+    
+    async def _run_task(self, task: dict):
+        """Run one claimed task and drop it from the in-flight set when done"""
+        try:
+            with usage_tracker.attribute(task['task_type'], [task['document_id']]):
+                await self.process_single_task(task)
+        finally:
+            self.processing_tasks.pop(task['id'], None)
+    
+    async def _run_batch(self, tasks: List[dict]):
+        """Run a claimed classification batch and drop its tasks from the in-flight set when done"""
+        try:
+            with usage_tracker.attribute('classify', [task['document_id'] for task in tasks]):
+                await self.process_classification_batch(tasks)
+        finally:
+            for task in tasks:
+                self.processing_tasks.pop(task['id'], None)
+    
+    def _in_flight(self) -> int:
+        """Running units of work; a batch's tasks share one asyncio task and one slot"""
+        return len({id(running) for running in self.processing_tasks.values()})
+    
+    async def _within_budget(self, pending_tasks: List[dict]) -> List[dict]:
+        """Drop background tasks while today's LLM spend is near the daily budget; user requests still run"""
+        deferring = await usage_tracker.over_budget()
+        if deferring != self._budget_deferring:
+            self._budget_deferring = deferring
+            if deferring:
+                logger.warning("💸 Daily LLM token budget nearly used, deferring background tasks")
+            else:
+                logger.info("✅ LLM token budget available again, resuming background tasks")
+        if not deferring:
+            return pending_tasks
+        return [task for task in pending_tasks if self._task_priority(task) == LLMPriority.interactive]
+    
+    async def _sleep(self, seconds: float):
+        """Sleep that wakes up early when the processor is stopping"""
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def _wait_for_capacity(self, timeout: float):
+        """Wait until a running task finishes, the timeout passes, or we are stopping"""
+        if not self.processing_tasks:
+            await self._sleep(timeout)
+            return
+        
+        stop_waiter = asyncio.ensure_future(self._stop_event.wait())
+        try:
+            await asyncio.wait(
+                [*self.processing_tasks.values(), stop_waiter],
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            stop_waiter.cancel()
+    
     async def process_pending_tasks(self):
-        """Main processing loop - processes pending tasks"""
+        """Main processing loop - keeps up to max_concurrent_tasks tasks running"""
         if not settings.background_processing_enabled:
             logger.info("Background processing is disabled")
             return
@@ -277,34 +857,117 @@ class BackgroundProcessor:
         
         while self.is_running:
             try:
-                # Get pending tasks
-                pending_tasks = await self.get_pending_tasks(limit=self.max_concurrent_tasks)
+                free_slots = self.max_concurrent_tasks - self._in_flight()
+                if free_slots <= 0:
+                    await self._wait_for_capacity(timeout=5)
+                    continue
+                
+                # Get pending tasks (extra candidates so classify tasks can be batched)
+                pending_tasks = await self.get_pending_tasks(limit=free_slots * max(1, settings.classify_batch_size))
                 
                 if not pending_tasks:
-                    await asyncio.sleep(5)  # Wait 5 seconds before checking again
+                    await self._wait_for_capacity(timeout=5)  # Check again in 5 seconds
                     continue
                 
-                # Process tasks concurrently
-                tasks_to_process = []
-                for task in pending_tasks[:self.max_concurrent_tasks]:
-                    if len(self.processing_tasks) < self.max_concurrent_tasks:
-                        task_coroutine = self.process_single_task(task)
-                        self.processing_tasks.add(task_coroutine)
-                        tasks_to_process.append(task_coroutine)
-                
-                if tasks_to_process:
-                    # Wait for tasks to complete
-                    results = await asyncio.gather(*tasks_to_process, return_exceptions=True)
-                    
-                    # Remove completed tasks
-                    for task_coroutine in tasks_to_process:
-                        self.processing_tasks.discard(task_coroutine)
+                # Start each unit we manage to claim; losing a claim means another worker has it
+                started = 0
+                for unit in self._plan_work(pending_tasks, free_slots):
+                    if not self.is_running:
+                        break
+                    rows = [await self.claim_task(task) for task in unit]
+                    claimed = [row for row in rows if row]
+                    if not claimed:
+                        continue
+                    # Only claimed tasks count against their queue's fair share
+                    self.scheduler.commit([task for task, row in zip(unit, rows) if row])
+                    if len(claimed) == 1:
+                        running = asyncio.create_task(self._run_task(claimed[0]))
+                    else:
+                        running = asyncio.create_task(self._run_batch(claimed))
+                    for row in claimed:
+                        self.processing_tasks[row['id']] = running
+                    started += 1
                 
-                await asyncio.sleep(2)  # Brief pause between batches
+                if not started:
+                    await self._sleep(2)  # Brief pause before looking again
                 
             except Exception as e:
                 logger.error(f"❌ Error in processing loop: {e}")
-                await asyncio.sleep(10)  # Wait longer on error
+                await self._sleep(10)  # Wait longer on error
+    
+    async def _heartbeat_loop(self):
+        """Periodically mark this worker's in-flight tasks as alive"""
+        while self.is_running:
+            await self._sleep(settings.task_heartbeat_interval)
+            task_ids = list(self.processing_tasks)
+            if not task_ids:
+                continue
+            try:
+                db_service.supabase.table('processing_queue')\
+                    .update({'heartbeat_at': datetime.utcnow().isoformat()})\
+                    .in_('id', task_ids)\
+                    .eq('worker_id', self.worker_id)\
+                    .execute()
+            except Exception as e:
+                logger.warning(f"⚠️ Failed to send task heartbeats: {e}")
+    
+    async def reap_stale_tasks(self) -> int:
+        """Requeue processing tasks whose worker stopped heartbeating (crash, OOM kill, restart)
+        
+        Tasks that have already used up max_retry_attempts are marked failed instead.
+        """
+        cutoff = (datetime.utcnow() - timedelta(seconds=settings.task_stale_after)).isoformat()
+        # Rows claimed before heartbeats existed only have started_at
+        stale_filter = f"heartbeat_at.lt.{cutoff},and(heartbeat_at.is.null,started_at.lt.{cutoff})"
+        
+        try:
+            failed = db_service.supabase.table('processing_queue')\
+                .update({
+                    'status': TaskStatus.failed,
+                    'worker_id': None,
+                    'error_message': 'Worker stopped responding; retry limit reached',
+                    'completed_at': datetime.utcnow().isoformat()
+                })\
+                .eq('status', 'processing')\
+                .gte('attempts', settings.max_retry_attempts)\
+                .or_(stale_filter)\
+                .execute()
+            
+            requeued = db_service.supabase.table('processing_queue')\
+                .update({'status': TaskStatus.pending, 'worker_id': None, 'heartbeat_at': None})\
+                .eq('status', 'processing')\
+                .or_(stale_filter)\
+                .execute()
+            
+            failed_count = len(failed.data) if failed.data else 0
+            requeued_count = len(requeued.data) if requeued.data else 0
+            if failed_count or requeued_count:
+                logger.warning(f"🧹 Reaped stale tasks: {requeued_count} requeued, {failed_count} failed")
+            return requeued_count
+            
+        except Exception as e:
+            logger.error(f"❌ Failed to reap stale tasks: {e}")
+            return 0
+    
+    async def _reaper_loop(self):
+        while self.is_running:
+            await self.reap_stale_tasks()
+            await self._sleep(settings.task_reaper_interval)
+    
+    async def _hand_back_tasks(self, task_ids: List[str]):
+        """Return unfinished tasks to the queue so another worker can pick them up"""
+        if not task_ids:
+            return
+        try:
+            db_service.supabase.table('processing_queue')\
+                .update({'status': TaskStatus.pending, 'worker_id': None, 'heartbeat_at': None})\
+                .in_('id', task_ids)\
+                .eq('status', 'processing')\
+                .execute()
+            logger.info(f"↩️ Handed back {len(task_ids)} unfinished tasks to the queue")
+        except Exception as e:
+            # The reaper will requeue them once their heartbeats go stale
+            logger.error(f"❌ Failed to hand back tasks {task_ids}: {e}")
     
     async def start(self):
         """Start the background processor"""
@@ -318,24 +981,47 @@ class BackgroundProcessor:
             return
         
         self.is_running = True
-        logger.info("🚀 Background processor started")
+        self._stop_event.clear()
+        logger.info(f"🚀 Background processor started (worker {self.worker_id})")
+        
+        self._maintenance_tasks = [
+            asyncio.create_task(self._heartbeat_loop()),
+            asyncio.create_task(self._reaper_loop())
+        ]
         
         # Start processing loop
         await self.process_pending_tasks()
     
-    async def stop(self):
-        """Stop the background processor"""
+    async def stop(self, drain_timeout: Optional[float] = None):
+        """Stop claiming work, drain in-flight tasks until the deadline, then hand back the rest"""
+        if drain_timeout is None:
+            drain_timeout = settings.shutdown_drain_timeout
+        
         self.is_running = False
+        self._stop_event.set()
         
-        # Wait for current tasks to complete
-        if self.processing_tasks:
-            logger.info("⏳ Waiting for current tasks to complete...")
-            await asyncio.gather(*self.processing_tasks, return_exceptions=True)
+        in_flight = dict(self.processing_tasks)
+        if in_flight:
+            logger.info(f"⏳ Draining {len(in_flight)} in-flight tasks (deadline {drain_timeout}s)...")
+            _, unfinished = await asyncio.wait(in_flight.values(), timeout=drain_timeout)
+            
+            if unfinished:
+                for running in unfinished:
+                    running.cancel()
+                await asyncio.gather(*unfinished, return_exceptions=True)
+                
+                unfinished_ids = [task_id for task_id, running in in_flight.items() if running in unfinished]
+                await self._hand_back_tasks(unfinished_ids)
+        
+        for maintenance_task in self._maintenance_tasks:
+            maintenance_task.cancel()
+        await asyncio.gather(*self._maintenance_tasks, return_exceptions=True)
+        self._maintenance_tasks = []
         
         logger.info("🛑 Background processor stopped")
     
-    async def queue_document_processing(self, document_id: UUID) -> bool:
-        """Queue all processing tasks for a document"""
+    async def _queue_separate_tasks(self, document_id: UUID, source: str) -> bool:
+        """Queue the individual summarize and classify tasks for a document"""
         success = True
         
         # Add summarization task
@@ -344,7 +1030,7 @@ class BackgroundProcessor:
                 document_id, 
                 TaskType.summarize, 
                 priority=1,
-                task_data={'summary_type': 'brief'}
+                task_data={'summary_type': 'brief', 'source': source}
             )
             success = success and task_added
         
@@ -353,11 +1039,29 @@ class BackgroundProcessor:
             task_added = await self.add_task(
                 document_id, 
                 TaskType.classify, 
-                priority=2
+                priority=2,
+                task_data={'source': source}
             )
             success = success and task_added
         
         return success
+    
+    async def queue_document_processing(self, document_id: UUID, source: str = DEFAULT_SOURCE) -> bool:
+        """Queue all processing tasks for a document
+        
+        With enrichment enabled a single 'enrich' task replaces the summarize and
+        classify tasks. ``source`` picks the scheduler queue, e.g. 'bulk' for mass
+        reprocessing so it can't starve fresh uploads or interactive requests.
+        """
+        if settings.enable_enrichment and settings.enable_summarization and settings.enable_classification:
+            return await self.add_task(
+                document_id,
+                TaskType.enrich,
+                priority=1,
+                task_data={'source': source}
+            )
+        
+        return await self._queue_separate_tasks(document_id, source)
 
 # Global background processor instance
 background_processor = BackgroundProcessor()
\ No newline at end of file
@@ -0,0 +1,102 @@
+# backend/services/chunk_store.py
+import logging
+from typing import List, Optional
+from uuid import UUID
+
+from config.settings import settings
+from services.database import db_service
+from services.document_cache import document_cache
+from services.chunker import Chunk, chunk_text, token_counter
+from services.llm_service import llm_service
+
+logger = logging.getLogger(__name__)
+
+class DocumentChunkStore:
+    """Per-document chunks, split once and persisted in document_chunks.
+
+    Rows hold offsets into extracted_text rather than the text itself and are
+    tied to the text hash and chunking parameters, so a re-extracted document
+    or a config change re-splits instead of serving stale offsets. Within a
+    worker the chunks also live in the document's working-set cache.
+    """
+
+    def __init__(self, max_tokens: int, overlap_tokens: int):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    async def get_chunks(self, document_id: UUID) -> Optional[List[Chunk]]:
+        working_set = await document_cache.get(document_id)
+        if working_set is None:
+            return None
+
+        return await document_cache.get_artifact(
+            document_id, 'chunks',
+            lambda text: self._load_or_split(document_id, text, working_set.text_hash)
+        )
+
+    async def _load_or_split(self, document_id: UUID, text: str, text_hash: str) -> List[Chunk]:
+        chunks = self._load(document_id, text, text_hash)
+        if chunks:
+            return chunks
+
+        await llm_service.calibrate_token_counter(text)
+        chunks = chunk_text(text, self.max_tokens, self.overlap_tokens, token_counter)
+        self._save(document_id, text_hash, chunks)
+        logger.info(f"✂️ Split document {document_id} into {len(chunks)} chunks")
+        return chunks
+
+    def _load(self, document_id: UUID, text: str, text_hash: str) -> Optional[List[Chunk]]:
+        try:
+            result = db_service.supabase.table('document_chunks')\
+                .select("chunk_index, start_offset, end_offset, token_count")\
+                .eq('document_id', str(document_id))\
+                .eq('text_hash', text_hash)\
+                .eq('max_tokens', self.max_tokens)\
+                .eq('overlap_tokens', self.overlap_tokens)\
+                .order('chunk_index')\
+                .execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load stored chunks for document {document_id}: {e}")
+            return None
+
+        return [
+            Chunk(
+                index=row['chunk_index'],
+                start=row['start_offset'],
+                end=row['end_offset'],
+                text=text[row['start_offset']:row['end_offset']],
+                token_count=row['token_count']
+            )
+            for row in result.data or []
+        ]
+
+    def _save(self, document_id: UUID, text_hash: str, chunks: List[Chunk]):
+        try:
+            db_service.supabase.table('document_chunks')\
+                .delete()\
+                .eq('document_id', str(document_id))\
+                .execute()
+            if chunks:
+                db_service.supabase.table('document_chunks').insert([
+                    {
+                        'document_id': str(document_id),
+                        'chunk_index': chunk.index,
+                        'start_offset': chunk.start,
+                        'end_offset': chunk.end,
+                        'token_count': chunk.token_count,
+                        'chunk_hash': chunk.chunk_hash,
+                        'text_hash': text_hash,
+                        'max_tokens': self.max_tokens,
+                        'overlap_tokens': self.overlap_tokens
+                    }
+                    for chunk in chunks
+                ]).execute()
+        except Exception as e:
+            # Chunks are still usable from the working-set cache; they'll be re-split next time
+            logger.warning(f"⚠️ Could not persist chunks for document {document_id}: {e}")
+
+# Global chunk store
+chunk_store = DocumentChunkStore(
+    max_tokens=settings.chunk_max_tokens,
+    overlap_tokens=settings.chunk_overlap_tokens
+)
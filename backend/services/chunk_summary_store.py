@@ -0,0 +1,59 @@
+# backend/services/chunk_summary_store.py
+import logging
+from typing import Dict, List
+
+from services.database import db_service
+
+logger = logging.getLogger(__name__)
+
+class ChunkSummaryStore:
+    """Map-phase chunk summaries persisted by chunk hash.
+
+    The map prompt doesn't depend on the summary type, so a detailed or
+    bullet-point summary after a brief one (or a re-extracted document whose
+    chunks mostly didn't change) only pays for missing chunks and the reduce.
+    Rows are also keyed by model and map prompt version.
+    """
+
+    def __init__(self, table: str = 'chunk_summaries'):
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, chunk_hashes: List[str], model: str, prompt_version: int) -> Dict[str, str]:
+        if not chunk_hashes:
+            return {}
+        try:
+            result = db_service.supabase.table(self.table)\
+                .select("chunk_hash, summary_text")\
+                .in_('chunk_hash', list(set(chunk_hashes)))\
+                .eq('model_used', model)\
+                .eq('prompt_version', prompt_version)\
+                .execute()
+            found = {row['chunk_hash']: row['summary_text'] for row in result.data or []}
+        except Exception as e:
+            logger.warning(f"⚠️ Could not read stored chunk summaries: {e}")
+            found = {}
+
+        self.hits += sum(1 for chunk_hash in chunk_hashes if chunk_hash in found)
+        self.misses += sum(1 for chunk_hash in chunk_hashes if chunk_hash not in found)
+        return found
+
+    def put_many(self, summaries: Dict[str, str], model: str, prompt_version: int):
+        if not summaries:
+            return
+        try:
+            db_service.supabase.table(self.table).upsert([
+                {
+                    'chunk_hash': chunk_hash,
+                    'model_used': model,
+                    'prompt_version': prompt_version,
+                    'summary_text': summary_text
+                }
+                for chunk_hash, summary_text in summaries.items()
+            ], on_conflict='chunk_hash,model_used,prompt_version').execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not store chunk summaries: {e}")
+
+# Global chunk summary store
+chunk_summary_store = ChunkSummaryStore()
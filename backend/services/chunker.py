@@ -0,0 +1,170 @@
+# backend/services/chunker.py
+import hashlib
+import logging
+import re
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Words and individual punctuation marks - close to how SentencePiece splits prose
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+# Sentence terminators (kept with their sentence, plus closing quotes/brackets) or paragraph breaks
+_SENTENCE_END_RE = re.compile(r"[.!?]+[\"')\]]*(?=\s|$)|\n\s*\n")
+# Fallback split points for a single sentence longer than a whole chunk
+_WORD_RE = re.compile(r"\S+")
+
+@dataclass
+class Chunk:
+    index: int
+    start: int  # character offsets into the document text
+    end: int
+    text: str
+    token_count: int
+
+    @property
+    def chunk_hash(self) -> str:
+        return hashlib.sha256(self.text.encode('utf-8')).hexdigest()
+
+class TokenCounter:
+    """Local token counter: regex pieces scaled by a ratio calibrated against the model.
+
+    ``calibrate`` is fed one real count_tokens result; until then a typical
+    ratio for English prose is used.
+    """
+
+    DEFAULT_RATIO = 1.3
+
+    def __init__(self, ratio: float = DEFAULT_RATIO):
+        self.ratio = ratio
+        self.calibrated = False
+
+    @staticmethod
+    def raw_count(text: str, start: int = 0, end: Optional[int] = None) -> int:
+        end = len(text) if end is None else end
+        return sum(1 for _ in _TOKEN_RE.finditer(text, start, end))
+
+    def scale(self, raw: int) -> int:
+        return max(1, round(raw * self.ratio)) if raw else 0
+
+    def count(self, text: str) -> int:
+        return self.scale(self.raw_count(text))
+
+    def calibrate(self, sample: str, model_tokens: int):
+        raw = self.raw_count(sample)
+        if raw and model_tokens:
+            self.ratio = model_tokens / raw
+            self.calibrated = True
+            logger.info(f"✅ Token counter calibrated: {self.ratio:.3f} model tokens per piece")
+
+def iter_sentence_spans(text: str) -> Iterator[Tuple[int, int]]:
+    """(start, end) offsets of each sentence, punctuation included, whitespace trimmed"""
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        end = match.end()
+        segment = text[start:end]
+        stripped = segment.strip()
+        if stripped:
+            span_start = start + (len(segment) - len(segment.lstrip()))
+            yield span_start, span_start + len(stripped)
+        start = end
+
+    segment = text[start:]
+    stripped = segment.strip()
+    if stripped:
+        span_start = start + (len(segment) - len(segment.lstrip()))
+        yield span_start, span_start + len(stripped)
+
+def _bounded_spans(text: str, limit: float, counter: TokenCounter) -> Iterator[Tuple[int, int, int]]:
+    """Sentence spans with their raw token counts, splitting sentences longer than ``limit``"""
+    for start, end in iter_sentence_spans(text):
+        raw = counter.raw_count(text, start, end)
+        if raw <= limit:
+            yield start, end, raw
+            continue
+
+        piece_start, piece_end, piece_raw = None, start, 0
+        for word in _WORD_RE.finditer(text, start, end):
+            word_raw = counter.raw_count(text, word.start(), word.end())
+            if piece_start is not None and piece_raw + word_raw > limit:
+                yield piece_start, piece_end, piece_raw
+                piece_start, piece_raw = None, 0
+            if piece_start is None:
+                piece_start = word.start()
+            piece_end = word.end()
+            piece_raw += word_raw
+        if piece_start is not None:
+            yield piece_start, piece_end, piece_raw
+
+def _is_cut_point(text: str, start: int, end: int, raw: int, gap: float) -> bool:
+    """Content-defined boundary: decided by the sentence's own text, about once per ``gap`` raw tokens"""
+    return zlib.crc32(text[start:end].encode('utf-8')) < (raw / gap) * 2**32
+
+def iter_chunks(text: str, max_tokens: int, overlap_tokens: int = 0,
+                counter: Optional[TokenCounter] = None) -> Iterator[Chunk]:
+    """Stream chunks of at most ``max_tokens`` in one pass over the text.
+
+    Chunks end on sentence boundaries picked by content: once a chunk holds a
+    third of ``max_tokens`` of new text, it ends after the first sentence
+    whose hash marks a cut point (or when the next sentence wouldn't fit).
+    An edit therefore only moves the boundaries around it and later chunks
+    keep their text and hash. Each chunk after the first repeats up to
+    ``overlap_tokens`` of trailing sentences from the previous one.
+    """
+    counter = counter or token_counter
+    limit = max(1.0, max_tokens / counter.ratio)
+    overlap_limit = min(overlap_tokens, max_tokens // 2) / counter.ratio
+    min_new = limit / 3
+    gap = limit / 6  # Expected new text past min_new before a cut point; few chunks reach the limit
+
+    window: deque = deque()  # (start, end, raw) of sentences in the current chunk
+    window_raw = 0
+    new_raw = 0  # Tokens in the window that aren't overlap
+    index = 0
+
+    def emit() -> Chunk:
+        chunk_start, chunk_end = window[0][0], window[-1][1]
+        return Chunk(index, chunk_start, chunk_end, text[chunk_start:chunk_end], counter.scale(window_raw))
+
+    def carry_overlap(next_raw: int):
+        # Carry trailing sentences over as overlap, as long as the next sentence still fits
+        kept: deque = deque()
+        kept_raw = 0
+        while window and kept_raw + window[-1][2] <= overlap_limit:
+            sentence = window.pop()
+            kept.appendleft(sentence)
+            kept_raw += sentence[2]
+        while kept and kept_raw + next_raw > limit:
+            kept_raw -= kept.popleft()[2]
+        return kept, kept_raw
+
+    for start, end, raw in _bounded_spans(text, limit, counter):
+        if new_raw and window_raw + raw > limit:
+            yield emit()
+            index += 1
+            window, window_raw = carry_overlap(raw)
+            new_raw = 0
+        while not new_raw and window and window_raw + raw > limit:
+            window_raw -= window.popleft()[2]  # Overlap kept at a cut point must leave room
+
+        window.append((start, end, raw))
+        window_raw += raw
+        new_raw += raw
+
+        if new_raw >= min_new and _is_cut_point(text, start, end, raw, gap):
+            yield emit()
+            index += 1
+            window, window_raw = carry_overlap(0)
+            new_raw = 0
+
+    if window and new_raw:
+        yield emit()
+
+def chunk_text(text: str, max_tokens: int, overlap_tokens: int = 0,
+               counter: Optional[TokenCounter] = None) -> List[Chunk]:
+    return list(iter_chunks(text, max_tokens, overlap_tokens, counter))
+
+# Global token counter, calibrated once against Gemini's count_tokens
+token_counter = TokenCounter()
@@ -0,0 +1,145 @@
+# backend/services/concurrency_controller.py
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Deque, Dict, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class LimitChange:
+    timestamp: float
+    old_limit: int
+    new_limit: int
+    reason: str
+
+class AdaptiveConcurrencyController:
+    """AIMD controller for the number of LLM tasks allowed to run at once.
+
+    The limit grows by one after every window of healthy calls (a window is
+    ``limit`` calls, so growth is roughly one step per round of full
+    parallelism) and is halved on rate-limit errors or latency spikes.
+    """
+
+    def __init__(self, initial_limit: int = 3, min_limit: int = 1, max_limit: int = 16,
+                 latency_target: float = 8.0, latency_spike_factor: float = 2.0,
+                 max_error_rate: float = 0.2, decrease_cooldown: float = 10.0,
+                 history_size: int = 100):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.latency_spike_factor = latency_spike_factor
+        self.max_error_rate = max_error_rate
+        self.decrease_cooldown = decrease_cooldown
+
+        self._limit = max(min_limit, min(initial_limit, max_limit))
+        self._ewma_latency: Optional[float] = None
+        self._window_calls = 0
+        self._window_errors = 0
+        self._last_decrease = 0.0
+
+        self.total_calls = 0
+        self.total_errors = 0
+        self.total_rate_limited = 0
+        self.history: Deque[LimitChange] = deque(maxlen=history_size)
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    def set_bounds(self, min_limit: Optional[int] = None, max_limit: Optional[int] = None):
+        """Change the allowed range (e.g. per-deployment worker config), clamping the current limit"""
+        if min_limit is not None:
+            self.min_limit = min_limit
+        if max_limit is not None:
+            self.max_limit = max_limit
+        self._set_limit(self._limit, "bounds_changed")
+
+    def record(self, latency: float, success: bool = True, rate_limited: bool = False):
+        """Record the outcome of one LLM call and adjust the limit"""
+        self.total_calls += 1
+
+        if rate_limited:
+            self.total_rate_limited += 1
+            self.total_errors += 1
+            self._decrease("rate_limited")
+            return
+
+        if not success:
+            self.total_errors += 1
+            self._window_errors += 1
+        else:
+            # Latency is only meaningful for calls that actually completed
+            alpha = 0.2
+            if self._ewma_latency is None:
+                self._ewma_latency = latency
+            else:
+                self._ewma_latency = alpha * latency + (1 - alpha) * self._ewma_latency
+
+            if latency > self.latency_target * self.latency_spike_factor:
+                self._decrease(f"latency_spike ({latency:.1f}s)")
+                return
+
+        self._window_calls += 1
+        if self._window_calls < self._limit:
+            return
+
+        error_rate = self._window_errors / self._window_calls
+        latency_ok = self._ewma_latency is None or self._ewma_latency <= self.latency_target
+        self._reset_window()
+
+        if error_rate <= self.max_error_rate and latency_ok:
+            self._set_limit(self._limit + 1, "additive_increase")
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        # A burst of 429s from one round of calls should only halve once
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        self._reset_window()
+        self._set_limit(self._limit // 2, reason)
+
+    def _reset_window(self):
+        self._window_calls = 0
+        self._window_errors = 0
+
+    def _set_limit(self, new_limit: int, reason: str):
+        new_limit = max(self.min_limit, min(new_limit, self.max_limit))
+        if new_limit == self._limit:
+            return
+
+        change = LimitChange(
+            timestamp=time.time(),
+            old_limit=self._limit,
+            new_limit=new_limit,
+            reason=reason
+        )
+        self.history.append(change)
+        self._limit = new_limit
+        logger.info(f"⚖️ Concurrency limit {change.old_limit} -> {new_limit} ({reason})")
+
+    def snapshot(self) -> Dict:
+        """Current state and recent limit changes for the metrics endpoint"""
+        return {
+            "limit": self._limit,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "ewma_latency": round(self._ewma_latency, 3) if self._ewma_latency is not None else None,
+            "latency_target": self.latency_target,
+            "total_calls": self.total_calls,
+            "total_errors": self.total_errors,
+            "total_rate_limited": self.total_rate_limited,
+            "history": [asdict(change) for change in self.history]
+        }
+
+# Global concurrency controller shared by the LLM service and background processor
+concurrency_controller = AdaptiveConcurrencyController(
+    initial_limit=settings.initial_concurrent_tasks,
+    min_limit=settings.min_concurrent_tasks,
+    max_limit=settings.max_concurrent_tasks,
+    latency_target=settings.llm_latency_target
+)
@@ -0,0 +1,170 @@
+# backend/services/document_cache.py
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+from uuid import UUID
+
+from config.settings import settings
+from services.database import db_service
+
+logger = logging.getLogger(__name__)
+
+def compute_text_hash(text: str) -> str:
+    """Stable fingerprint of extracted text, used to reuse results across identical documents"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _approx_size(value: Any) -> int:
+    """Rough in-memory size used for the cache budget (characters, not exact bytes)"""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(_approx_size(item) for item in value) + 8 * len(value)
+    if isinstance(value, dict):
+        return sum(_approx_size(k) + _approx_size(v) for k, v in value.items())
+    if hasattr(value, '__dict__'):
+        return _approx_size(vars(value))
+    return 64
+
+@dataclass
+class DocumentWorkingSet:
+    document_id: str
+    text: str
+    text_hash: str
+    loaded_at: float
+    artifacts: Dict[str, Any] = field(default_factory=dict)
+    size: int = 0
+
+class DocumentCache:
+    """Short-lived, size-bounded working set of document text and derived artifacts.
+
+    Every task in a worker (summarize, classify, enrich, subject suggestion)
+    reads the document through here, so a burst of tasks for one upload costs
+    a single extracted_text read. Entries expire after ``ttl_seconds`` and the
+    least recently used ones are evicted once ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, DocumentWorkingSet]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put_text(self, document_id: UUID, text: str) -> DocumentWorkingSet:
+        """Seed the cache with freshly extracted text (called at extraction time)"""
+        key = str(document_id)
+        self.invalidate(key)
+
+        entry = DocumentWorkingSet(
+            document_id=key,
+            text=text,
+            text_hash=compute_text_hash(text),
+            loaded_at=time.monotonic(),
+            size=_approx_size(text)
+        )
+        self._entries[key] = entry
+        self._size += entry.size
+        self._evict()
+        return entry
+
+    def _get_cached(self, key: str) -> Optional[DocumentWorkingSet]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.loaded_at > self.ttl_seconds:
+            self.invalidate(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def get(self, document_id: UUID) -> Optional[DocumentWorkingSet]:
+        """Working set for a document, loading its text from the database on a miss"""
+        key = str(document_id)
+        entry = self._get_cached(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        # Concurrent misses for the same document share one database read
+        if key in self._loading:
+            return await asyncio.shield(self._loading[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            result = db_service.supabase.table('extracted_text')\
+                .select("raw_text")\
+                .eq('document_id', key)\
+                .execute()
+
+            text = result.data[0]['raw_text'] if result.data else None
+            entry = self.put_text(key, text) if text is not None else None
+            future.set_result(entry)
+            return entry
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._loading[key]
+
+    async def get_text(self, document_id: UUID) -> Optional[str]:
+        entry = await self.get(document_id)
+        return entry.text if entry else None
+
+    async def get_artifact(self, document_id: UUID, name: str, factory: Callable[[str], Any]) -> Any:
+        """Derived data for a document (chunks, token counts, ...), computed once from its text"""
+        entry = await self.get(document_id)
+        if entry is None:
+            return None
+
+        if name not in entry.artifacts:
+            value = factory(entry.text)
+            if asyncio.iscoroutine(value):
+                value = await value
+            # The entry may have been evicted while the factory ran
+            if self._entries.get(entry.document_id) is not entry:
+                return value
+            entry.artifacts[name] = value
+            added = _approx_size(value)
+            entry.size += added
+            self._size += added
+            self._evict()
+        return entry.artifacts.get(name)
+
+    def invalidate(self, document_id: UUID):
+        entry = self._entries.pop(str(document_id), None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def _evict(self):
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._size -= entry.size
+            self.evictions += 1
+
+    def snapshot(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "size": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+# Global working-set cache shared by all tasks in this process
+document_cache = DocumentCache(
+    max_bytes=settings.document_cache_max_bytes,
+    ttl_seconds=settings.document_cache_ttl
+)
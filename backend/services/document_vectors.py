@@ -0,0 +1,46 @@
+# backend/services/document_vectors.py
+import logging
+from typing import Dict, List
+from uuid import UUID
+
+import numpy as np
+
+from services.database import db_service
+
+logger = logging.getLogger(__name__)
+
+class DocumentVectorStore:
+    """One embedding per document in document_embeddings, tagged with the embedding backend"""
+
+    async def save(self, document_id: UUID, vector: np.ndarray, model_id: str) -> bool:
+        try:
+            db_service.supabase.table('document_embeddings').upsert({
+                'document_id': str(document_id),
+                'model_id': model_id,
+                'vector': [round(float(x), 6) for x in vector]
+                # updated_at is stamped by the database (migration 012) so readers can sync incrementally
+            }, on_conflict='document_id').execute()
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Could not store embedding for document {document_id}: {e}")
+            return False
+
+    async def load_many(self, document_ids: List[str], model_id: str) -> Dict[str, np.ndarray]:
+        """Vectors for the given documents that were embedded with ``model_id``"""
+        vectors: Dict[str, np.ndarray] = {}
+        for start in range(0, len(document_ids), 200):
+            try:
+                result = db_service.supabase.table('document_embeddings')\
+                    .select("document_id, vector")\
+                    .in_('document_id', document_ids[start:start + 200])\
+                    .eq('model_id', model_id)\
+                    .execute()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load document embeddings: {e}")
+                break
+            for row in result.data or []:
+                vectors[row['document_id']] = np.asarray(row['vector'], dtype=np.float32)
+        return vectors
+
+# Global document vector store
+document_vectors = DocumentVectorStore()
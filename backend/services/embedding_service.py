@@ -0,0 +1,115 @@
+# backend/services/embedding_service.py
+import asyncio
+import logging
+import re
+import threading
+import zlib
+from typing import List, Optional
+
+import numpy as np
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+
+class HashingEmbedder:
+    """Dependency-free fallback: signed feature hashing of words and word bigrams.
+
+    Not semantic like a sentence-transformer, but documents about the same
+    subject share vocabulary, which is enough for centroid matching and
+    lexical-ish "semantic" search when no model weights are installed.
+    """
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.model_id = f"hashing-{dimension}"
+
+    def _features(self, text: str) -> List[str]:
+        words = [word.lower() for word in _WORD_RE.findall(text)]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            if not features:
+                continue
+            # crc32 is stable across processes, unlike hash()
+            hashes = np.fromiter((zlib.crc32(f.encode('utf-8')) for f in features), dtype=np.uint64, count=len(features))
+            signs = np.where(hashes & (1 << 31), -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors[row], (hashes % self.dimension).astype(np.int64), signs)
+        # Sublinear term frequency keeps long documents from being dominated by common words
+        np.copyto(vectors, np.sign(vectors) * np.log1p(np.abs(vectors)))
+        return vectors
+
+class EmbeddingService:
+    """Text embeddings from sentence-transformers, or feature hashing when it isn't installed.
+
+    Vectors are float32 and L2-normalized, so a dot product is the cosine
+    similarity. ``model_id`` identifies the backend; vectors from different
+    backends must never be compared (they're stored tagged with it).
+    """
+
+    def __init__(self, model_name: str, dimension: int, hashing_dimension: int, max_chars: int):
+        self.model_name = model_name
+        self.max_chars = max_chars
+        self._hashing_dimension = hashing_dimension
+        self._configured_dimension = dimension
+        self._model = None
+        self._fallback: Optional[HashingEmbedder] = None
+        self._load_lock = threading.Lock()
+
+    def _load(self):
+        if self._model is not None or self._fallback is not None:
+            return
+        with self._load_lock:
+            if self._model is not None or self._fallback is not None:
+                return
+            try:
+                from sentence_transformers import SentenceTransformer  # Optional dependency
+                self._model = SentenceTransformer(self.model_name)
+                logger.info(f"✅ Loaded embedding model {self.model_name}")
+            except Exception as e:
+                logger.warning(f"⚠️ Embedding model {self.model_name} unavailable ({e}) - using hashing embeddings")
+                self._fallback = HashingEmbedder(self._hashing_dimension)
+
+    @property
+    def model_id(self) -> str:
+        self._load()
+        return self.model_name if self._model is not None else self._fallback.model_id
+
+    @property
+    def dimension(self) -> int:
+        self._load()
+        if self._model is not None:
+            return self._model.get_sentence_embedding_dimension() or self._configured_dimension
+        return self._fallback.dimension
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dimension) float32 matrix of unit vectors"""
+        self._load()
+        texts = [text[:self.max_chars] for text in texts]
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        if self._model is not None:
+            vectors = np.asarray(self._model.encode(texts, batch_size=32, show_progress_bar=False), dtype=np.float32)
+        else:
+            vectors = self._fallback.encode(texts)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    async def embed_async(self, texts: List[str]) -> np.ndarray:
+        """embed() off the event loop - model inference is CPU bound"""
+        return await asyncio.to_thread(self.embed, texts)
+
+# Global embedding service
+embedding_service = EmbeddingService(
+    model_name=settings.embedding_model,
+    dimension=settings.embedding_dimension,
+    hashing_dimension=settings.embedding_hashing_dimension,
+    max_chars=settings.embedding_max_chars
+)
@@ -0,0 +1,64 @@
+# backend/services/extraction_executor.py
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# One TextExtractor per pool process, created on first use
+_process_extractor = None
+
+def _extract_in_process(file_path: str):
+    global _process_extractor
+    if _process_extractor is None:
+        from services.text_extractor import TextExtractor
+        _process_extractor = TextExtractor()
+    return _process_extractor.extract_text(file_path)
+
+class ExtractionExecutor:
+    """Runs OCR/PDF extraction in a bounded process pool off the event loop.
+
+    Extraction is CPU-bound and can use a lot of memory on large scans, so it
+    gets its own pool size instead of sharing the LLM task concurrency, and a
+    crashed extraction process only breaks the pool, not the API process.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(max_workers)
+        self.in_flight = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    async def extract(self, file_path: str):
+        """Extract text from a file, waiting for a free extraction slot"""
+        async with self._slots:
+            self.in_flight += 1
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self._get_pool(), _extract_in_process, file_path)
+            except BrokenProcessPool:
+                # A child died (e.g. OOM on a huge scan); start a fresh pool for the next call
+                logger.error(f"❌ Extraction process crashed while processing {file_path}")
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False)
+                    self._pool = None
+                raise
+            finally:
+                self.in_flight -= 1
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+# Global extraction executor
+extraction_executor = ExtractionExecutor(max_workers=settings.extraction_max_workers)
@@ -0,0 +1,174 @@
+# backend/services/gemini_transport.py
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com"
+
+class GeminiAPIError(Exception):
+    """Non-success response (or transport failure) from the Gemini REST API"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def rate_limited(self) -> bool:
+        return self.status_code == 429
+
+class GeminiTimeoutError(GeminiAPIError):
+    """The call didn't finish within its deadline and was cancelled"""
+
+@dataclass
+class GeminiResponse:
+    text: str
+    finish_reason: Optional[str]
+    prompt_tokens: Optional[int]
+    output_tokens: Optional[int]
+    total_tokens: Optional[int]
+
+def _camel_case(key: str) -> str:
+    head, *rest = key.split('_')
+    return head + ''.join(part.title() for part in rest)
+
+def parse_generate_response(data: Dict[str, Any]) -> GeminiResponse:
+    """Text, finish reason and usage metadata from a generateContent (or stream chunk) payload"""
+    candidates = data.get('candidates') or []
+    candidate = candidates[0] if candidates else {}
+    parts = (candidate.get('content') or {}).get('parts') or []
+    usage = data.get('usageMetadata') or {}
+    return GeminiResponse(
+        text="".join(part.get('text', '') for part in parts),
+        finish_reason=candidate.get('finishReason'),
+        prompt_tokens=usage.get('promptTokenCount'),
+        output_tokens=usage.get('candidatesTokenCount'),
+        total_tokens=usage.get('totalTokenCount')
+    )
+
+class GeminiTransport:
+    """Async REST client for Gemini on a pooled, keep-alive httpx connection.
+
+    Every call has a deadline enforced with asyncio.timeout, so a hung request
+    is cancelled (and its connection released) instead of pinning a thread,
+    and cancelling the calling task aborts the in-flight HTTP request.
+    ``base_url`` can point at a local stub server in tests.
+    """
+
+    def __init__(self, api_key: str, base_url: str = DEFAULT_BASE_URL, timeout: float = 30.0,
+                 max_connections: int = 20, api_version: str = "v1beta"):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.api_version = api_version
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={'x-goog-api-key': self.api_key},
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                # The overall deadline is asyncio.timeout below; this only bounds connection setup
+                timeout=httpx.Timeout(None, connect=min(self.timeout, 10.0))
+            )
+        return self._client
+
+    def _path(self, model: str, method: str) -> str:
+        return f"/{self.api_version}/models/{model}:{method}"
+
+    @staticmethod
+    def _request_body(prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        body: Dict[str, Any] = {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+        if generation_config:
+            body['generationConfig'] = {_camel_case(k): v for k, v in generation_config.items()}
+        return body
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response):
+        if response.status_code < 400:
+            return
+        try:
+            message = response.json().get('error', {}).get('message') or response.text
+        except ValueError:
+            message = response.text
+        raise GeminiAPIError(f"Gemini API error {response.status_code}: {message}", response.status_code)
+
+    async def _post(self, path: str, body: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+        deadline = timeout or self.timeout
+        try:
+            async with asyncio.timeout(deadline):
+                response = await self._get_client().post(path, json=body)
+        except TimeoutError:
+            raise GeminiTimeoutError(f"Gemini call exceeded its {deadline:.0f}s deadline")
+        except httpx.HTTPError as e:
+            raise GeminiAPIError(f"Gemini request failed: {e}")
+
+        self._raise_for_status(response)
+        return response.json()
+
+    async def generate(self, model: str, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                       timeout: Optional[float] = None) -> GeminiResponse:
+        data = await self._post(self._path(model, 'generateContent'),
+                                self._request_body(prompt, generation_config), timeout)
+        return parse_generate_response(data)
+
+    async def stream_generate(self, model: str, prompt: str,
+                              generation_config: Optional[Dict[str, Any]] = None,
+                              timeout: Optional[float] = None) -> AsyncIterator[GeminiResponse]:
+        """Yield partial responses from streamGenerateContent (SSE) as they arrive
+        
+        The deadline applies to the wait for each chunk rather than the whole
+        stream, so long outputs aren't cut off while a stalled stream still is.
+        """
+        deadline = timeout or self.timeout
+        client = self._get_client()
+        request = client.build_request(
+            'POST', self._path(model, 'streamGenerateContent'), params={'alt': 'sse'},
+            json=self._request_body(prompt, generation_config)
+        )
+        # Each wait gets its own deadline; none is held across a yield, where a
+        # slow consumer would otherwise trip it while the generator is suspended
+        try:
+            response = await asyncio.wait_for(client.send(request, stream=True), deadline)
+        except TimeoutError:
+            raise GeminiTimeoutError(f"Gemini stream did not start within {deadline:.0f}s")
+        except httpx.HTTPError as e:
+            raise GeminiAPIError(f"Gemini stream failed: {e}")
+
+        try:
+            if response.status_code >= 400:
+                await asyncio.wait_for(response.aread(), deadline)
+                self._raise_for_status(response)
+            lines = response.aiter_lines()
+            while True:
+                try:
+                    line = await asyncio.wait_for(lines.__anext__(), deadline)
+                except StopAsyncIteration:
+                    break
+                if line.startswith('data:'):
+                    yield parse_generate_response(json.loads(line[5:].strip()))
+        except TimeoutError:
+            raise GeminiTimeoutError(f"Gemini stream stalled for more than {deadline:.0f}s")
+        except httpx.HTTPError as e:
+            raise GeminiAPIError(f"Gemini stream failed: {e}")
+        finally:
+            await response.aclose()
+
+    async def count_tokens(self, model: str, text: str, timeout: Optional[float] = None) -> int:
+        data = await self._post(self._path(model, 'countTokens'), self._request_body(text), timeout)
+        return data.get('totalTokens', 0)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,71 @@
+# backend/services/keyword_engine.py
+import asyncio
+import logging
+from typing import Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from config.settings import settings
+from services.keywords import CorpusStats, KeywordExtractor
+from services.passages import PassageSelector
+
+logger = logging.getLogger(__name__)
+
+class KeywordEngine:
+    """Local keyphrase extraction: document tags without a Gemini call.
+
+    Every document passed through ``keywords_for`` is counted once in the
+    corpus document frequencies, so IDF weights sharpen as the library grows.
+    The same statistics pick the passages sent in classification prompts.
+    """
+
+    def __init__(self, stats_path: str, top_k: int, refresh_interval: float, passage_tokens: int):
+        self.top_k = top_k
+        self.refresh_interval = refresh_interval
+        self.extractor = KeywordExtractor()
+        self.stats = CorpusStats(stats_path)
+        self.passages = PassageSelector(passage_tokens=passage_tokens, extractor=self.extractor)
+
+    def _extract(self, documents: Sequence[Tuple[Optional[str], str]], top_k: int) -> List[List[str]]:
+        self.stats.refresh(self.refresh_interval)
+        for document_id, text in documents:
+            if document_id:
+                self.stats.add(document_id, self.extractor.terms(text))
+        return self.extractor.extract_batch(
+            [text for _, text in documents], self.stats.document_frequencies, self.stats.document_count, top_k
+        )
+
+    async def keywords_batch(self, documents: Sequence[Tuple[Optional[UUID], str]],
+                             top_k: Optional[int] = None) -> List[List[str]]:
+        """Keyphrases for several documents in one vectorized pass; documents with an id join the corpus"""
+        if not documents:
+            return []
+        items = [(str(document_id) if document_id else None, text) for document_id, text in documents]
+        return await asyncio.to_thread(self._extract, items, top_k or self.top_k)
+
+    async def keywords_for(self, document_id: Optional[UUID], text: str, top_k: Optional[int] = None) -> List[str]:
+        return (await self.keywords_batch([(document_id, text)], top_k))[0]
+
+    def _excerpt(self, text: str, budget_tokens: int, subject_texts: List[str]) -> str:
+        self.stats.refresh(self.refresh_interval)
+        return self.passages.select(
+            text, budget_tokens, self.passages.vocabulary(subject_texts),
+            self.stats.document_frequencies, self.stats.document_count
+        )
+
+    async def excerpt(self, text: str, budget_tokens: int, subject_texts: Iterable[str] = ()) -> str:
+        """The most informative passages of ``text`` within ``budget_tokens``, favouring subject vocabulary"""
+        return await asyncio.to_thread(self._excerpt, text, budget_tokens, list(subject_texts))
+
+    def snapshot(self) -> dict:
+        return {
+            "documents": self.stats.document_count,
+            "vocabulary": len(self.stats)
+        }
+
+# Global keyword engine
+keyword_engine = KeywordEngine(
+    stats_path=settings.keyword_stats_path,
+    top_k=settings.keyword_tags_count,
+    refresh_interval=settings.keyword_stats_refresh_interval,
+    passage_tokens=settings.excerpt_passage_tokens
+)
@@ -0,0 +1,198 @@
+# backend/services/keywords.py
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each either else etc even ever every few
+for from further had has have having he her here hers herself him himself his how however i if in into
+is it its itself just least less let like made make many may me might more most much must my myself
+neither no nor not now of off often on once one only or other otherwise our ours ourselves out over own
+per perhaps please rather same several shall she should since so some such than that the their theirs
+them themselves then there therefore these they this those though through thus to too under until up
+upon us use used using very via was we well were what whatever when where whether which while who whom
+whose why will with within without would yet you your yours yourself yourselves
+page pages figure fig table chapter section see shown show also include includes including example
+""".split())
+
+_SEGMENT_RE = re.compile(r"[.,;:!?()\[\]{}\"<>|/\\\n\r\t•·–—]+")
+_TOKEN_RE = re.compile(r"[^\W\d_][\w'-]*[^\W_]|[^\W\d_]")
+
+Phrase = Tuple[str, ...]
+
+class KeywordExtractor:
+    """RAKE-style candidate phrases scored by TF-IDF against corpus statistics.
+
+    Candidates are runs of up to ``max_phrase_words`` non-stopwords between
+    punctuation and stopwords. Each word is weighted by sublinear term
+    frequency times inverse document frequency; a phrase scores the mean of
+    its words, boosted slightly for length and repetition. Scoring is done
+    for a whole batch of documents at once over a shared vocabulary.
+    """
+
+    def __init__(self, max_phrase_words: int = 3, min_word_length: int = 3, max_chars: int = 200000):
+        self.max_phrase_words = max_phrase_words
+        self.min_word_length = min_word_length
+        self.max_chars = max_chars
+
+    def _is_content_word(self, token: str) -> bool:
+        return len(token) >= self.min_word_length and token not in STOPWORDS
+
+    def candidates(self, text: str) -> List[Phrase]:
+        """Every candidate phrase occurrence, in order"""
+        phrases: List[Phrase] = []
+        for segment in _SEGMENT_RE.split(text[:self.max_chars].lower()):
+            run: List[str] = []
+            for token in _TOKEN_RE.findall(segment) + [""]:
+                if token and self._is_content_word(token):
+                    run.append(token)
+                    continue
+                for size in range(1, min(self.max_phrase_words, len(run)) + 1):
+                    phrases.extend(tuple(run[i:i + size]) for i in range(len(run) - size + 1))
+                run = []
+        return phrases
+
+    def words(self, text: str) -> List[str]:
+        """Content words, in order"""
+        return [token for token in _TOKEN_RE.findall(text[:self.max_chars].lower()) if self._is_content_word(token)]
+
+    def terms(self, text: str) -> Set[str]:
+        """Distinct content words, as counted in corpus document frequencies"""
+        return set(self.words(text))
+
+    def extract_batch(self, texts: Sequence[str], document_frequencies: Callable[[List[str]], np.ndarray],
+                      document_count: int, top_k: int = 10) -> List[List[str]]:
+        """Top ``top_k`` keyphrases for each text"""
+        per_document = [Counter(self.candidates(text)) for text in texts]
+        vocabulary = sorted({phrase[0] for counts in per_document for phrase in counts if len(phrase) == 1})
+        if not vocabulary:
+            return [[] for _ in texts]
+        index = {word: i for i, word in enumerate(vocabulary)}
+        size = len(vocabulary)
+
+        # Word frequencies for the whole batch in one bincount over (document, word) cells
+        words = [(row * size + index[phrase[0]], count)
+                 for row, counts in enumerate(per_document)
+                 for phrase, count in counts.items() if len(phrase) == 1]
+        cells = np.fromiter((cell for cell, _ in words), dtype=np.int64, count=len(words))
+        weights = np.fromiter((count for _, count in words), dtype=np.float64, count=len(words))
+        tf = np.bincount(cells, weights=weights, minlength=len(texts) * size).reshape(len(texts), size)
+        df = np.asarray(document_frequencies(vocabulary), dtype=np.float32)
+        idf = np.log((document_count + 1) / (df + 1)) + 1.0
+        word_scores = np.where(tf > 0, (1 + np.log(np.maximum(tf, 1))) * idf, 0.0)
+
+        results = []
+        for row, counts in enumerate(per_document):
+            # Multi-word phrases must repeat to count as a keyphrase rather than an accident of wording
+            phrases = [phrase for phrase, count in counts.items() if len(phrase) == 1 or count > 1]
+            if not phrases:
+                results.append([])
+                continue
+            ids = np.full((len(phrases), self.max_phrase_words), -1, dtype=np.int64)
+            for i, phrase in enumerate(phrases):
+                ids[i, :len(phrase)] = [index[word] for word in phrase]
+            valid = ids >= 0
+            lengths = valid.sum(axis=1)
+            mean_scores = np.where(valid, word_scores[row][np.maximum(ids, 0)], 0.0).sum(axis=1) / lengths
+            repeats = np.array([counts[phrase] for phrase in phrases], dtype=np.float32)
+            scores = mean_scores * (1 + 0.25 * (lengths - 1)) * (1 + 0.1 * np.log(repeats))
+            results.append(self._select(phrases, scores, top_k))
+        return results
+
+    @staticmethod
+    def _select(phrases: List[Phrase], scores: np.ndarray, top_k: int) -> List[str]:
+        """Best phrases, skipping any that only repeat words of a better one"""
+        chosen: List[Set[str]] = []
+        keywords: List[str] = []
+        for i in np.argsort(-scores, kind='stable'):
+            words = set(phrases[i])
+            if any(words <= other or other <= words for other in chosen):
+                continue
+            chosen.append(words)
+            keywords.append(" ".join(phrases[i]))
+            if len(keywords) == top_k:
+                break
+        return keywords
+
+class CorpusStats:
+    """Document frequencies of content words, updated incrementally as documents arrive.
+
+    Counts live in memory and are written through to SQLite (when ``path``
+    is set) so they survive restarts and are shared by processes on the same
+    host; ``refresh`` pulls in other processes' additions. Each document is
+    counted once, however often it's processed.
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self.document_count = 0
+        self._df: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._loaded_at = 0.0
+        self._seen: Set[str] = set()  # Documents counted by this process when there's no database
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS keyword_df (term TEXT PRIMARY KEY, df INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS keyword_documents (document_id TEXT PRIMARY KEY)")
+            self._conn = conn
+        return self._conn
+
+    def refresh(self, max_age: float = 0.0):
+        """Reload counts from disk if they're older than ``max_age`` seconds"""
+        with self._lock:
+            conn = self._connect()
+            if conn is None or time.time() - self._loaded_at < max_age:
+                return
+            self._df = dict(conn.execute("SELECT term, df FROM keyword_df"))
+            self.document_count = conn.execute("SELECT COUNT(*) FROM keyword_documents").fetchone()[0]
+            self._loaded_at = time.time()
+
+    def add(self, document_id: str, terms: Iterable[str]) -> bool:
+        """Count a document's terms; False if it was already counted"""
+        terms = list(terms)
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                if document_id in self._seen:
+                    return False
+                self._seen.add(document_id)
+            else:
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO keyword_documents (document_id) VALUES (?)", (document_id,)
+                ).rowcount
+                if not inserted:
+                    conn.commit()
+                    return False
+                conn.executemany(
+                    "INSERT INTO keyword_df (term, df) VALUES (?, 1)"
+                    " ON CONFLICT (term) DO UPDATE SET df = df + 1",
+                    [(term,) for term in terms]
+                )
+                conn.commit()
+            for term in terms:
+                self._df[term] = self._df.get(term, 0) + 1
+            self.document_count += 1
+            return True
+
+    def document_frequencies(self, terms: List[str]) -> np.ndarray:
+        df = self._df
+        return np.fromiter((df.get(term, 0) for term in terms), dtype=np.float32, count=len(terms))
+
+    def __len__(self) -> int:
+        return len(self._df)
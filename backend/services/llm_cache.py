@@ -0,0 +1,212 @@
+# backend/services/llm_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+def make_cache_key(model: str, generation_config: Dict[str, Any], prompt: str) -> str:
+    """Fingerprint of everything that determines a Gemini response"""
+    config = json.dumps(generation_config, sort_keys=True, default=str)
+    digest = hashlib.sha256()
+    for part in (model, config, prompt):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+class SQLiteResponseStore:
+    """Durable tier of the LLM response cache, shared by processes on the same host"""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                " key TEXT PRIMARY KEY,"
+                " payload TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_accessed ON llm_responses (accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str, ttl_seconds: float) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT created_at, payload FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[0] > ttl_seconds:
+                conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE llm_responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            return row[0], row[1]
+
+    def put(self, key: str, payload: str, created_at: float):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, payload, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), created_at, created_at)
+            )
+            conn.commit()
+
+    def evict(self, ttl_seconds: float) -> int:
+        """Drop expired rows, then least recently used rows until under max_bytes"""
+        with self._lock:
+            conn = self._connect()
+            removed = conn.execute(
+                "DELETE FROM llm_responses WHERE created_at < ?", (time.time() - ttl_seconds,)
+            ).rowcount
+
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                stale_keys = []
+                for key, size in conn.execute("SELECT key, size FROM llm_responses ORDER BY accessed_at"):
+                    stale_keys.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                conn.executemany("DELETE FROM llm_responses WHERE key = ?", stale_keys)
+                removed += len(stale_keys)
+            conn.commit()
+            return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self._connect()
+            count, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses"
+            ).fetchone()
+            return {"entries": count, "size": size}
+
+class LLMResponseCache:
+    """Two-tier cache of Gemini responses keyed by model, generation config and prompt.
+
+    Lookups hit an in-process LRU first and fall back to a SQLite file, so
+    repeated prompts (duplicate uploads, repeated /summarize clicks,
+    reclassification runs) are answered without spending quota. Both tiers
+    expire entries after ``ttl_seconds``; the LRU holds ``max_entries`` and
+    the SQLite file is trimmed to ``max_disk_bytes``.
+    """
+
+    EVICT_EVERY = 100  # durable-tier writes between eviction passes
+
+    def __init__(self, max_entries: int, ttl_seconds: float,
+                 db_path: Optional[str] = None, max_disk_bytes: int = 0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._store = SQLiteResponseStore(db_path, max_disk_bytes) if db_path else None
+        self._writes_since_evict = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _remember(self, key: str, created_at: float, raw: str):
+        # Kept serialized, like the disk tier, so callers mutating a result can't change the cached copy
+        self._memory[key] = (created_at, raw)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            if time.time() - entry[0] <= self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(entry[1])
+            del self._memory[key]
+
+        if self._store is not None:
+            try:
+                row = await asyncio.to_thread(self._store.get, key, self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"⚠️ LLM cache read failed: {e}")
+                row = None
+            if row is not None:
+                created_at, raw = row
+                self._remember(key, created_at, raw)
+                self.disk_hits += 1
+                return json.loads(raw)
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, payload: Dict[str, Any]):
+        created_at = time.time()
+        raw = json.dumps(payload)
+        self._remember(key, created_at, raw)
+        self.writes += 1
+
+        if self._store is None:
+            return
+        try:
+            await asyncio.to_thread(self._store.put, key, raw, created_at)
+            self._writes_since_evict += 1
+            if self._writes_since_evict >= self.EVICT_EVERY:
+                self._writes_since_evict = 0
+                self.evictions += await asyncio.to_thread(self._store.evict, self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"⚠️ LLM cache write failed: {e}")
+
+    async def snapshot(self) -> Dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        disk = None
+        if self._store is not None:
+            try:
+                disk = await asyncio.to_thread(self._store.stats)
+            except Exception as e:
+                logger.warning(f"⚠️ LLM cache stats unavailable: {e}")
+        return {
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "disk": disk,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else None,
+            "writes": self.writes,
+            "evictions": self.evictions
+        }
+
+# Global LLM response cache
+llm_cache = LLMResponseCache(
+    max_entries=settings.llm_cache_max_entries,
+    ttl_seconds=settings.llm_cache_ttl,
+    db_path=settings.llm_cache_path or None,
+    max_disk_bytes=settings.llm_cache_max_disk_bytes
+)
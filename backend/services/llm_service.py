@@ -298,17 +298,38 @@
 # llm_service = LLMService()
 # backend/services/llm_service.py
 import asyncio
+import hashlib
 import logging
 import time
 import re
-from typing import Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 import json
-import google.generativeai as genai
 from config.settings import settings
+from services.concurrency_controller import concurrency_controller
+from services.gemini_transport import GeminiAPIError, GeminiResponse, GeminiTransport
+from services.llm_cache import llm_cache, make_cache_key
+from services.chunker import chunk_text as split_into_chunks, token_counter
+from services.chunk_summary_store import chunk_summary_store
+from services.rate_limiter import rate_limiter, LLMPriority
+from services.subject_catalogue import subject_catalogue, CatalogueSnapshot
+from services.keyword_engine import keyword_engine
+from services.usage_tracker import usage_tracker
+from services.model_router import ModelRoute, model_router
 
 logger = logging.getLogger(__name__)
 
+# Documents longer than this are summarized chunk by chunk (map phase) first
+LONG_DOCUMENT_CHARS = 40000
+# Upper bound on the estimated tokens fed into a single combine (reduce) call
+REDUCE_INPUT_TOKENS = 8000
+# Bump when MAP_PROMPT changes so stored chunk summaries aren't reused
+MAP_PROMPT_VERSION = 1
+MAP_PROMPT = (
+    "Summarize this section of a longer document as compact notes. Keep every key fact, "
+    "definition, figure and argument so any kind of summary can later be written from the notes alone."
+)
+
 @dataclass
 class LLMResult:
     content: str
@@ -319,33 +340,32 @@ class LLMResult:
 
 class LLMService:
     def __init__(self):
-        self.model_name = "gemini-1.5-flash"
+        # Default model (health checks, calibration, stored chunk notes); calls are routed per task
+        self.model_name = settings.llm_standard_model
         self.max_tokens = 2048
-        self.timeout = 30
-        
-        # Configure Gemini
-        genai.configure(api_key=settings.gemini_api_key)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.timeout = settings.gemini_timeout
         
-        # Generation config
-        self.generation_config = genai.types.GenerationConfig(
-            temperature=0.7,
-            top_p=0.9,
-            max_output_tokens=self.max_tokens,
+        # Async REST transport with a pooled connection and per-call deadlines
+        self.transport = GeminiTransport(
+            api_key=settings.gemini_api_key,
+            base_url=settings.gemini_base_url,
+            timeout=self.timeout,
+            max_connections=settings.gemini_max_connections
         )
+        
+        # Generation config of the standard route (routes carry their own; each is part of the cache key)
+        self.generation_params = model_router.routes['standard'].generation_params
+        self._calibration_attempted = False
 
     async def health_check(self) -> bool:
         """Check if Gemini API is accessible"""
         try:
             # Try a simple generation to test API connectivity
             test_prompt = "Hello"
-            response = await asyncio.to_thread(
-                self.model.generate_content,
-                test_prompt,
-                generation_config=self.generation_config
-            )
+            await rate_limiter.acquire(self.estimate_tokens(test_prompt), LLMPriority.interactive)
+            response = await self.transport.generate(self.model_name, test_prompt, self.generation_params)
             
-            if response and response.text:
+            if response.text:
                 logger.info("✅ Gemini API health check passed")
                 return True
             else:
@@ -356,72 +376,193 @@ class LLMService:
             logger.error(f"❌ Gemini API health check failed: {e}")
             return False
 
-    def chunk_text(self, text: str, max_chunk_size: int = None) -> List[str]:
-        """Split large text into smaller chunks for processing"""
-        if max_chunk_size is None:
-            max_chunk_size = 30000  # Gemini can handle larger chunks
+    def chunk_text(self, text: str, max_tokens: Optional[int] = None,
+                   overlap_tokens: Optional[int] = None) -> List[str]:
+        """Split large text into sentence-aligned chunks of at most ``max_tokens`` tokens"""
+        if max_tokens is None:
+            max_tokens = settings.chunk_max_tokens
+        if overlap_tokens is None:
+            overlap_tokens = settings.chunk_overlap_tokens
         
-        # Simple chunking by sentences to avoid cutting in the middle
-        sentences = re.split(r'[.!?]+', text)
-        chunks = []
-        current_chunk = ""
+        return [chunk.text for chunk in split_into_chunks(text, max_tokens, overlap_tokens, token_counter)]
+
+    def needs_chunking(self, text: str) -> bool:
+        return len(text) > LONG_DOCUMENT_CHARS
+
+    def map_chunks(self, text: str) -> List[str]:
+        """Chunks used for the map phase of long-document summarization"""
+        return self.chunk_text(text)
+
+    def estimate_tokens(self, text: str) -> int:
+        """Token count from the local tokenizer (calibrated against Gemini, see calibrate_token_counter)"""
+        return token_counter.count(text)
+
+    async def calibrate_token_counter(self, sample: str):
+        """Fit the local token counter to Gemini's tokenizer with one count_tokens call"""
+        if token_counter.calibrated or self._calibration_attempted:
+            return
+        self._calibration_attempted = True
+        sample = sample[:8000]
+        try:
+            token_counter.calibrate(sample, await self.transport.count_tokens(self.model_name, sample))
+        except Exception as e:
+            logger.warning(f"⚠️ Token counter calibration failed, using default ratio: {e}")
+
+    @staticmethod
+    def _is_rate_limit_error(error: Exception) -> bool:
+        """Check whether Gemini rejected the call for quota/rate reasons (HTTP 429)"""
+        if isinstance(error, GeminiAPIError):
+            return error.rate_limited
+        message = str(error).lower()
+        return "429" in message or "resource exhausted" in message or "quota" in message
+
+    @staticmethod
+    def _should_fall_back(error: Exception) -> bool:
+        """Errors another model might not hit: timeouts, quota, server errors, unknown model, empty output"""
+        if isinstance(error, GeminiAPIError):
+            status = error.status_code
+            return status is None or status in (404, 429) or status >= 500
+        return True
+
+    async def _generate_routed(self, route: ModelRoute, prompt: str, priority: LLMPriority = LLMPriority.batch,
+                               prompt_estimate: Optional[int] = None) -> Tuple[GeminiResponse, str, float]:
+        """Generate on the route's models in order until one answers; returns (response, model, latency)
         
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if not sentence:
+        Every attempt is a real API call, so each one waits for its own rate-limit capacity.
+        """
+        if prompt_estimate is None:
+            prompt_estimate = self.estimate_tokens(prompt)
+        for attempt, model in enumerate(route.models):
+            # Wait for request/token budget before the latency clock starts
+            await rate_limiter.acquire(prompt_estimate, priority)
+            start_time = time.time()
+            try:
+                response = await self.transport.generate(model, prompt, route.generation_params, timeout=route.timeout)
+                if not response.text:
+                    raise Exception(f"Empty response from {model} (finish reason: {response.finish_reason})")
+            except Exception as e:
+                concurrency_controller.record(
+                    time.time() - start_time,
+                    success=False,
+                    rate_limited=self._is_rate_limit_error(e)
+                )
+                model_router.record_failure(route)
+                if attempt == len(route.models) - 1 or not self._should_fall_back(e):
+                    raise
+                logger.warning(f"↪️ {model} failed ({e}), falling back to {route.models[attempt + 1]}")
                 continue
             
-            # If adding this sentence would exceed limit, start new chunk
-            if len(current_chunk) + len(sentence) > max_chunk_size and current_chunk:
-                chunks.append(current_chunk.strip())
-                current_chunk = sentence
-            else:
-                current_chunk += " " + sentence if current_chunk else sentence
+            processing_time = time.time() - start_time
+            concurrency_controller.record(processing_time, success=True)
+            return response, model, processing_time
+        raise Exception(f"Route {route.name} has no models")
+
+    async def _generate_response(self, prompt: str, priority: LLMPriority = LLMPriority.batch,
+                                 use_cache: bool = True, task: str = 'general',
+                                 quality: str = 'standard') -> LLMResult:
+        """Core method to interact with Gemini
         
-        # Add the last chunk
-        if current_chunk.strip():
-            chunks.append(current_chunk.strip())
+        The model router picks the model and generation config from ``task``,
+        the prompt size and ``quality`` ('low', 'standard' or 'high'), with
+        fallback models if one fails. Responses from the route's preferred
+        model are cached by that model, generation config and prompt (fallback
+        answers are not, so they are never served as the preferred model's);
+        pass ``use_cache=False`` to force a fresh generation (the result still
+        replaces the cached one).
+        """
+        prompt_estimate = self.estimate_tokens(prompt)
+        route = model_router.choose(task, prompt_estimate, quality)
         
-        return chunks
-
-    def estimate_tokens(self, text: str) -> int:
-        """Rough estimation of tokens (1 token ≈ 4 characters)"""
-        return len(text) // 4
-
-    async def _generate_response(self, prompt: str) -> LLMResult:
-        """Core method to interact with Gemini"""
-        start_time = time.time()
+        cache_key = None
+        if settings.llm_cache_enabled:
+            cache_key = make_cache_key(route.models[0], route.generation_params, prompt)
+            if use_cache:
+                cached = await llm_cache.get(cache_key)
+                if cached is not None:
+                    return LLMResult(
+                        content=cached['content'],
+                        model_used=cached['model_used'],
+                        tokens_used=cached['tokens_used'],
+                        processing_time=0.0,
+                        metadata={**cached['metadata'], 'cached': True}
+                    )
         
         try:
-            response = await asyncio.to_thread(
-                self.model.generate_content,
-                prompt,
-                generation_config=self.generation_config
-            )
-            
-            processing_time = time.time() - start_time
-            
-            if not response or not response.text:
-                raise Exception("Empty response from Gemini")
-            
-            return LLMResult(
-                content=response.text.strip(),
-                model_used=self.model_name,
-                tokens_used=self.estimate_tokens(response.text),
-                processing_time=processing_time,
-                metadata={
-                    'prompt_tokens': self.estimate_tokens(prompt),
-                    'total_tokens': self.estimate_tokens(prompt + response.text),
-                    'finish_reason': 'completed'
-                }
-            )
-            
+            response, model, processing_time = await self._generate_routed(route, prompt, priority, prompt_estimate)
         except Exception as e:
             logger.error(f"Error generating response with Gemini: {e}")
             raise Exception(f"LLM generation failed: {str(e)}")
+        
+        # Usage metadata from the API, falling back to local estimates
+        prompt_tokens = response.prompt_tokens or prompt_estimate
+        output_tokens = response.output_tokens or self.estimate_tokens(response.text)
+        
+        await rate_limiter.debit(output_tokens)
+        await usage_tracker.record(
+            model, prompt_tokens, output_tokens,
+            estimated=response.prompt_tokens is None or response.output_tokens is None
+        )
+        model_router.record(route, model, processing_time, prompt_tokens, output_tokens)
+        
+        result = LLMResult(
+            content=response.text.strip(),
+            model_used=model,
+            tokens_used=output_tokens,
+            processing_time=processing_time,
+            metadata={
+                'prompt_tokens': prompt_tokens,
+                'total_tokens': response.total_tokens or prompt_tokens + output_tokens,
+                'finish_reason': (response.finish_reason or 'completed').lower(),
+                'route': route.name
+            }
+        )
+        
+        if cache_key is not None and model == route.models[0]:
+            await llm_cache.put(cache_key, {
+                'content': result.content,
+                'model_used': result.model_used,
+                'tokens_used': result.tokens_used,
+                'metadata': result.metadata
+            })
+        return result
+
+    def _match_subject(self, classification_data: Dict, available_subjects: List[str]) -> Dict:
+        """Snap the LLM's primary_topic onto one of the available subject names"""
+        # Validate that the chosen subject is in the available list
+        chosen_subject = classification_data.get('primary_topic') or 'other'
+        
+        # Try exact match first
+        if chosen_subject in available_subjects:
+            logger.info(f"✅ Exact match found: {chosen_subject}")
+            return classification_data
+        
+        # Try case-insensitive match
+        chosen_lower = chosen_subject.lower()
+        for subject in available_subjects:
+            if subject.lower() == chosen_lower:
+                classification_data['primary_topic'] = subject  # Use the correct case
+                logger.info(f"✅ Case-insensitive match found: {subject}")
+                return classification_data
+        
+        # Try partial match as last resort
+        for subject in available_subjects:
+            if chosen_lower in subject.lower() or subject.lower() in chosen_lower:
+                classification_data['primary_topic'] = subject
+                classification_data['confidence'] = max(0.3, classification_data.get('confidence', 0.5) - 0.2)
+                logger.info(f"⚠️ Partial match found: {subject}")
+                return classification_data
+        
+        # If still no match, default to 'other' or create fallback
+        logger.warning(f"❌ No match found for '{chosen_subject}'. Available: {available_subjects}")
+        # Try to use 'other' if it exists, otherwise use first available subject
+        fallback_subject = 'other' if 'other' in available_subjects else available_subjects[0]
+        classification_data['primary_topic'] = fallback_subject
+        classification_data['confidence'] = 0.3
+        classification_data['reasoning'] = f"No match found for '{chosen_subject}', defaulted to '{fallback_subject}'"
+        return classification_data
 
-    async def summarize_text(self, text: str, summary_type: str = "brief") -> LLMResult:
-        """Generate a summary of the given text"""
+    def _summary_instructions(self, summary_type: str) -> Tuple[str, str]:
+        """Prompt instruction and length hint for a summary type"""
         # Handle different summary types
         if summary_type == "brief":
             instruction = "Write a brief 2-3 sentence summary of the following text:"
@@ -435,45 +576,282 @@ class LLMService:
         else:
             instruction = "Summarize the following text:"
             max_length = "Keep it concise."
+        return instruction, max_length
+
+    async def _summarize_chunks(self, text: str, priority: LLMPriority,
+                                chunks: Optional[List[str]] = None,
+                                use_cache: bool = True) -> List[str]:
+        """Map phase for long documents: summary-type independent notes per chunk, in order
+        
+        Notes are stored by chunk hash, so only chunks without stored notes
+        are sent to Gemini (all of them when ``use_cache`` is False). Fan-out
+        is bounded by ``llm_map_concurrency``; every call still goes through
+        the rate limiter in _generate_response.
+        """
+        chunks = chunks or self.map_chunks(text)
+        chunk_hashes = [hashlib.sha256(chunk.encode('utf-8')).hexdigest() for chunk in chunks]
+        stored = chunk_summary_store.get_many(chunk_hashes, self.model_name, MAP_PROMPT_VERSION) if use_cache else {}
+        semaphore = asyncio.Semaphore(settings.llm_map_concurrency)
+        
+        async def summarize_chunk(i: int, chunk: str) -> str:
+            if chunk_hashes[i] in stored:
+                return stored[chunk_hashes[i]]
+            chunk_prompt = f"{MAP_PROMPT}\n\nSection {i+1} of {len(chunks)}:\n{chunk}"
+            async with semaphore:
+                chunk_result = await self._generate_response(chunk_prompt, priority, use_cache, task='summarize_map')
+            return chunk_result.content
+        
+        summaries = list(await asyncio.gather(*(summarize_chunk(i, chunk) for i, chunk in enumerate(chunks))))
+        
+        missing = {h: summary for h, summary in zip(chunk_hashes, summaries) if h not in stored}
+        if missing:
+            logger.info(f"🧩 Summarized {len(missing)} of {len(chunks)} chunks ({len(chunks) - len(missing)} reused)")
+            chunk_summary_store.put_many(missing, self.model_name, MAP_PROMPT_VERSION)
+        return summaries
+
+    def _group_for_reduce(self, summaries: List[str]) -> List[List[str]]:
+        """Split summaries into consecutive groups that each fit one combine call"""
+        groups, current, current_tokens = [], [], 0
+        for summary in summaries:
+            tokens = self.estimate_tokens(summary)
+            if current and current_tokens + tokens > REDUCE_INPUT_TOKENS:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(summary)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        
+        # Oversized summaries would leave every group with one item and never shrink; pair them up
+        if len(groups) == len(summaries) and len(summaries) > 1:
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        return groups
+
+    async def _collapse_summaries(self, summaries: List[str], priority: LLMPriority,
+                                  use_cache: bool = True) -> List[str]:
+        """Tree reduce: merge groups of summaries level by level until they fit one call"""
+        semaphore = asyncio.Semaphore(settings.llm_map_concurrency)
+        
+        async def combine(group: List[str]) -> str:
+            if len(group) == 1:
+                return group[0]
+            joined = "\n\n".join(group)
+            prompt = (
+                "Combine these partial summaries of consecutive parts of one document into a single summary. "
+                f"Keep every key point and the original order:\n\n{joined}"
+            )
+            async with semaphore:
+                result = await self._generate_response(prompt, priority, use_cache, task='summarize_reduce')
+            return result.content
+        
+        while len(summaries) > 1 and self.estimate_tokens("\n".join(summaries)) > REDUCE_INPUT_TOKENS:
+            groups = self._group_for_reduce(summaries)
+            logger.info(f"🔄 Reducing {len(summaries)} partial summaries in {len(groups)} groups")
+            summaries = list(await asyncio.gather(*(combine(group) for group in groups)))
+        return summaries
+
+    async def _summary_prompt(self, text: str, summary_type: str, priority: LLMPriority,
+                              chunks: Optional[List[str]] = None, use_cache: bool = True) -> str:
+        """Final summarization prompt; long documents go through map-reduce first"""
+        instruction, max_length = self._summary_instructions(summary_type)
 
         # Gemini can handle larger text, but still chunk very large documents
-        if len(text) > 40000:  # ~40k characters
-            chunks = self.chunk_text(text, 30000)
-            chunk_summaries = []
+        if self.needs_chunking(text):
+            chunk_summaries = await self._summarize_chunks(text, priority, chunks, use_cache)
+            chunk_summaries = await self._collapse_summaries(chunk_summaries, priority, use_cache)
             
-            for i, chunk in enumerate(chunks):
-                chunk_prompt = f"{instruction}\n\nText chunk {i+1}:\n{chunk}\n\n{max_length}"
-                chunk_result = await self._generate_response(chunk_prompt)
-                chunk_summaries.append(chunk_result.content)
-            
-            # Combine chunk summaries
-            combined_summary = "\n".join(chunk_summaries)
-            final_prompt = f"Combine these summaries into one cohesive {summary_type} summary:\n\n{combined_summary}\n\n{max_length}"
-            return await self._generate_response(final_prompt)
+            # Reduce: the summary type is only applied here, over the shared chunk notes
+            combined_summary = "\n\n".join(chunk_summaries)
+            return (
+                f"{instruction}\n\nThe text is given as notes on consecutive sections of one document:\n\n"
+                f"{combined_summary}\n\n{max_length}"
+            )
         else:
             # Single summary for shorter text
-            prompt = f"{instruction}\n\nText:\n{text}\n\n{max_length}"
-            return await self._generate_response(prompt)
+            return f"{instruction}\n\nText:\n{text}\n\n{max_length}"
 
-    async def classify_topic(self, text: str, available_subjects: Optional[List[str]] = None) -> LLMResult:
-        """Classify the document into topics and categories using actual database subjects"""
+    async def summarize_text(self, text: str, summary_type: str = "brief",
+                             priority: LLMPriority = LLMPriority.batch,
+                             chunks: Optional[List[str]] = None,
+                             use_cache: bool = True) -> LLMResult:
+        """Generate a summary of the given text
         
-        # If no subjects provided, use default categories as fallback
-        if not available_subjects:
-            available_subjects = [
-                "business", "personal", "academic", "legal",
-                "medical", "technical", "financial", "travel", "other"
+        ``chunks`` lets callers pass precomputed map-phase chunks (see map_chunks);
+        ``use_cache=False`` skips the LLM response cache and stored chunk notes.
+        """
+        prompt = await self._summary_prompt(text, summary_type, priority, chunks, use_cache)
+        return await self._generate_response(prompt, priority, use_cache, task='summarize')
+
+    async def stream_summary(self, text: str, summary_type: str = "brief",
+                             priority: LLMPriority = LLMPriority.interactive,
+                             chunks: Optional[List[str]] = None,
+                             info: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Yield the summary text as Gemini streams it (the map phase, if any, runs first)
+        
+        ``info`` receives the model used and output tokens when the stream ends.
+        """
+        prompt = await self._summary_prompt(text, summary_type, priority, chunks)
+        async for piece in self._stream_response(prompt, priority, 'summarize', info):
+            yield piece
+
+    async def _stream_response(self, prompt: str, priority: LLMPriority = LLMPriority.interactive,
+                               task: str = 'general', info: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Streaming counterpart of _generate_response; a cached response is replayed in one piece
+        
+        Falls back to the route's next model only if the stream fails before
+        its first piece. ``info``, if given, receives model_used and
+        tokens_used once the stream completes.
+        """
+        prompt_estimate = self.estimate_tokens(prompt)
+        route = model_router.choose(task, prompt_estimate)
+        info = info if info is not None else {}
+        
+        cache_key = make_cache_key(route.models[0], route.generation_params, prompt) if settings.llm_cache_enabled else None
+        if cache_key is not None:
+            cached = await llm_cache.get(cache_key)
+            if cached is not None:
+                info.update(model_used=cached['model_used'], tokens_used=cached['tokens_used'])
+                yield cached['content']
+                return
+        
+        for attempt, model in enumerate(route.models):
+            await rate_limiter.acquire(prompt_estimate, priority)  # Each attempt is its own API call
+            start_time = time.time()
+            pieces: List[str] = []
+            last = None
+            try:
+                async for last in self.transport.stream_generate(model, prompt, route.generation_params, timeout=route.timeout):
+                    if last.text:
+                        pieces.append(last.text)
+                        yield last.text
+                if not pieces:
+                    raise Exception(f"Empty response from {model}")
+            except Exception as e:
+                concurrency_controller.record(
+                    time.time() - start_time,
+                    success=False,
+                    rate_limited=self._is_rate_limit_error(e)
+                )
+                model_router.record_failure(route)
+                if pieces or attempt == len(route.models) - 1 or not self._should_fall_back(e):
+                    logger.error(f"Error streaming response from Gemini: {e}")
+                    raise Exception(f"LLM generation failed: {str(e)}")
+                logger.warning(f"↪️ {model} stream failed ({e}), falling back to {route.models[attempt + 1]}")
+                continue
+            break
+        
+        content = "".join(pieces)
+        processing_time = time.time() - start_time
+        
+        # The last chunk carries the usage metadata for the whole response
+        prompt_tokens = (last.prompt_tokens if last else None) or prompt_estimate
+        output_tokens = (last.output_tokens if last else None) or self.estimate_tokens(content)
+        concurrency_controller.record(processing_time, success=True)
+        await rate_limiter.debit(output_tokens)
+        await usage_tracker.record(
+            model, prompt_tokens, output_tokens,
+            estimated=last is None or last.prompt_tokens is None or last.output_tokens is None
+        )
+        model_router.record(route, model, processing_time, prompt_tokens, output_tokens)
+        info.update(model_used=model, tokens_used=output_tokens)
+        
+        if cache_key is not None and model == route.models[0]:
+            await llm_cache.put(cache_key, {
+                'content': content.strip(),
+                'model_used': model,
+                'tokens_used': output_tokens,
+                'metadata': {
+                    'prompt_tokens': prompt_tokens,
+                    'total_tokens': prompt_tokens + output_tokens,
+                    'finish_reason': ((last.finish_reason if last else None) or 'completed').lower(),
+                    'route': route.name
+                }
+            })
+
+    async def salient_excerpt(self, text: str, budget_tokens: int, subjects: Optional[List[str]] = None) -> str:
+        """The most informative passages of ``text`` within ``budget_tokens``, for prompts
+        
+        Passages are scored locally against the catalogue's subject names and
+        keywords (plus ``subjects``) and by TF-IDF novelty; the opening
+        characters are used if that fails.
+        """
+        subject_texts = list(subjects or [])
+        try:
+            catalogue = await subject_catalogue.get()
+            subject_texts += [
+                " ".join([subject['subject_name']] + list(subject.get('keywords') or []))
+                for subject in catalogue.subjects
             ]
+        except Exception as e:
+            logger.debug(f"Subject vocabulary unavailable for excerpt: {e}")
+        try:
+            return await keyword_engine.excerpt(text, budget_tokens, subject_texts)
+        except Exception as e:
+            logger.warning(f"⚠️ Passage selection failed, using the opening of the text: {e}")
+            return text[:budget_tokens * 4]
+
+    async def _classify_prompt(self, prompt: str, available_subjects: List[str], priority: LLMPriority,
+                               use_cache: bool, quality: str) -> LLMResult:
+        """Run a classification prompt and parse its JSON into result.metadata"""
+        result = await self._generate_response(prompt, priority, use_cache, task='classify', quality=quality)
         
-        subjects_str = ", ".join(available_subjects)
+        # Try to extract JSON from response
+        try:
+            # Find JSON in the response
+            json_match = re.search(r'\{.*\}', result.content, re.DOTALL)
+            if json_match:
+                classification_data = json.loads(json_match.group())
+                
+                result.metadata.update(self._match_subject(classification_data, available_subjects))
+                
+        except (json.JSONDecodeError, AttributeError) as e:
+            logger.warning(f"Could not parse classification JSON: {e}")
+            logger.debug(f"Raw LLM response: {result.content}")
+            
+            # Fallback classification
+            fallback_subject = 'other' if 'other' in available_subjects else available_subjects[0]
+            result.metadata.update({
+                "primary_topic": fallback_subject,
+                "category": "other", 
+                "confidence": 0.3,
+                "tags": [],
+                "reasoning": f"Failed to parse LLM response, defaulted to '{fallback_subject}'"
+            })
         
-        prompt = f"""Analyze the following text and classify it using ONLY the available subjects listed below.
+        return result
+
+    @staticmethod
+    def _confidence(result: LLMResult) -> float:
+        try:
+            return float(result.metadata.get('confidence') or 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    async def _escalate(self, prompt: str, available_subjects: List[str], priority: LLMPriority,
+                        use_cache: bool, result: LLMResult) -> LLMResult:
+        """Ask a low-confidence classification prompt again on the strong route; the more confident answer wins"""
+        confidence = self._confidence(result)
+        model_router.record_escalation(result.metadata.get('route'))
+        try:
+            escalated = await self._classify_prompt(prompt, available_subjects, priority, use_cache, 'high')
+        except Exception as e:
+            logger.warning(f"⚠️ Escalated classification failed, keeping {result.model_used}'s answer: {e}")
+            return result
+        logger.info(f"⬆️ Escalated low-confidence classification ({confidence:.2f}) to {escalated.model_used}")
+        if self._confidence(escalated) < confidence:
+            return result
+        escalated.metadata['escalated_from'] = result.model_used
+        return escalated
+
+    @staticmethod
+    def _classification_prompt(excerpt: str, subjects_str: str) -> str:
+        return f"""Analyze the following text and classify it using ONLY the available subjects listed below.
 
 Available subjects to choose from:
 {subjects_str}
 
 Text to analyze:
-{text[:3000]}
+{excerpt}
 
 Instructions:
 1. Read the text carefully
@@ -488,126 +866,283 @@ Respond with ONLY valid JSON in this exact format:
     "primary_topic": "exact subject name from the list above",
     "category": "academic",
     "confidence": 0.85,
-    "tags": ["relevant", "keywords", "from", "text"],
     "reasoning": "why you chose this specific subject from the available options"
 }}
 
 Remember: primary_topic must be EXACTLY one of these: {subjects_str}"""
 
-        result = await self._generate_response(prompt)
+    async def classify_topic(self, text: str, available_subjects: Optional[List[str]] = None,
+                             priority: LLMPriority = LLMPriority.batch,
+                             subjects_prompt: Optional[str] = None,
+                             use_cache: bool = True) -> LLMResult:
+        """Classify the document into topics and categories using actual database subjects
+        
+        An answer below the router's escalation confidence is asked again on
+        the strong model, and the more confident of the two is returned.
+        """
+        
+        # If no subjects provided, use default categories as fallback
+        if not available_subjects:
+            available_subjects = [
+                "business", "personal", "academic", "legal",
+                "medical", "technical", "financial", "travel", "other"
+            ]
+        
+        subjects_str = subjects_prompt or ", ".join(available_subjects)
+        excerpt = await self.salient_excerpt(text, settings.classification_excerpt_tokens, available_subjects)
+        prompt = self._classification_prompt(excerpt, subjects_str)
+
+        result = await self._classify_prompt(prompt, available_subjects, priority, use_cache, 'standard')
+        if not model_router.should_escalate(result.metadata.get('route'), self._confidence(result)):
+            return result
+        return await self._escalate(prompt, available_subjects, priority, use_cache, result)
+
+    async def enrich_document(self, text: str, catalogue: CatalogueSnapshot,
+                              priority: LLMPriority = LLMPriority.batch,
+                              chunks: Optional[List[str]] = None, use_cache: bool = True) -> LLMResult:
+        """Summarize, classify and pick a subject for a document in a single Gemini call
+        
+        ``catalogue`` is the cached subject catalogue. The parsed fields are
+        returned in ``result.metadata``; raises ValueError if the response
+        isn't usable so callers can fall back to separate calls. A subject
+        picked with low confidence is re-asked on the strong model with the
+        classification prompt; the summary is kept either way.
+        ``use_cache=False`` skips the LLM response cache and stored chunk notes.
+        """
+        available_subjects = catalogue.names_with_other
+        subjects_text = catalogue.keywords_prompt_with_other
+        
+        # Long documents are condensed chunk by chunk first, then enriched once
+        if self.needs_chunking(text):
+            chunk_summaries = await self._summarize_chunks(text, priority, chunks, use_cache)
+            document_text = "\n".join(await self._collapse_summaries(chunk_summaries, priority, use_cache))
+        else:
+            document_text = text
+        
+        prompt = f"""Analyze the following document. Summarize it and classify it into ONE of the available subjects.
+
+Available subjects (name: keywords):
+{subjects_text}
+
+Document text:
+{document_text}
+
+Instructions:
+1. "summary": a brief 2-3 sentence summary of the document, under 200 words
+2. "primary_topic": the BEST matching subject name, EXACTLY as written in the list above
+3. "confidence": how well the document fits primary_topic, from 0.0 to 1.0 (0.8+ if it clearly matches)
+4. Only use "Other" if the document truly doesn't match any available subject
+5. "category": one broad category such as academic, business, personal, legal, medical, technical, financial, travel or other
+
+Respond with ONLY valid JSON in this exact format:
+{{
+    "summary": "brief summary of the document",
+    "primary_topic": "exact subject name from the list above",
+    "confidence": 0.85,
+    "category": "academic",
+    "reasoning": "why this subject fits"
+}}"""
+
+        result = await self._generate_response(prompt, priority, use_cache, task='enrich')
         
-        # Try to extract JSON from response
         try:
-            # Find JSON in the response
             json_match = re.search(r'\{.*\}', result.content, re.DOTALL)
-            if json_match:
-                classification_data = json.loads(json_match.group())
-                
-                # Validate that the chosen subject is in the available list
-                chosen_subject = classification_data.get('primary_topic', 'other')
-                
-                # Try exact match first
-                if chosen_subject in available_subjects:
-                    result.metadata.update(classification_data)
-                    logger.info(f"✅ Exact match found: {chosen_subject}")
-                else:
-                    # Try case-insensitive match
-                    chosen_lower = chosen_subject.lower()
-                    match_found = False
-                    
-                    for subject in available_subjects:
-                        if subject.lower() == chosen_lower:
-                            classification_data['primary_topic'] = subject  # Use the correct case
-                            result.metadata.update(classification_data)
-                            logger.info(f"✅ Case-insensitive match found: {subject}")
-                            match_found = True
-                            break
-                    
-                    # Try partial match as last resort
-                    if not match_found:
-                        for subject in available_subjects:
-                            if chosen_lower in subject.lower() or subject.lower() in chosen_lower:
-                                classification_data['primary_topic'] = subject
-                                classification_data['confidence'] = max(0.3, classification_data.get('confidence', 0.5) - 0.2)
-                                result.metadata.update(classification_data)
-                                logger.info(f"⚠️ Partial match found: {subject}")
-                                match_found = True
-                                break
-                    
-                    # If still no match, default to 'other' or create fallback
-                    if not match_found:
-                        logger.warning(f"❌ No match found for '{chosen_subject}'. Available: {available_subjects}")
-                        # Try to use 'other' if it exists, otherwise use first available subject
-                        fallback_subject = 'other' if 'other' in available_subjects else available_subjects[0]
-                        classification_data['primary_topic'] = fallback_subject
-                        classification_data['confidence'] = 0.3
-                        classification_data['reasoning'] = f"No match found for '{chosen_subject}', defaulted to '{fallback_subject}'"
-                        result.metadata.update(classification_data)
-                        
-        except (json.JSONDecodeError, AttributeError) as e:
-            logger.warning(f"Could not parse classification JSON: {e}")
-            logger.debug(f"Raw LLM response: {result.content}")
-            
-            # Fallback classification
-            fallback_subject = 'other' if 'other' in available_subjects else available_subjects[0]
-            result.metadata.update({
-                "primary_topic": fallback_subject,
-                "category": "other", 
-                "confidence": 0.3,
-                "tags": [],
-                "reasoning": f"Failed to parse LLM response, defaulted to '{fallback_subject}'"
-            })
+            if not json_match:
+                raise ValueError("No JSON object in enrichment response")
+            enrichment = json.loads(json_match.group())
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Could not parse enrichment JSON: {e}")
+        
+        if not isinstance(enrichment, dict):
+            raise ValueError("Enrichment response is not a JSON object")
+        summary = enrichment.get('summary')
+        if not isinstance(summary, str) or not summary.strip():
+            raise ValueError("Enrichment response is missing the summary")
         
+        enrichment['summary'] = enrichment['summary'].strip()
+        enrichment.setdefault('category', 'other')
+        enrichment.setdefault('tags', [])
+        try:
+            enrichment['confidence'] = float(enrichment.get('confidence', 0.5))
+        except (TypeError, ValueError):
+            enrichment['confidence'] = 0.5
+        
+        result.metadata.update(self._match_subject(enrichment, available_subjects))
+        if model_router.should_escalate(result.metadata.get('route'), result.metadata['confidence']):
+            excerpt = await self.salient_excerpt(text, settings.classification_excerpt_tokens, available_subjects)
+            prompt = self._classification_prompt(excerpt, catalogue.names_prompt or ", ".join(available_subjects))
+            escalated = await self._escalate(prompt, available_subjects, priority, use_cache, result)
+            if escalated is not result:
+                for field in ('primary_topic', 'category', 'confidence', 'reasoning'):
+                    if field in escalated.metadata:
+                        result.metadata[field] = escalated.metadata[field]
+                result.metadata['classified_by'] = escalated.model_used
+                result.tokens_used = (result.tokens_used or 0) + (escalated.tokens_used or 0)
+        logger.info(f"🎯 Enriched document: '{result.metadata['primary_topic']}' (confidence: {result.metadata['confidence']:.2%})")
         return result
 
-    async def extract_keywords(self, text: str, max_keywords: int = 10) -> LLMResult:
-        """Extract relevant keywords and phrases from text"""
-        prompt = f"""Extract the most important keywords and phrases from the following text.
-Provide exactly {max_keywords} keywords/phrases, ranked by importance.
-
-Text:
-{text[:3000]}...
+    async def extract_keywords(self, text: str, max_keywords: int = 10,
+                               priority: LLMPriority = LLMPriority.batch) -> LLMResult:
+        """Extract relevant keywords and phrases from text
+        
+        Runs locally (TF-IDF keyphrases against corpus statistics); ``priority``
+        is kept for existing callers.
+        """
+        start_time = time.time()
+        keywords = await keyword_engine.keywords_for(None, text, max_keywords)
+        return LLMResult(
+            content=json.dumps(keywords),
+            model_used="local:keywords",
+            tokens_used=0,
+            processing_time=time.time() - start_time,
+            metadata={'keywords': keywords}
+        )
 
-Respond with ONLY a JSON array of strings, like:
-["keyword1", "keyword2", "important phrase", "keyword3", ...]
+    async def _catalogue_subjects(self) -> Tuple[List[str], Optional[str]]:
+        """Subject names (with 'Other') and the prebuilt prompt fragment from the catalogue"""
+        catalogue = await subject_catalogue.get()
+        if catalogue.subjects:
+            logger.info(f"📚 Using {len(catalogue.subjects)} subjects from catalogue")
+            return catalogue.names_with_other, catalogue.names_prompt
+        
+        logger.warning("No subjects found in database, using default categories")
+        return ["Mathematics", "Science", "History", "Literature", "Business", "Technology", "Other"], None
 
-Make sure the JSON is valid."""
+    def _parse_batch_item(self, item: Any, batch_size: int, available_subjects: List[str]) -> Optional[Tuple[int, Dict]]:
+        """Validate one element of a batched classification; None if it can't be trusted"""
+        if not isinstance(item, dict):
+            return None
+        try:
+            index = int(item.get('id')) - 1
+            confidence = float(item.get('confidence'))
+        except (TypeError, ValueError):
+            return None
+        topic = item.get('primary_topic')
+        if not 0 <= index < batch_size or not isinstance(topic, str) or not 0.0 <= confidence <= 1.0:
+            return None
+        # Only exact or case-insensitive subject matches are accepted; anything fuzzier is re-asked alone
+        if not any(subject.lower() == topic.strip().lower() for subject in available_subjects):
+            return None
+        
+        tags = item.get('tags')
+        classification_data = {
+            'primary_topic': topic.strip(),
+            'category': item.get('category') if isinstance(item.get('category'), str) else 'other',
+            'confidence': confidence,
+            'tags': [tag for tag in tags if isinstance(tag, str)] if isinstance(tags, list) else [],
+            'reasoning': str(item.get('reasoning', ''))
+        }
+        return index, self._match_subject(classification_data, available_subjects)
 
-        result = await self._generate_response(prompt)
+    async def classify_batch(self, texts: List[str], available_subjects: List[str],
+                             priority: LLMPriority = LLMPriority.batch,
+                             subjects_prompt: Optional[str] = None,
+                             use_cache: bool = True) -> List[Optional[LLMResult]]:
+        """Classify several documents with one Gemini call
         
-        # Try to extract keywords array
+        Returns one entry per text, in order. Entries are None where the batch
+        output for that document was missing or invalid (or the whole call
+        failed), so callers can fall back to classify_topic for just those.
+        Answers below the escalation confidence are re-asked one by one on
+        the strong model.
+        """
+        subjects_str = subjects_prompt or ", ".join(available_subjects)
+        excerpts = await asyncio.gather(*[
+            self.salient_excerpt(text, settings.classification_excerpt_tokens, available_subjects) for text in texts
+        ])
+        documents = "\n\n".join(
+            f'<document id="{i + 1}">\n{excerpt}\n</document>' for i, excerpt in enumerate(excerpts)
+        )
+        
+        prompt = f"""Classify each of the following {len(texts)} documents using ONLY the available subjects listed below.
+
+Available subjects to choose from:
+{subjects_str}
+
+{documents}
+
+Instructions:
+1. Classify every document independently
+2. Choose the BEST matching subject from the available subjects list above
+3. If a document clearly matches one of the subjects, be confident (0.8+ confidence)
+4. Only use "other" if a document truly doesn't match any available subject
+5. Each primary_topic MUST be exactly one of the subjects from the list above
+
+Respond with ONLY a valid JSON array with one object per document, using the document id:
+[
+    {{
+        "id": 1,
+        "primary_topic": "exact subject name from the list above",
+        "category": "academic",
+        "confidence": 0.85,
+        "reasoning": "short reason for this subject"
+    }}
+]
+
+Remember: every primary_topic must be EXACTLY one of these: {subjects_str}"""
+
+        results: List[Optional[LLMResult]] = [None] * len(texts)
         try:
-            keywords_match = re.search(r'\[.*\]', result.content, re.DOTALL)
-            if keywords_match:
-                keywords = json.loads(keywords_match.group())
-                result.metadata['keywords'] = keywords
-        except (json.JSONDecodeError, AttributeError) as e:
-            logger.warning(f"Could not parse keywords JSON: {e}")
-            result.metadata['keywords'] = []
+            response = await self._generate_response(prompt, priority, use_cache, task='classify_batch')
+            json_match = re.search(r'\[.*\]', response.content, re.DOTALL)
+            items = json.loads(json_match.group()) if json_match else None
+            if not isinstance(items, list):
+                raise ValueError("response is not a JSON array")
+        except Exception as e:
+            logger.warning(f"⚠️ Batch classification of {len(texts)} documents failed: {e}")
+            return results
         
-        return result
+        unsure = []
+        for item in items:
+            parsed = self._parse_batch_item(item, len(texts), available_subjects)
+            if parsed is None or results[parsed[0]] is not None:
+                continue
+            index, classification_data = parsed
+            results[index] = LLMResult(
+                content=json.dumps(item),
+                model_used=response.model_used,
+                tokens_used=(response.tokens_used or 0) // len(texts),
+                processing_time=response.processing_time,
+                metadata={**classification_data, 'batch_size': len(texts), 'route': response.metadata.get('route')}
+            )
+            if model_router.should_escalate(response.metadata.get('route'), classification_data['confidence']):
+                unsure.append(index)
+        
+        # Straight to the strong model; re-asking on the batch's own route first would just repeat the answer
+        escalated = await asyncio.gather(*[
+            self._escalate(self._classification_prompt(excerpts[index], subjects_str),
+                           available_subjects, priority, use_cache, results[index])
+            for index in unsure
+        ])
+        for index, result in zip(unsure, escalated):
+            results[index] = result
+        
+        valid = sum(1 for result in results if result is not None)
+        logger.info(f"📦 Batch classification: {valid}/{len(texts)} documents classified in one call")
+        return results
 
-    async def classify_with_db_subjects(self, text: str, db_service) -> LLMResult:
+    async def classify_batch_with_db_subjects(self, texts: List[str],
+                                              priority: LLMPriority = LLMPriority.batch,
+                                              use_cache: bool = True) -> List[Optional[LLMResult]]:
+        """Batched counterpart of classify_with_db_subjects"""
+        try:
+            available_subjects, subjects_prompt = await self._catalogue_subjects()
+        except Exception as e:
+            logger.error(f"❌ Error fetching subjects from database: {e}")
+            return [None] * len(texts)
+        return await self.classify_batch(texts, available_subjects, priority, subjects_prompt, use_cache)
+
+    async def classify_with_db_subjects(self, text: str, db_service,
+                                        priority: LLMPriority = LLMPriority.batch,
+                                        use_cache: bool = True) -> LLMResult:
         """Classify text using subjects from database"""
         try:
-            # Get available subjects from database
-            # subjects_result = db_service.supabase.table('subjects').select('name').execute()
-            subjects_result = db_service.supabase.table('user_subjects').select('subject_name').eq('is_active', True).execute()
-            if subjects_result.data:
-                # available_subjects = [subject['name'].strip() for subject in subjects_result.data]  # Strip whitespace
-                # In your llm_service.py, line 268, change this:
-                available_subjects = [subject['subject_name'].strip() for subject in subjects_result.data]
-                logger.info(f"📚 Using {len(available_subjects)} subjects from database")
-                logger.debug(f"Available subjects: {available_subjects}")
-            else:
-                logger.warning("No subjects found in database, using default categories")
-                available_subjects = ["Mathematics", "Science", "History", "Literature", "Business", "Technology", "Other"]
+            # Subjects come from the cached catalogue (db_service kept for existing callers)
+            available_subjects, subjects_prompt = await self._catalogue_subjects()
             
-            # Ensure 'Other' or 'other' exists as fallback
-            if not any(s.lower() == 'other' for s in available_subjects):
-                available_subjects.append('Other')
-            
-            classification_result = await self.classify_topic(text, available_subjects)
+            classification_result = await self.classify_topic(
+                text, available_subjects, priority, subjects_prompt, use_cache=use_cache
+            )
             
             # Log the final classification
             final_topic = classification_result.metadata.get('primary_topic', 'Unknown')
@@ -619,7 +1154,7 @@ Make sure the JSON is valid."""
         except Exception as e:
             logger.error(f"❌ Error fetching subjects from database: {e}")
             # Fallback to default classification
-            return await self.classify_topic(text)
+            return await self.classify_topic(text, priority=priority, use_cache=use_cache)
 
 # Global LLM service instance
 llm_service = LLMService()
\ No newline at end of file
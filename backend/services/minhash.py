@@ -0,0 +1,69 @@
+# backend/services/minhash.py
+import hashlib
+import re
+from typing import List
+
+import numpy as np
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+# Shingles are hashed in blocks so a long document never materializes a shingles x permutations matrix at once
+_BLOCK = 4096
+
+def normalize(text: str) -> bytes:
+    """Lowercase, with punctuation and whitespace runs collapsed, so layout and OCR spacing don't matter"""
+    return _NON_WORD_RE.sub(" ", text.lower()).strip().encode('utf-8')
+
+class MinHasher:
+    """MinHash signatures over character shingles.
+
+    Character shingles (rather than words) keep the estimate stable under OCR
+    noise: a misread character only disturbs the ``shingle_size`` shingles
+    around it. The fraction of equal signature slots estimates the Jaccard
+    similarity of two documents' shingle sets.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: odd 64-bit multipliers, keep the top 32 bits
+        self._a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """Unique 64-bit hashes of the normalized text's character shingles"""
+        data = np.frombuffer(normalize(text), dtype=np.uint8).astype(np.uint64)
+        count = len(data) - self.shingle_size + 1
+        if count <= 0:
+            return np.zeros(0, dtype=np.uint64)
+        hashes = np.zeros(count, dtype=np.uint64)
+        for offset in range(self.shingle_size):
+            hashes = hashes * np.uint64(257) + data[offset:offset + count]
+        return np.unique(hashes)
+
+    def signature(self, text: str) -> np.ndarray:
+        """``num_perm`` minimum hash values (uint32 range) of the text's shingles"""
+        signature = np.full(self.num_perm, 0xFFFFFFFF, dtype=np.uint64)
+        shingles = self.shingles(text)
+        for start in range(0, len(shingles), _BLOCK):
+            block = shingles[start:start + _BLOCK, None]
+            hashed = (block * self._a + self._b) >> np.uint64(32)
+            np.minimum(signature, hashed.min(axis=0), out=signature)
+        return signature
+
+def estimate_similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return float(np.mean(np.asarray(first) == np.asarray(second)))
+
+def band_keys(signature: np.ndarray, bands: int, rows: int) -> List[str]:
+    """LSH bucket keys: documents sharing any key are candidate near-duplicates.
+
+    With b bands of r rows, a pair with similarity s shares a bucket with
+    probability 1 - (1 - s^r)^b, a steep S-curve around (1/b)^(1/r).
+    """
+    signature = np.asarray(signature, dtype=np.uint64)
+    return [
+        f"{band}:{hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).hexdigest()}"
+        for band in range(bands)
+    ]
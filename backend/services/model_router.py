@@ -0,0 +1,134 @@
+# backend/services/model_router.py
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Tasks with short, structured output that the light model handles well when the input is small
+LIGHT_TASKS = {'classify', 'classify_batch', 'suggest_subject', 'summarize'}
+
+@dataclass(frozen=True)
+class ModelRoute:
+    name: str
+    models: Tuple[str, ...]  # Preferred model first, then fallbacks in order
+    generation_params: Dict[str, Any] = field(hash=False)
+    timeout: float = 30.0
+
+class RouteStats:
+    """Calls, fallbacks, latency and cost for one route"""
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0  # Failed attempts, including ones a fallback recovered
+        self.fallbacks = 0  # Calls answered by a model other than the route's first
+        self.escalations = 0  # Low-confidence answers re-asked on the strong route
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.models: Dict[str, int] = {}
+        self.latencies: deque = deque(maxlen=200)
+
+    def snapshot(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "fallbacks": self.fallbacks,
+            "escalations": self.escalations,
+            "answered_by": dict(self.models),
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": round(self.cost, 6),
+            "avg_latency": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "p95_latency": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3) if latencies else None
+        }
+
+class ModelRouter:
+    """Picks a Gemini model and generation config for each call.
+
+    Small inputs for light tasks go to the cheap model, everything else to
+    the standard one, and ``quality='high'`` to the strong one. Each route
+    lists fallback models that LLMService tries in order when a model errors
+    or times out. Classifications answered with low confidence are re-asked
+    on the strong route (see ``should_escalate``).
+    """
+
+    def __init__(self, routes: Dict[str, ModelRoute], light_max_tokens: int,
+                 escalation_confidence: float, prices: Dict[str, Any]):
+        self.routes = routes
+        self.light_max_tokens = light_max_tokens
+        self.escalation_confidence = escalation_confidence
+        self.prices = prices  # model -> [USD per 1M input tokens, USD per 1M output tokens]
+        self.stats: Dict[str, RouteStats] = {name: RouteStats() for name in routes}
+
+    def choose(self, task: str, input_tokens: int, quality: str = 'standard') -> ModelRoute:
+        if quality == 'high':
+            return self.routes['strong']
+        if quality == 'low' or (task in LIGHT_TASKS and input_tokens <= self.light_max_tokens):
+            return self.routes['light']
+        return self.routes['standard']
+
+    def should_escalate(self, route_name: Optional[str], confidence: float) -> bool:
+        return route_name != 'strong' and confidence < self.escalation_confidence
+
+    def cost(self, model: str, prompt_tokens: int, output_tokens: int) -> float:
+        input_price, output_price = self.prices.get(model) or (0.0, 0.0)
+        return (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    def record(self, route: ModelRoute, model: str, latency: float, prompt_tokens: int, output_tokens: int):
+        stats = self.stats[route.name]
+        stats.calls += 1
+        stats.fallbacks += model != route.models[0]
+        stats.models[model] = stats.models.get(model, 0) + 1
+        stats.prompt_tokens += prompt_tokens
+        stats.output_tokens += output_tokens
+        stats.cost += self.cost(model, prompt_tokens, output_tokens)
+        stats.latencies.append(latency)
+
+    def record_failure(self, route: ModelRoute):
+        self.stats[route.name].failures += 1
+
+    def record_escalation(self, route_name: Optional[str]):
+        if route_name in self.stats:
+            self.stats[route_name].escalations += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "light_max_tokens": self.light_max_tokens,
+            "escalation_confidence": self.escalation_confidence,
+            "routes": {
+                name: {"models": list(route.models), **self.stats[name].snapshot()}
+                for name, route in self.routes.items()
+            }
+        }
+
+def _chain(*models: str) -> Tuple[str, ...]:
+    """Models in order without repeats (a fallback equal to the primary is skipped)"""
+    return tuple(dict.fromkeys(model for model in models if model))
+
+STANDARD_PARAMS = {'temperature': 0.7, 'top_p': 0.9, 'max_output_tokens': 2048}
+
+# Global model router
+model_router = ModelRouter(
+    routes={
+        'light': ModelRoute(
+            'light', _chain(settings.llm_light_model, settings.llm_standard_model),
+            {'temperature': 0.2, 'top_p': 0.9, 'max_output_tokens': 1024}, settings.gemini_timeout
+        ),
+        'standard': ModelRoute(
+            'standard', _chain(settings.llm_standard_model, settings.llm_light_model),
+            STANDARD_PARAMS, settings.gemini_timeout
+        ),
+        'strong': ModelRoute(
+            'strong', _chain(settings.llm_strong_model, settings.llm_standard_model),
+            STANDARD_PARAMS, settings.gemini_timeout * 2
+        ),
+    },
+    light_max_tokens=settings.router_light_max_tokens,
+    escalation_confidence=settings.router_escalation_confidence,
+    prices=settings.llm_model_prices
+)
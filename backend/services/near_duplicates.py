@@ -0,0 +1,119 @@
+# backend/services/near_duplicates.py
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+from uuid import UUID
+
+import numpy as np
+
+from config.settings import settings
+from services.database import db_service
+from services.document_cache import document_cache
+from services.minhash import MinHasher, band_keys, estimate_similarity
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class NearDuplicate:
+    document_id: str
+    text_hash: str
+    similarity: float
+
+class NearDuplicateIndex:
+    """MinHash fingerprints with an LSH bucket table, so OCR'd copies of the same pages are found.
+
+    Fingerprints are computed once per document (cached with its working set)
+    and stored in document_fingerprints; each document's band keys go into
+    document_lsh_buckets, where sharing any key makes two documents
+    candidates. Candidates are confirmed by their estimated similarity.
+    """
+
+    def __init__(self, bands: int, rows: int, shingle_size: int, threshold: float, min_chars: int):
+        self.bands = bands
+        self.rows = rows
+        self.threshold = threshold
+        self.min_chars = min_chars
+        self.hasher = MinHasher(num_perm=bands * rows, shingle_size=shingle_size)
+
+        self.lookups = 0
+        self.matches = 0
+
+    async def _signature(self, document_id: UUID) -> Optional[np.ndarray]:
+        return await document_cache.get_artifact(
+            document_id, 'minhash', lambda text: asyncio.to_thread(self.hasher.signature, text)
+        )
+
+    async def register(self, document_id: UUID) -> bool:
+        """Fingerprint a freshly extracted document and add it to the LSH buckets"""
+        working_set = await document_cache.get(document_id)
+        if not working_set or len(working_set.text.strip()) < self.min_chars:
+            return False
+        try:
+            signature = await self._signature(document_id)
+            db_service.supabase.table('document_fingerprints').upsert({
+                'document_id': str(document_id),
+                'text_hash': working_set.text_hash,
+                'minhash': [int(value) for value in signature]
+            }, on_conflict='document_id').execute()
+            db_service.supabase.table('document_lsh_buckets').upsert(
+                [{'bucket': key, 'document_id': str(document_id)} for key in band_keys(signature, self.bands, self.rows)],
+                on_conflict='bucket,document_id'
+            ).execute()
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Could not fingerprint document {document_id}: {e}")
+            return False
+
+    async def find(self, document_id: UUID, limit: int = 3) -> List[NearDuplicate]:
+        """Other documents whose text is nearly the same as this one, most similar first"""
+        working_set = await document_cache.get(document_id)
+        if not working_set or len(working_set.text.strip()) < self.min_chars:
+            return []
+        self.lookups += 1
+        try:
+            signature = await self._signature(document_id)
+            buckets = db_service.supabase.table('document_lsh_buckets')\
+                .select("document_id")\
+                .in_('bucket', band_keys(signature, self.bands, self.rows))\
+                .neq('document_id', str(document_id))\
+                .execute()
+            candidate_ids = list({row['document_id'] for row in buckets.data or []})
+            if not candidate_ids:
+                return []
+
+            fingerprints = db_service.supabase.table('document_fingerprints')\
+                .select("document_id, text_hash, minhash")\
+                .in_('document_id', candidate_ids[:100])\
+                .execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Near-duplicate lookup failed for document {document_id}: {e}")
+            return []
+
+        duplicates = []
+        for row in fingerprints.data or []:
+            similarity = estimate_similarity(signature, np.asarray(row['minhash'], dtype=np.uint64))
+            if similarity >= self.threshold:
+                duplicates.append(NearDuplicate(row['document_id'], row['text_hash'], similarity))
+        duplicates.sort(key=lambda duplicate: duplicate.similarity, reverse=True)
+        if duplicates:
+            self.matches += 1
+        return duplicates[:limit]
+
+    def snapshot(self) -> dict:
+        return {
+            "bands": self.bands,
+            "rows": self.rows,
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "matches": self.matches
+        }
+
+# Global near-duplicate index
+near_duplicates = NearDuplicateIndex(
+    bands=settings.near_duplicate_bands,
+    rows=settings.near_duplicate_rows,
+    shingle_size=settings.near_duplicate_shingle_size,
+    threshold=settings.near_duplicate_threshold,
+    min_chars=settings.near_duplicate_min_chars
+)
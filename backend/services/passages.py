@@ -0,0 +1,108 @@
+# backend/services/passages.py
+from collections import Counter
+from typing import Callable, Iterable, List, Optional
+
+import numpy as np
+
+from services.chunker import TokenCounter, chunk_text, token_counter
+from services.keywords import KeywordExtractor
+
+class PassageSelector:
+    """Fixed-token-budget excerpts built from a document's most informative passages.
+
+    The text is cut into sentence-aligned passages of about ``passage_tokens``.
+    A passage scores for its density of subject-vocabulary words and for the
+    TF-IDF weight (per token) of words the excerpt doesn't cover yet, so
+    boilerplate, tables of contents and repeats of already chosen material
+    lose out. Passages are picked greedily until the budget is spent and
+    returned in document order; texts that already fit are returned whole.
+    """
+
+    SEPARATOR = "\n[...]\n"
+
+    def __init__(self, passage_tokens: int = 96, vocabulary_weight: float = 1.0,
+                 redundancy_penalty: float = 0.7, lead_bonus: float = 0.2,
+                 min_corpus_documents: int = 20, extractor: Optional[KeywordExtractor] = None):
+        self.passage_tokens = passage_tokens
+        self.vocabulary_weight = vocabulary_weight
+        self.redundancy_penalty = redundancy_penalty
+        self.lead_bonus = lead_bonus  # The opening usually names the document
+        self.min_corpus_documents = min_corpus_documents
+        self.extractor = extractor or KeywordExtractor()
+
+    def vocabulary(self, texts: Iterable[str]) -> set:
+        """Content words of subject names and keywords"""
+        return {word for text in texts for word in self.extractor.words(text)}
+
+    def select(self, text: str, budget_tokens: int, vocabulary: Iterable[str] = (),
+               document_frequencies: Optional[Callable[[List[str]], np.ndarray]] = None,
+               document_count: int = 0, counter: Optional[TokenCounter] = None) -> str:
+        """Excerpt of at most ``budget_tokens`` tokens"""
+        counter = counter or token_counter
+        if counter.count(text) <= budget_tokens:
+            return text
+
+        passages = chunk_text(text[:self.extractor.max_chars], min(self.passage_tokens, budget_tokens), 0, counter)
+        words = [self.extractor.words(passage.text) for passage in passages]
+        terms = sorted({word for passage_words in words for word in passage_words})
+        if not terms:
+            return passages[0].text if passages else ""
+        index = {word: i for i, word in enumerate(terms)}
+
+        # Sparse passage x term counts: one entry per distinct word of each passage,
+        # grouped by passage (offsets[i]:offsets[i + 1]), so memory follows the text, not passages x terms
+        counters = [Counter(passage_words) for passage_words in words]
+        offsets = np.cumsum([0] + [len(counts) for counts in counters])
+        rows = np.repeat(np.arange(len(passages)), np.diff(offsets))
+        cols = np.fromiter((index[word] for counts in counters for word in counts), dtype=np.int64, count=offsets[-1])
+        tf = np.fromiter((count for counts in counters for count in counts.values()), dtype=np.float64, count=offsets[-1])
+
+        if document_frequencies is not None and document_count >= self.min_corpus_documents:
+            df = np.asarray(document_frequencies(terms), dtype=np.float64)
+            total = document_count
+        else:
+            # Too little corpus yet: passages of this document stand in for documents
+            df = np.bincount(cols, minlength=len(terms)).astype(np.float64)
+            total = len(passages)
+        idf = np.log((total + 1) / (df + 1)) + 1.0
+        term_weights = (1 + np.log(tf)) * idf[cols]
+
+        lengths = np.array([max(passage.token_count, 1) for passage in passages], dtype=np.float64)
+        vocabulary = set(vocabulary)
+        in_vocabulary = np.array([word in vocabulary for word in terms], dtype=np.float64)
+        density = np.bincount(rows, weights=tf * in_vocabulary[cols], minlength=len(passages)) / lengths
+        if density.max() > 0:
+            density /= density.max()
+
+        separator_tokens = counter.count(self.SEPARATOR)
+        covered = np.zeros(len(terms))
+        chosen = np.zeros(len(passages), dtype=bool)
+        # Repeated passages (running headers, pasted boilerplate) only ever count once
+        seen = set()
+        excluded = np.zeros(len(passages), dtype=bool)
+        for i, passage_words in enumerate(words):
+            key = " ".join(passage_words)
+            excluded[i] = key in seen
+            seen.add(key)
+        remaining = float(budget_tokens)
+        while True:
+            novelty = np.bincount(rows, weights=term_weights * (1 - self.redundancy_penalty * covered[cols]),
+                                  minlength=len(passages)) / lengths
+            scores = novelty / max(novelty.max(), 1e-9) + self.vocabulary_weight * density
+            scores[0] += self.lead_bonus
+            scores[chosen | excluded | (lengths + separator_tokens > remaining)] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] == -np.inf:
+                break
+            chosen[best] = True
+            remaining -= lengths[best] + separator_tokens
+            covered[cols[offsets[best]:offsets[best + 1]]] = 1.0
+
+        # Adjacent passages are joined back into one span of the original text
+        spans: List[List[int]] = []
+        for i in np.flatnonzero(chosen):
+            if spans and spans[-1][1] == i - 1:
+                spans[-1][1] = i
+            else:
+                spans.append([i, i])
+        return self.SEPARATOR.join(text[passages[first].start:passages[last].end] for first, last in spans)
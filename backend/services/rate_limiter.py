@@ -0,0 +1,269 @@
+# backend/services/rate_limiter.py
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+from typing import Dict, List
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class LLMPriority(IntEnum):
+    """Rate limiter lanes - lower value is served first"""
+    interactive = 0
+    batch = 1
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at a fixed rate"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated = now
+
+    def wait_time(self, amount: float, floor: float = 0.0) -> float:
+        """Seconds until ``amount`` can be taken while leaving ``floor`` in the bucket
+        
+        The floor shrinks for amounts too large to ever clear it, so those still get served.
+        """
+        floor = min(floor, max(0.0, self.capacity - amount))
+        missing = amount + floor - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.refill_per_second
+
+class LocalBucketStore:
+    """Request and token buckets held in this process"""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+
+    async def try_acquire(self, tokens: int, reserve: float) -> float:
+        """Take one request and ``tokens`` tokens, or return how long to wait"""
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+
+        tokens = min(tokens, self.tokens.capacity)
+        wait = max(
+            self.requests.wait_time(1, self.requests.capacity * reserve),
+            self.tokens.wait_time(tokens, self.tokens.capacity * reserve)
+        )
+        if wait > 0:
+            return wait
+
+        self.requests.tokens -= 1
+        self.tokens.tokens -= tokens
+        return 0.0
+
+    async def debit(self, tokens: int):
+        """Charge tokens after the fact (e.g. output tokens); the bucket may go negative"""
+        self.tokens.refill(time.monotonic())
+        self.tokens.tokens -= tokens
+
+    def levels(self) -> Dict:
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return {
+            "requests_available": round(self.requests.tokens, 2),
+            "tokens_available": round(self.tokens.tokens, 2)
+        }
+
+# Both buckets are checked and updated in one atomic step so workers can't
+# interleave between the request check and the token check.
+_REDIS_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local reserve = tonumber(ARGV[2])
+local wait = 0
+local levels = {}
+for i = 1, 2 do
+  local capacity = tonumber(ARGV[3 + (i - 1) * 3])
+  local rate = tonumber(ARGV[4 + (i - 1) * 3])
+  local amount = math.min(tonumber(ARGV[5 + (i - 1) * 3]), capacity)
+  local data = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+  local level = tonumber(data[1]) or capacity
+  local ts = tonumber(data[2]) or now
+  level = math.min(capacity, level + math.max(0, now - ts) * rate)
+  local floor = math.min(capacity * reserve, math.max(0, capacity - amount))
+  local missing = amount + floor - level
+  if missing > 0 then
+    wait = math.max(wait, missing / rate)
+  end
+  levels[i] = level - amount
+end
+if wait > 0 then
+  return tostring(wait)
+end
+for i = 1, 2 do
+  redis.call('HSET', KEYS[i], 'tokens', levels[i], 'ts', now)
+  redis.call('EXPIRE', KEYS[i], 300)
+end
+return '0'
+"""
+
+class RedisBucketStore:
+    """Request and token buckets shared by every worker through Redis"""
+
+    def __init__(self, redis_url: str, requests_per_minute: int, tokens_per_minute: int,
+                 key_prefix: str = "clutterflow:llm_rate"):
+        import redis.asyncio as redis  # Optional dependency, only needed for shared limits
+
+        self.client = redis.from_url(redis_url)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_key = f"{key_prefix}:requests"
+        self.tokens_key = f"{key_prefix}:tokens"
+        self._acquire = self.client.register_script(_REDIS_ACQUIRE_SCRIPT)
+
+    async def try_acquire(self, tokens: int, reserve: float) -> float:
+        wait = await self._acquire(
+            keys=[self.requests_key, self.tokens_key],
+            args=[
+                time.time(), reserve,
+                self.requests_per_minute, self.requests_per_minute / 60, 1,
+                self.tokens_per_minute, self.tokens_per_minute / 60, tokens
+            ]
+        )
+        return float(wait)
+
+    async def debit(self, tokens: int):
+        await self.client.hincrbyfloat(self.tokens_key, 'tokens', -tokens)
+
+    def levels(self) -> Dict:
+        return {"shared_store": "redis"}
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "tokens", "event")
+
+    def __init__(self, priority: int, seq: int, tokens: int):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.event = asyncio.Event()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter for all Gemini calls.
+
+    Callers wait in a single priority queue so interactive calls are granted
+    before any queued batch work, and batch calls additionally leave a
+    reserve of capacity untouched for interactive traffic.
+    """
+
+    def __init__(self, local_store: LocalBucketStore, shared_store=None, batch_reserve: float = 0.2):
+        self.local_store = local_store
+        self.shared_store = shared_store
+        self.batch_reserve = batch_reserve
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+
+        self.granted = {priority.name: 0 for priority in LLMPriority}
+        self.total_wait_seconds = {priority.name: 0.0 for priority in LLMPriority}
+
+    @property
+    def store(self):
+        return self.shared_store or self.local_store
+
+    async def _try_acquire(self, tokens: int, reserve: float) -> float:
+        try:
+            return await self.store.try_acquire(tokens, reserve)
+        except Exception as e:
+            if self.shared_store is None:
+                raise
+            # Never let a broken shared store stop LLM calls - limit locally instead
+            logger.warning(f"⚠️ Shared rate limit store unavailable, falling back to local limits: {e}")
+            self.shared_store = None
+            return await self.local_store.try_acquire(tokens, reserve)
+
+    async def acquire(self, tokens: int, priority: LLMPriority = LLMPriority.batch):
+        """Wait until one request carrying ``tokens`` prompt tokens may be sent"""
+        waiter = _Waiter(int(priority), next(self._seq), tokens)
+        heapq.heappush(self._waiters, waiter)
+        reserve = 0.0 if priority == LLMPriority.interactive else self.batch_reserve
+        started = time.monotonic()
+
+        try:
+            while True:
+                if self._waiters[0] is not waiter:
+                    await waiter.event.wait()
+                    waiter.event.clear()
+                    continue
+
+                wait = await self._try_acquire(tokens, reserve)
+                if wait <= 0:
+                    break
+                # Re-check at least every second so a newly queued interactive
+                # call can take over the head of the queue
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            self._remove(waiter)
+
+        self.granted[priority.name] += 1
+        self.total_wait_seconds[priority.name] += time.monotonic() - started
+
+    def _remove(self, waiter: _Waiter):
+        if self._waiters and self._waiters[0] is waiter:
+            heapq.heappop(self._waiters)
+        elif waiter in self._waiters:
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+
+        if self._waiters:
+            self._waiters[0].event.set()
+
+    async def debit(self, tokens: int):
+        """Charge tokens that were only known after the call (output tokens)"""
+        if tokens <= 0:
+            return
+        try:
+            await self.store.debit(tokens)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to debit {tokens} tokens from rate limiter: {e}")
+
+    def snapshot(self) -> Dict:
+        """Queue depth, grants and bucket levels for the metrics endpoint"""
+        waiting = {priority.name: 0 for priority in LLMPriority}
+        for waiter in self._waiters:
+            waiting[LLMPriority(waiter.priority).name] += 1
+
+        return {
+            "shared": self.shared_store is not None,
+            "batch_reserve": self.batch_reserve,
+            "waiting": waiting,
+            "granted": dict(self.granted),
+            "total_wait_seconds": {k: round(v, 3) for k, v in self.total_wait_seconds.items()},
+            **self.store.levels()
+        }
+
+def _create_rate_limiter() -> RateLimiter:
+    local_store = LocalBucketStore(settings.llm_requests_per_minute, settings.llm_tokens_per_minute)
+    shared_store = None
+
+    if settings.rate_limit_redis_url:
+        try:
+            shared_store = RedisBucketStore(
+                settings.rate_limit_redis_url,
+                settings.llm_requests_per_minute,
+                settings.llm_tokens_per_minute
+            )
+            logger.info("🔗 LLM rate limits shared across workers via Redis")
+        except ImportError:
+            logger.warning("⚠️ rate_limit_redis_url is set but redis is not installed - using local limits")
+
+    return RateLimiter(local_store, shared_store, batch_reserve=settings.llm_batch_reserve)
+
+# Global rate limiter shared by every Gemini call in this process
+rate_limiter = _create_rate_limiter()
@@ -0,0 +1,282 @@
+# backend/services/related_documents.py
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+
+from config.settings import settings
+from services.database import db_service
+from services.document_cache import document_cache
+from services.document_vectors import document_vectors
+from services.embedding_service import embedding_service
+from services.task_scheduler import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+class RelatedDocuments:
+    """k-nearest-neighbour graph over document vectors, stored in document_neighbors.
+
+    When a document is enriched its k nearest neighbours are found with one
+    vectorized product against an in-memory copy of every document vector
+    (synced incrementally from document_embeddings), and it is inserted into
+    the neighbour lists it now belongs in. Lookups read at most k edges.
+    Lists left short by deletions, or built with another embedding model,
+    are recomputed the next time they're read.
+    """
+
+    def __init__(self, k: int, sync_overlap: float = 60.0):
+        self.k = k
+        self.sync_overlap = sync_overlap
+        self._model_id: Optional[str] = None
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._synced_at: Optional[datetime] = None  # Newest updated_at seen so far
+        # Short neighbour lists already checked complete, by edge count. Writers link new
+        # documents into short lists, so one stays complete until it loses an edge.
+        self._complete: Dict[str, int] = {}
+        self._complete_model: Optional[str] = None
+        self._lock = asyncio.Lock()
+
+        self.lookups = 0
+        self.repairs = 0
+        self.updates = 0
+
+    # ---- in-memory vectors ----
+
+    def _put(self, document_id: str, vector: np.ndarray):
+        if vector.shape[0] != self._matrix.shape[1]:
+            if len(self._ids):
+                return  # Wrong dimension for this model
+            self._matrix = np.zeros((0, vector.shape[0]), dtype=np.float32)
+        row = self._rows.get(document_id)
+        if row is None:
+            row = len(self._ids)
+            if row == self._matrix.shape[0]:
+                grown = np.zeros((max(1024, row * 2), self._matrix.shape[1]), dtype=np.float32)
+                grown[:row] = self._matrix
+                self._matrix = grown
+            self._ids.append(document_id)
+            self._rows[document_id] = row
+        self._matrix[row] = vector
+
+    def remove(self, document_id: UUID):
+        """Forget a deleted document's vector (its edges go with the row)"""
+        row = self._rows.pop(str(document_id), None)
+        if row is None:
+            return
+        last = len(self._ids) - 1
+        if row != last:
+            moved = self._ids[last]
+            self._ids[row] = moved
+            self._rows[moved] = row
+            self._matrix[row] = self._matrix[last]
+        self._ids.pop()
+
+    async def _sync(self):
+        """Pull vectors saved since the last sync, by this or any other process"""
+        model_id = embedding_service.model_id
+        if model_id != self._model_id:
+            self._model_id = model_id
+            self._ids, self._rows, self._synced_at = [], {}, None
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+
+        # updated_at is stamped by the database when a write starts, so a write can
+        # commit after a newer one was synced; re-read an overlap window (_put upserts)
+        since = self._synced_at - timedelta(seconds=self.sync_overlap) if self._synced_at else None
+        offset = 0
+        while True:
+            query = db_service.supabase.table('document_embeddings')\
+                .select("document_id, vector, updated_at")\
+                .eq('model_id', model_id)
+            if since:
+                query = query.gte('updated_at', since.isoformat())
+            result = query.order('updated_at').order('document_id').range(offset, offset + 999).execute()
+            rows = result.data or []
+            for row in rows:
+                self._put(row['document_id'], np.asarray(row['vector'], dtype=np.float32))
+                updated_at = parse_timestamp(row['updated_at'])
+                if self._synced_at is None or updated_at > self._synced_at:
+                    self._synced_at = updated_at
+            if len(rows) < 1000:
+                return
+            offset += 1000
+
+    async def _vector(self, document_id: str) -> Optional[np.ndarray]:
+        row = self._rows.get(document_id)
+        if row is not None:
+            return self._matrix[row].copy()
+        # Not enriched yet (or no local classifier) - embed it now and keep the vector
+        text = await document_cache.get_text(UUID(document_id))
+        if not text:
+            return None
+        vector = (await embedding_service.embed_async([text]))[0]
+        await document_vectors.save(document_id, vector, self._model_id)
+        self._put(document_id, vector)
+        return vector
+
+    def _nearest(self, vector: np.ndarray, exclude: str) -> List[Tuple[str, float]]:
+        count = len(self._ids)
+        if count == 0:
+            return []
+        scores = self._matrix[:count] @ vector
+        own_row = self._rows.get(exclude)
+        if own_row is not None:
+            scores[own_row] = -np.inf
+        take = min(self.k, count - (own_row is not None))
+        if take <= 0:
+            return []
+        top = np.argpartition(-scores, take - 1)[:take]
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[i], float(scores[i])) for i in top]
+
+    async def _neighbors(self, vector: np.ndarray, document_id: str) -> List[Tuple[str, float]]:
+        """Nearest documents that still exist, forgetting any deleted since their vector was synced"""
+        for _ in range(3):
+            neighbors = self._nearest(vector, document_id)
+            if not neighbors:
+                return []
+            result = db_service.supabase.table('documents')\
+                .select("id")\
+                .in_('id', [neighbor_id for neighbor_id, _ in neighbors])\
+                .execute()
+            alive = {row['id'] for row in result.data or []}
+            if len(alive) == len(neighbors):
+                break
+            for neighbor_id, _ in neighbors:
+                if neighbor_id not in alive:
+                    self.remove(neighbor_id)
+        return [(neighbor_id, similarity) for neighbor_id, similarity in neighbors if neighbor_id in alive]
+
+    # ---- graph ----
+
+    def _edge(self, document_id: str, neighbor_id: str, similarity: float) -> dict:
+        return {
+            'document_id': document_id,
+            'neighbor_id': neighbor_id,
+            'similarity': round(similarity, 5),
+            'model_id': self._model_id
+        }
+
+    async def _write_neighbors(self, document_id: str, neighbors: List[Tuple[str, float]]):
+        db_service.supabase.table('document_neighbors').delete().eq('document_id', document_id).execute()
+        if neighbors:
+            db_service.supabase.table('document_neighbors')\
+                .insert([self._edge(document_id, neighbor_id, similarity) for neighbor_id, similarity in neighbors])\
+                .execute()
+
+    async def _link_back(self, document_id: str, neighbors: List[Tuple[str, float]]):
+        """Insert the document into each neighbour's list where it beats that list's weakest edge"""
+        result = db_service.supabase.table('document_neighbors')\
+            .select("document_id, neighbor_id, similarity")\
+            .in_('document_id', [neighbor_id for neighbor_id, _ in neighbors])\
+            .execute()
+        lists: Dict[str, List[dict]] = {}
+        for edge in result.data or []:
+            if edge['neighbor_id'] != document_id:
+                lists.setdefault(edge['document_id'], []).append(edge)
+
+        inserts, evictions = [], []
+        for neighbor_id, similarity in neighbors:
+            edges = lists.get(neighbor_id, [])
+            if len(edges) < self.k:
+                inserts.append(self._edge(neighbor_id, document_id, similarity))
+                continue
+            weakest = min(edges, key=lambda edge: edge['similarity'])
+            if similarity > weakest['similarity']:
+                inserts.append(self._edge(neighbor_id, document_id, similarity))
+                evictions.append(weakest)
+
+        if inserts:
+            db_service.supabase.table('document_neighbors')\
+                .upsert(inserts, on_conflict='document_id,neighbor_id')\
+                .execute()
+        for edge in evictions:
+            db_service.supabase.table('document_neighbors')\
+                .delete()\
+                .eq('document_id', edge['document_id'])\
+                .eq('neighbor_id', edge['neighbor_id'])\
+                .execute()
+
+    async def add_document(self, document_id: UUID) -> int:
+        """Place a newly enriched document in the graph. Returns its neighbour count."""
+        document_id = str(document_id)
+        async with self._lock:
+            await self._sync()
+            vector = await self._vector(document_id)
+            if vector is None:
+                return 0
+            neighbors = await self._neighbors(vector, document_id)
+
+        await self._write_neighbors(document_id, neighbors)
+        if neighbors:
+            await self._link_back(document_id, neighbors)
+        self.updates += 1
+        return len(neighbors)
+
+    async def _repair(self, document_id: str) -> List[dict]:
+        async with self._lock:
+            await self._sync()
+            vector = await self._vector(document_id)
+            if vector is None:
+                return []
+            neighbors = await self._neighbors(vector, document_id)
+        await self._write_neighbors(document_id, neighbors)
+        self.repairs += 1
+        return [{'neighbor_id': neighbor_id, 'similarity': round(similarity, 5)} for neighbor_id, similarity in neighbors]
+
+    async def related(self, document_id: UUID, limit: int) -> List[dict]:
+        """Up to ``limit`` (<= k) most similar documents as neighbor_id/similarity rows"""
+        self.lookups += 1
+        document_id = str(document_id)
+        result = db_service.supabase.table('document_neighbors')\
+            .select("neighbor_id, similarity, model_id")\
+            .eq('document_id', document_id)\
+            .order('similarity', desc=True)\
+            .limit(self.k)\
+            .execute()
+        edges = result.data or []
+
+        model_id = embedding_service.model_id
+        if model_id != self._complete_model:
+            self._complete, self._complete_model = {}, model_id
+        stale = any(edge['model_id'] != model_id for edge in edges)
+        if not stale and len(edges) < self.k and len(edges) < self._complete.get(document_id, self.k):
+            # Short list: a neighbour was deleted, the document was never placed in the graph,
+            # or the corpus is small - count the other vectors rather than loading them all
+            stale = len(edges) < min(self.k, await self._other_vectors(document_id, model_id))
+        if stale:
+            edges = await self._repair(document_id)
+        if len(edges) < self.k:
+            self._complete[document_id] = len(edges)
+
+        return [{'neighbor_id': edge['neighbor_id'], 'similarity': edge['similarity']} for edge in edges[:limit]]
+
+    async def _other_vectors(self, document_id: str, model_id: str) -> int:
+        """Documents other than this one that have a vector from the current model"""
+        result = db_service.supabase.table('document_embeddings')\
+            .select("document_id", count='exact')\
+            .eq('model_id', model_id)\
+            .neq('document_id', document_id)\
+            .limit(1)\
+            .execute()
+        return result.count or 0
+
+    def snapshot(self) -> dict:
+        return {
+            "model_id": self._model_id,
+            "k": self.k,
+            "vectors_in_memory": len(self._ids),
+            "lookups": self.lookups,
+            "repairs": self.repairs,
+            "updates": self.updates
+        }
+
+# Global related-documents graph
+related_documents = RelatedDocuments(
+    k=settings.related_documents_k,
+    sync_overlap=settings.related_documents_sync_overlap
+)
@@ -0,0 +1,83 @@
+# backend/services/semantic_search.py
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from config.settings import settings
+from services.chunker import chunk_text
+from services.embedding_service import embedding_service
+from services.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+class SemanticSearch:
+    """Semantic search over document passages.
+
+    Documents are split into short passages and embedded when they're
+    enriched; queries are embedded the same way and matched against the
+    passage index, returning each document's best passage.
+    """
+
+    def __init__(self, index_path: str, passage_tokens: int, overlap_tokens: int,
+                 ivf_threshold: int, nprobe: int):
+        self.index_path = index_path
+        self.passage_tokens = passage_tokens
+        self.overlap_tokens = overlap_tokens
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._index: Optional[VectorIndex] = None
+        self._index_lock = threading.Lock()
+
+    @property
+    def index(self) -> VectorIndex:
+        if self._index is None:
+            with self._index_lock:
+                if self._index is None:
+                    self._index = VectorIndex(
+                        self.index_path, embedding_service.dimension, embedding_service.model_id,
+                        ivf_threshold=self.ivf_threshold, nprobe=self.nprobe
+                    )
+        return self._index
+
+    async def index_document(self, document_id: UUID, text: str) -> int:
+        """Embed and store a document's passages, replacing earlier ones. Returns the passage count."""
+        passages = [p for p in chunk_text(text, self.passage_tokens, self.overlap_tokens) if p.text.strip()]
+        if not passages:
+            await self.remove_document(document_id)
+            return 0
+
+        vectors = await embedding_service.embed_async([p.text for p in passages])
+        await asyncio.to_thread(self.index.add, str(document_id), vectors, [(p.start, p.end) for p in passages])
+        logger.info(f"🔎 Indexed {len(passages)} passages for document {document_id}")
+        return len(passages)
+
+    async def remove_document(self, document_id: UUID) -> bool:
+        return await asyncio.to_thread(self.index.delete, str(document_id))
+
+    def _search(self, query: str, k: int) -> List[Dict]:
+        index = self.index
+        index.refresh()  # The worker may have added documents since
+        query_vector = embedding_service.embed([query])[0]
+        return [
+            {"document_id": document_id, "score": round(score, 4), "start": start, "end": end}
+            for document_id, start, end, score in index.search(query_vector, k)
+            if score > 0  # Nothing in common with the query
+        ]
+
+    async def search(self, query: str, k: int = 10) -> List[Dict]:
+        """Top ``k`` documents for the query with the character span of their best passage"""
+        return await asyncio.to_thread(self._search, query, k)
+
+    def snapshot(self) -> Dict:
+        return self.index.snapshot()
+
+# Global semantic search engine
+semantic_search = SemanticSearch(
+    index_path=settings.search_index_path,
+    passage_tokens=settings.search_passage_tokens,
+    overlap_tokens=settings.search_passage_overlap_tokens,
+    ivf_threshold=settings.search_ivf_threshold,
+    nprobe=settings.search_ivf_nprobe
+)
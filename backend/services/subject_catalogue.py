@@ -0,0 +1,125 @@
+# backend/services/subject_catalogue.py
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from config.settings import settings
+from services.database import db_service
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class CatalogueSnapshot:
+    """Active subjects plus the prompt fragments built from them, for one catalogue version"""
+    version: Optional[int]
+    subjects: List[Dict[str, Any]]
+    names: List[str]
+    names_with_other: List[str]
+    names_prompt: str  # "Mathematics, Science, ..., Other"
+    keywords_prompt: str  # "- Mathematics: algebra, calculus" per line
+    keywords_prompt_with_other: str
+    by_name: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, subjects: List[Dict[str, Any]], version: Optional[int]) -> "CatalogueSnapshot":
+        names = [subject['subject_name'].strip() for subject in subjects]
+        has_other = any(name.lower() == 'other' for name in names)
+        names_with_other = names if has_other else names + ['Other']
+
+        keyword_lines = []
+        for name, subject in zip(names, subjects):
+            keywords = ", ".join(subject.get('keywords') or [])
+            keyword_lines.append(f"- {name}: {keywords}" if keywords else f"- {name}")
+        keywords_prompt = "\n".join(keyword_lines)
+        other_line = "" if has_other else "\n- Other: anything that fits none of the subjects above"
+
+        return cls(
+            version=version,
+            subjects=subjects,
+            names=names,
+            names_with_other=names_with_other,
+            names_prompt=", ".join(names_with_other),
+            keywords_prompt=keywords_prompt,
+            keywords_prompt_with_other=keywords_prompt + other_line,
+            by_name={name: subject for name, subject in zip(names, subjects)}
+        )
+
+class SubjectCatalogue:
+    """In-process cache of active user_subjects.
+
+    Local subject CRUD invalidates it directly. Changes made by other workers
+    are picked up through the subject_catalogue_version row (bumped by a
+    trigger on user_subjects), checked at most every ``check_interval``
+    seconds; if that row isn't available the cache simply expires after
+    ``max_age`` seconds.
+    """
+
+    def __init__(self, check_interval: float, max_age: float):
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._snapshot: Optional[CatalogueSnapshot] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+        self.hits = 0
+        self.reloads = 0
+
+    def invalidate(self):
+        """Drop the cached catalogue; the next read reloads it"""
+        self._snapshot = None
+
+    async def _remote_version(self) -> Optional[int]:
+        try:
+            result = db_service.supabase.table('subject_catalogue_version')\
+                .select("version")\
+                .eq('id', 1)\
+                .execute()
+            return result.data[0]['version'] if result.data else None
+        except Exception as e:
+            logger.debug(f"Subject catalogue version unavailable: {e}")
+            return None
+
+    async def _is_fresh(self) -> bool:
+        now = time.monotonic()
+        if self._snapshot is None or now - self._loaded_at > self.max_age:
+            return False
+        if now - self._checked_at < self.check_interval:
+            return True
+
+        self._checked_at = now
+        remote_version = await self._remote_version()
+        return remote_version is None or remote_version == self._snapshot.version
+
+    async def get(self) -> CatalogueSnapshot:
+        """Current catalogue, reloading it if another worker changed the subjects"""
+        if await self._is_fresh():
+            self.hits += 1
+            return self._snapshot
+
+        stale = self._snapshot
+        async with self._lock:
+            # Another caller may have reloaded while we waited for the lock
+            if self._snapshot is not None and self._snapshot is not stale:
+                return self._snapshot
+
+            version = await self._remote_version()
+            result = db_service.supabase.table('user_subjects')\
+                .select("*")\
+                .eq('is_active', True)\
+                .order('subject_name')\
+                .execute()
+
+            self._snapshot = CatalogueSnapshot.build(result.data or [], version)
+            self._loaded_at = self._checked_at = time.monotonic()
+            self.reloads += 1
+            logger.info(f"📚 Loaded subject catalogue: {len(self._snapshot.subjects)} subjects (version {version})")
+            return self._snapshot
+
+# Global subject catalogue cache
+subject_catalogue = SubjectCatalogue(
+    check_interval=settings.subject_catalogue_check_interval,
+    max_age=settings.subject_catalogue_max_age
+)
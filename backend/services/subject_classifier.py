@@ -0,0 +1,228 @@
+# backend/services/subject_classifier.py
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+
+from config.settings import settings
+from services.database import db_service
+from services.document_vectors import document_vectors
+from services.embedding_service import embedding_service
+from services.subject_catalogue import CatalogueSnapshot, subject_catalogue
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class SubjectPrediction:
+    subject: Dict[str, Any]
+    similarity: float  # cosine similarity to the subject's centroid
+    margin: float  # lead over the runner-up subject
+    confidence: float  # softmax probability of the top subject
+    confident: bool  # clear enough to skip Gemini
+    vector: np.ndarray
+    model_id: str
+
+class SubjectClassifier:
+    """Nearest-centroid subject classifier over local embeddings, tried before Gemini.
+
+    Each subject's centroid blends the embedding of its name, description and
+    keywords with the mean vector of documents already assigned to it. A
+    prediction counts as confident only when the best similarity clears
+    ``min_similarity`` and leads the runner-up by ``min_margin``; anything
+    closer is left for Gemini to decide.
+    """
+
+    def __init__(self, min_similarity: float, min_margin: float, keyword_weight: float,
+                 docs_per_subject: int, temperature: float = 0.05):
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.keyword_weight = keyword_weight
+        self.docs_per_subject = docs_per_subject
+        self.temperature = temperature
+
+        self._catalogue: Optional[CatalogueSnapshot] = None
+        self._model_id: Optional[str] = None
+        self._subjects: List[Dict[str, Any]] = []
+        self._index: Dict[str, int] = {}  # subject id -> row
+        self._keyword_vectors = np.zeros((0, 0), dtype=np.float32)
+        self._doc_sums = np.zeros((0, 0), dtype=np.float32)
+        self._doc_counts = np.zeros(0, dtype=np.int64)
+        self._centroids = np.zeros((0, 0), dtype=np.float32)
+        self._members: Dict[str, Tuple[int, np.ndarray]] = {}  # document id -> (subject row, vector it added)
+        self._lock = asyncio.Lock()
+
+        self.fast_path = 0
+        self.ambiguous = 0
+
+    def _subject_text(self, subject: Dict[str, Any]) -> str:
+        parts = [subject['subject_name'].strip()]
+        if subject.get('description'):
+            parts.append(subject['description'])
+        if subject.get('keywords'):
+            parts.append(", ".join(subject['keywords']))
+        return ". ".join(parts)
+
+    def _recompute(self):
+        counts = np.maximum(self._doc_counts, 1)[:, None]
+        doc_means = self._doc_sums / counts
+        blended = self.keyword_weight * self._keyword_vectors + (1 - self.keyword_weight) * doc_means
+        centroids = np.where((self._doc_counts > 0)[:, None], blended, self._keyword_vectors)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self._centroids = (centroids / np.maximum(norms, 1e-12)).astype(np.float32)
+
+    async def _rebuild(self, catalogue: CatalogueSnapshot):
+        model_id = embedding_service.model_id
+        subjects = catalogue.subjects
+        keyword_vectors = await embedding_service.embed_async([self._subject_text(s) for s in subjects])
+
+        index = {str(subject['id']): row for row, subject in enumerate(subjects)}
+        doc_sums = np.zeros_like(keyword_vectors)
+        doc_counts = np.zeros(len(subjects), dtype=np.int64)
+        members: Dict[str, Tuple[int, np.ndarray]] = {}
+
+        try:
+            result = db_service.supabase.table('document_classifications')\
+                .select("document_id, subject_id")\
+                .not_.is_('subject_id', 'null')\
+                .order('created_at', desc=True)\
+                .limit(self.docs_per_subject * max(len(subjects), 1))\
+                .execute()
+            assigned = [row for row in result.data or [] if str(row['subject_id']) in index]
+            vectors = await document_vectors.load_many([row['document_id'] for row in assigned], model_id)
+            for row in assigned:
+                document_id = str(row['document_id'])
+                if document_id in members:
+                    continue  # Only the newest classification of a document counts
+                vector = vectors.get(row['document_id'])
+                subject_row = index[str(row['subject_id'])]
+                if vector is not None and vector.shape[0] == doc_sums.shape[1] and doc_counts[subject_row] < self.docs_per_subject:
+                    doc_sums[subject_row] += vector
+                    doc_counts[subject_row] += 1
+                    members[document_id] = (subject_row, vector)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load assigned documents for subject centroids: {e}")
+
+        self._subjects, self._index = subjects, index
+        self._keyword_vectors, self._doc_sums, self._doc_counts = keyword_vectors, doc_sums, doc_counts
+        self._members = members
+        self._recompute()
+        self._catalogue, self._model_id = catalogue, model_id
+        logger.info(f"🧭 Built {len(subjects)} subject centroids from keywords and {int(doc_counts.sum())} documents ({model_id})")
+
+    async def _ensure_centroids(self):
+        catalogue = await subject_catalogue.get()
+        if catalogue is self._catalogue and self._model_id == embedding_service.model_id:
+            return
+        async with self._lock:
+            if catalogue is not self._catalogue or self._model_id != embedding_service.model_id:
+                await self._rebuild(catalogue)
+
+    async def observe(self, document_id: UUID, subject_id: UUID):
+        """Fold an assigned document into its subject's centroid
+
+        A document counts once: re-running its classification is a no-op, and
+        moving it to another subject first takes its vector out of the old one.
+        """
+        key = str(document_id)
+        if key in self._members and self._members[key][0] == self._index.get(str(subject_id)):
+            return
+        vectors = await document_vectors.load_many([key], self._model_id) if str(subject_id) in self._index else {}
+
+        # Centroids may have been rebuilt while loading; look everything up again
+        row = self._index.get(str(subject_id))
+        previous = self._members.get(key)
+        if previous is not None and previous[0] == row:
+            return
+        changed = False
+        if previous is not None:
+            old_row, old_vector = self._members.pop(key)
+            self._doc_sums[old_row] -= old_vector
+            self._doc_counts[old_row] -= 1
+            changed = True
+        vector = vectors.get(key)
+        if (row is not None and vector is not None and vector.shape[0] == self._doc_sums.shape[1]
+                and self._doc_counts[row] < self.docs_per_subject):
+            self._doc_sums[row] += vector
+            self._doc_counts[row] += 1
+            self._members[key] = (row, vector)
+            changed = True
+        if changed:
+            self._recompute()
+
+    async def predict(self, text: str) -> Optional[SubjectPrediction]:
+        await self._ensure_centroids()
+        if not self._subjects:
+            return None
+
+        vector = (await embedding_service.embed_async([text]))[0]
+        scores = self._centroids @ vector
+
+        order = np.argsort(scores)[::-1]
+        best = int(order[0])
+        runner_up = float(scores[order[1]]) if len(order) > 1 else 0.0
+        margin = float(scores[best]) - runner_up
+
+        weights = np.exp((scores - scores[best]) / self.temperature)
+        confidence = float(weights[best] / weights.sum())
+
+        confident = float(scores[best]) >= self.min_similarity and margin >= self.min_margin
+        if confident:
+            self.fast_path += 1
+        else:
+            self.ambiguous += 1
+
+        return SubjectPrediction(
+            subject=self._subjects[best],
+            similarity=float(scores[best]),
+            margin=margin,
+            confidence=confidence,
+            confident=confident,
+            vector=vector,
+            model_id=self._model_id
+        )
+
+    async def classify_document(self, document_id: UUID, text: str) -> Optional[SubjectPrediction]:
+        """predict() for a stored document, keeping its vector for centroids; None when unavailable"""
+        if not settings.enable_local_classifier:
+            return None
+        try:
+            prediction = await self.predict(text)
+        except Exception as e:
+            logger.warning(f"⚠️ Local subject classifier failed for document {document_id}: {e}")
+            return None
+        if prediction is not None:
+            await document_vectors.save(document_id, prediction.vector, prediction.model_id)
+        return prediction
+
+    async def store_vector(self, document_id: UUID, text: str) -> bool:
+        """Embed and keep a stored document's vector for centroids, without predicting or counting it"""
+        if not settings.enable_local_classifier:
+            return False
+        try:
+            vector = (await embedding_service.embed_async([text]))[0]
+        except Exception as e:
+            logger.warning(f"⚠️ Could not embed document {document_id} for subject centroids: {e}")
+            return False
+        return await document_vectors.save(document_id, vector, embedding_service.model_id)
+
+    def snapshot(self) -> Dict:
+        decided = self.fast_path + self.ambiguous
+        return {
+            "model_id": self._model_id,
+            "subjects": len(self._subjects),
+            "documents_in_centroids": int(self._doc_counts.sum()),
+            "fast_path": self.fast_path,
+            "ambiguous": self.ambiguous,
+            "fast_path_rate": round(self.fast_path / decided, 3) if decided else None
+        }
+
+# Global local subject classifier
+subject_classifier = SubjectClassifier(
+    min_similarity=settings.subject_classifier_min_similarity,
+    min_margin=settings.subject_classifier_min_margin,
+    keyword_weight=settings.subject_classifier_keyword_weight,
+    docs_per_subject=settings.subject_classifier_docs_per_subject
+)
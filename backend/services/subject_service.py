@@ -4,7 +4,12 @@ from typing import Optional, List, Dict, Any
 from uuid import UUID
 from datetime import datetime
 
+from config.settings import settings
 from services.database import db_service
+from services.rate_limiter import LLMPriority
+from services.document_cache import document_cache
+from services.subject_catalogue import subject_catalogue
+from services.subject_classifier import subject_classifier
 from models.schemas import SubjectCreate, SubjectUpdate, SubjectResponse, SubjectWithStats
 
 logger = logging.getLogger(__name__)
@@ -22,6 +27,7 @@ class SubjectService:
             result = self.supabase.table('user_subjects').insert(data).execute()
             
             if result.data:
+                subject_catalogue.invalidate()
                 logger.info(f"✅ Created subject: {subject_data.subject_name}")
                 return result.data[0]
             return None
@@ -33,6 +39,11 @@ class SubjectService:
     async def get_all_subjects(self, include_stats: bool = False) -> List[Dict[str, Any]]:
         """Get all active subjects"""
         try:
+            if not include_stats:
+                # Served from the catalogue cache; copies so callers can't mutate it
+                catalogue = await subject_catalogue.get()
+                return [dict(subject) for subject in catalogue.subjects]
+
             # Always use simple query - stats calculation in Python
             result = self.supabase.table('user_subjects')\
                 .select("*")\
@@ -108,6 +119,7 @@ class SubjectService:
                 .execute()
             
             if result.data:
+                subject_catalogue.invalidate()
                 logger.info(f"✅ Updated subject: {subject_id}")
                 return result.data[0]
             return None
@@ -130,6 +142,7 @@ class SubjectService:
                 .execute()
             
             if result.data:
+                subject_catalogue.invalidate()
                 logger.info(f"✅ Deleted subject: {subject_id}")
                 return True
             return False
@@ -222,6 +235,7 @@ class SubjectService:
             
             if result.data:
                 logger.info(f"✅ Assigned document {document_id} to subject {subject_id}")
+                await subject_classifier.observe(document_id, subject_id)
                 return True
             return False
             
@@ -286,45 +300,50 @@ class SubjectService:
             except:
                 return []
     
-    async def suggest_subject_for_document(self, document_id: UUID) -> Optional[Dict[str, Any]]:
-        """Use LLM to suggest a subject for an unclassified document"""
+    async def suggest_subject_for_document(self, document_id: UUID,
+                                           priority: LLMPriority = LLMPriority.batch,
+                                           use_local: bool = True) -> Optional[Dict[str, Any]]:
+        """Suggest a subject for an unclassified document
+        
+        A clear nearest-centroid match from the local classifier answers
+        directly; otherwise (or with ``use_local=False``) the LLM is asked.
+        """
         try:
             from services.llm_service import llm_service
             
-            # Get document text
-            extracted_text = self.supabase.table('extracted_text')\
-                .select("raw_text")\
-                .eq('document_id', str(document_id))\
-                .execute()
+            # Get document text (usually already cached by the classification task)
+            text = await document_cache.get_text(document_id)
             
-            if not extracted_text.data:
+            if not text:
                 return None
             
-            text = extracted_text.data[0]['raw_text']
+            # Get available subjects (prompt fragment is prebuilt by the catalogue)
+            catalogue = await subject_catalogue.get()
             
-            # Get available subjects
-            subjects = await self.get_all_subjects()
-            
-            if not subjects:
+            if not catalogue.subjects:
                 return None
             
-            # Format subjects for LLM
-            subjects_info = []
-            for subject in subjects:
-                keywords = ", ".join(subject.get('keywords', []))
-                subjects_info.append(f"- {subject['subject_name']}: {keywords}")
-            
-            subjects_text = "\n".join(subjects_info)
-            
-            # Ask LLM for classification
+            if use_local:
+                prediction = await subject_classifier.classify_document(document_id, text)
+                if prediction and prediction.confident:
+                    return {
+                        "subject_name": prediction.subject['subject_name'],
+                        "subject_id": prediction.subject['id'],
+                        "confidence": round(prediction.confidence, 3),
+                        "reasoning": f"Closest subject by embedding similarity ({prediction.similarity:.2f}, margin {prediction.margin:.2f})",
+                        "keywords_found": []
+                    }
+            
+            # Ask LLM for classification, showing it the most telling passages
+            excerpt = await llm_service.salient_excerpt(text, settings.subject_suggestion_excerpt_tokens)
             prompt = f"""
             Classify this document into one of the available subjects:
             
             Available Subjects:
-            {subjects_text}
+            {catalogue.keywords_prompt}
             
-            Document text (first 1500 chars):
-            {text[:1500]}...
+            Document excerpts:
+            {excerpt}
             
             Return JSON with the best match:
             {{
@@ -337,7 +356,7 @@ class SubjectService:
             If no good match (confidence < 0.3), return {{"subject_name": null, "confidence": 0.0}}
             """
             
-            result = await llm_service._generate_response(prompt)
+            result = await llm_service._generate_response(prompt, priority, task='suggest_subject')
             
             # Parse the JSON response
             import json
@@ -349,10 +368,9 @@ class SubjectService:
                 
                 # Find the subject ID
                 if suggestion.get('subject_name'):
-                    for subject in subjects:
-                        if subject['subject_name'] == suggestion['subject_name']:
-                            suggestion['subject_id'] = subject['id']
-                            break
+                    subject = catalogue.by_name.get(suggestion['subject_name'].strip())
+                    if subject:
+                        suggestion['subject_id'] = subject['id']
                 
                 return suggestion
             
@@ -0,0 +1,112 @@
+# backend/services/task_scheduler.py
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QueueKey = Tuple[str, str]  # (task_type, source)
+
+DEFAULT_SOURCE = 'upload'
+
+def parse_timestamp(value) -> datetime:
+    """Parse a Supabase timestamp (ISO string) into an aware datetime"""
+    if isinstance(value, datetime):
+        timestamp = value
+    else:
+        timestamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+class FairTaskScheduler:
+    """Weighted fair dequeueing across per-(task_type, source) queues.
+
+    Queues are served by stride scheduling: each queue advances a virtual
+    "pass" by 1/weight every time it is picked, and the queue with the lowest
+    pass goes next, so a queue with weight 4 gets four picks for every one of
+    a weight-1 queue no matter how deep either backlog is. Within a queue,
+    tasks are ordered by an aged priority that improves by one level every
+    ``aging_seconds`` spent waiting.
+    """
+
+    def __init__(self, source_weights: Optional[Dict[str, float]] = None,
+                 type_weights: Optional[Dict[str, float]] = None,
+                 aging_seconds: float = 120.0):
+        self.source_weights = source_weights or {}
+        self.type_weights = type_weights or {}
+        self.aging_seconds = aging_seconds
+        self._pass: Dict[QueueKey, float] = {}
+
+    @staticmethod
+    def queue_key(task: dict) -> QueueKey:
+        source = task.get('source') or (task.get('task_data') or {}).get('source') or DEFAULT_SOURCE
+        return str(task['task_type']), source
+
+    def weight(self, key: QueueKey) -> float:
+        task_type, source = key
+        return self.source_weights.get(source, 1.0) * self.type_weights.get(task_type, 1.0)
+
+    def effective_priority(self, task: dict, now: datetime) -> float:
+        """Lower is better; waiting tasks gain one priority level per aging interval"""
+        waited = (now - parse_timestamp(task['created_at'])).total_seconds()
+        return task.get('priority', 1) - max(0.0, waited) / self.aging_seconds
+
+    def select(self, candidates: List[dict], limit: int, now: Optional[datetime] = None) -> List[dict]:
+        """Pick up to ``limit`` tasks from the candidates in fair dequeue order and charge their queues"""
+        selected = self.order(candidates, limit, now)
+        self.commit(selected)
+        return selected
+
+    def order(self, candidates: List[dict], limit: int, now: Optional[datetime] = None) -> List[dict]:
+        """Up to ``limit`` candidates in fair dequeue order, without charging any queue
+
+        Callers that may not get every task (claims lost to other workers,
+        tasks left out of a batch) pass the ones they actually took to
+        ``commit`` so only those advance their queue's pass.
+        """
+        if limit <= 0 or not candidates:
+            return []
+        now = now or datetime.now(timezone.utc)
+
+        queues: Dict[QueueKey, List[dict]] = {}
+        for task in candidates:
+            queues.setdefault(self.queue_key(task), []).append(task)
+        for tasks in queues.values():
+            # Reverse order so the next task is popped from the end in O(1)
+            tasks.sort(
+                key=lambda t: (self.effective_priority(t, now), parse_timestamp(t['created_at'])),
+                reverse=True
+            )
+
+        # Queues that were idle must not bank credit: start them at the current virtual time
+        active_passes = [self._pass[key] for key in queues if key in self._pass]
+        virtual_time = min(active_passes) if active_passes else 0.0
+        for key in queues:
+            self._pass[key] = max(self._pass.get(key, virtual_time), virtual_time)
+
+        # Picks are simulated on a copy; the real passes only move in commit()
+        passes = {key: self._pass[key] for key in queues}
+        ordered = []
+        while len(ordered) < limit and queues:
+            key = min(queues, key=lambda k: (passes[k], -self.weight(k)))
+            ordered.append(queues[key].pop())
+            passes[key] += 1.0 / self.weight(key)
+            if not queues[key]:
+                del queues[key]
+        return ordered
+
+    def commit(self, tasks: List[dict]):
+        """Charge each task's queue for a task that was actually taken"""
+        for task in tasks:
+            key = self.queue_key(task)
+            self._pass[key] = self._pass.get(key, 0.0) + 1.0 / self.weight(key)
+        self._rebase_passes()
+
+    def _rebase_passes(self):
+        # Keep pass values bounded by shifting them all down together
+        if not self._pass:
+            return
+        base = min(self._pass.values())
+        if base > 1e6:
+            self._pass = {key: value - base for key, value in self._pass.items()}
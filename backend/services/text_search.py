@@ -0,0 +1,60 @@
+# backend/services/text_search.py
+import base64
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from services.database import db_service
+
+logger = logging.getLogger(__name__)
+
+def encode_cursor(rank: float, document_id: str) -> str:
+    """Opaque keyset cursor for the row a page ended on"""
+    raw = json.dumps([rank, document_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        rank, document_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(rank), str(document_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid search cursor: {e}")
+
+class TextSearch:
+    """Ranked full-text search over filenames, summaries and extracted text.
+
+    Backed by the weighted tsvector + GIN index from migration 008; the
+    search_documents RPC ranks matches, highlights a snippet for each hit on
+    the page and paginates with a (rank, document_id) keyset cursor.
+    """
+
+    async def search(self, query: str, page_size: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+        params: Dict[str, Any] = {'search_query': query, 'page_size': page_size}
+        if cursor:
+            params['after_rank'], params['after_id'] = decode_cursor(cursor)
+
+        result = db_service.supabase.rpc('search_documents', params).execute()
+        rows = result.data or []
+
+        next_cursor = None
+        if len(rows) == page_size:
+            last = rows[-1]
+            next_cursor = encode_cursor(last['rank'], last['document_id'])
+
+        return {
+            "query": query,
+            "results": [
+                {
+                    "document_id": row['document_id'],
+                    "filename": row['filename'],
+                    "upload_date": row['upload_date'],
+                    "rank": round(row['rank'], 4),
+                    "snippet": row['headline']
+                }
+                for row in rows
+            ],
+            "next_cursor": next_cursor
+        }
+
+# Global full-text search service
+text_search = TextSearch()
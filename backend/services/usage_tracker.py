@@ -0,0 +1,183 @@
+# backend/services/usage_tracker.py
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config.settings import settings
+from services.database import db_service
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class UsageContext:
+    """What the LLM calls made in the current task are spent on"""
+    task_type: str
+    document_ids: Tuple[str, ...] = ()
+
+_usage_context: ContextVar[Optional[UsageContext]] = ContextVar('llm_usage_context', default=None)
+
+# (usage_date, task_type, document_id or "", model)
+UsageKey = Tuple[str, str, str, str]
+
+class UsageTracker:
+    """Gemini token usage as reported by the API, rolled up per day, task type, document and model.
+
+    Calls are attributed through a context variable set around each task with
+    ``attribute``; a call shared by several documents (a batched prompt) is
+    split evenly between them, and counted as a call for the first one only. Rollups are buffered in memory and added to
+    llm_usage_daily at most every ``flush_interval`` seconds, and each flush
+    returns the day's total across all workers, which the daily budget is
+    checked against.
+    """
+
+    def __init__(self, daily_budget: int, defer_ratio: float, flush_interval: float):
+        self.daily_budget = daily_budget
+        self.defer_ratio = defer_ratio
+        self.flush_interval = flush_interval
+
+        self._pending: Dict[UsageKey, List[int]] = {}  # calls, prompt_tokens, output_tokens, estimated_calls
+        self._day = self._today()
+        self._flushed_total = 0  # Today's tokens across all workers, as of the last flush
+        self._pending_total = 0  # Today's tokens recorded here since then
+        self._last_flush = 0.0
+
+        self.calls = 0
+        self.estimated_calls = 0
+        self.flush_failures = 0
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.utcnow().date().isoformat()
+
+    def _roll_day(self):
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self._flushed_total = 0
+            self._pending_total = 0
+
+    @contextmanager
+    def attribute(self, task_type: str, document_ids: Iterable = ()):
+        """Attribute LLM calls made inside the block to a task type and its documents"""
+        token = _usage_context.set(UsageContext(task_type, tuple(str(document_id) for document_id in document_ids)))
+        try:
+            yield
+        finally:
+            _usage_context.reset(token)
+
+    async def record(self, model: str, prompt_tokens: int, output_tokens: int, estimated: bool = False):
+        """Add one completed call; ``estimated`` marks counts that didn't come from usage metadata"""
+        self._roll_day()
+        context = _usage_context.get()
+        task_type = context.task_type if context else 'other'
+        document_ids = (context.document_ids if context else ()) or ('',)
+
+        shares = len(document_ids)
+        for i, document_id in enumerate(document_ids):
+            # The first document takes the remainder so the shares add up to the call
+            prompt_share = prompt_tokens // shares + (prompt_tokens % shares if i == 0 else 0)
+            output_share = output_tokens // shares + (output_tokens % shares if i == 0 else 0)
+            counters = self._pending.setdefault((self._day, task_type, document_id, model), [0, 0, 0, 0])
+            # ...and counts the call itself, so summed rows show one call per request
+            counters[0] += int(i == 0)
+            counters[1] += prompt_share
+            counters[2] += output_share
+            counters[3] += int(estimated and i == 0)
+
+        self.calls += 1
+        self.estimated_calls += int(estimated)
+        self._pending_total += prompt_tokens + output_tokens
+        await self.flush()
+
+    async def flush(self, force: bool = False):
+        """Write buffered rollups (and read back today's total) if the flush interval has passed"""
+        if not force and (not self._pending or time.time() - self._last_flush < self.flush_interval):
+            return
+        pending, self._pending = self._pending, {}
+        flushed_today = sum(
+            counters[1] + counters[2] for key, counters in pending.items() if key[0] == self._day
+        )
+        self._last_flush = time.time()
+        try:
+            result = db_service.supabase.rpc('record_llm_usage', {
+                'usage': [
+                    {
+                        'usage_date': usage_date,
+                        'task_type': task_type,
+                        'document_id': document_id,
+                        'model': model,
+                        'calls': counters[0],
+                        'prompt_tokens': counters[1],
+                        'output_tokens': counters[2],
+                        'estimated_calls': counters[3]
+                    }
+                    for (usage_date, task_type, document_id, model), counters in pending.items()
+                ],
+                'for_date': self._day
+            }).execute()
+            self._flushed_total = int(result.data or 0)
+            self._pending_total = max(0, self._pending_total - flushed_today)
+        except Exception as e:
+            # Keep the counts for the next flush
+            for key, counters in pending.items():
+                merged = self._pending.setdefault(key, [0, 0, 0, 0])
+                for i, value in enumerate(counters):
+                    merged[i] += value
+            self.flush_failures += 1
+            logger.warning(f"⚠️ Could not record LLM usage: {e}")
+
+    async def spent_today(self) -> int:
+        """Tokens used today by all workers (at most ``flush_interval`` seconds stale)"""
+        self._roll_day()
+        if time.time() - self._last_flush >= self.flush_interval:
+            await self.flush(force=True)
+        return self._flushed_total + self._pending_total
+
+    async def over_budget(self) -> bool:
+        """True once today's spend is within the deferral margin of the daily budget"""
+        if self.daily_budget <= 0:
+            return False
+        return await self.spent_today() >= self.daily_budget * self.defer_ratio
+
+    async def daily_usage(self, days: int = 7) -> List[dict]:
+        """Token totals per day and task type over the last ``days`` days, newest first"""
+        await self.flush(force=True)
+        since = (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+        result = db_service.supabase.table('llm_usage_daily')\
+            .select("usage_date, task_type, calls, prompt_tokens, output_tokens, estimated_calls")\
+            .gte('usage_date', since)\
+            .execute()
+        totals: Dict[Tuple[str, str], dict] = {}
+        for row in result.data or []:
+            total = totals.setdefault((row['usage_date'], row['task_type']), {
+                'usage_date': row['usage_date'], 'task_type': row['task_type'],
+                'calls': 0, 'prompt_tokens': 0, 'output_tokens': 0, 'estimated_calls': 0
+            })
+            for field in ('calls', 'prompt_tokens', 'output_tokens', 'estimated_calls'):
+                total[field] += row[field] or 0
+        return sorted(totals.values(), key=lambda total: (total['usage_date'], total['task_type']), reverse=True)
+
+    def snapshot(self) -> dict:
+        spent = self._flushed_total + self._pending_total
+        return {
+            "day": self._day,
+            "tokens_today": spent,
+            "daily_budget": self.daily_budget or None,
+            "budget_used": round(spent / self.daily_budget, 4) if self.daily_budget > 0 else None,
+            "defer_at": round(self.daily_budget * self.defer_ratio) if self.daily_budget > 0 else None,
+            "calls": self.calls,
+            "estimated_calls": self.estimated_calls,
+            "pending_rollups": len(self._pending),
+            "flush_failures": self.flush_failures
+        }
+
+# Global usage tracker
+usage_tracker = UsageTracker(
+    daily_budget=settings.llm_daily_token_budget,
+    defer_ratio=settings.llm_budget_defer_ratio,
+    flush_interval=settings.llm_usage_flush_interval
+)
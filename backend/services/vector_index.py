@@ -0,0 +1,329 @@
+# backend/services/vector_index.py
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (document_id, start, end) of the passage stored in a row
+PassageKey = Tuple[str, int, int]
+
+class VectorIndex:
+    """Unit vectors in a float32 memory-mapped matrix plus a row -> passage id map.
+
+    Rows are append-only: re-adding a document tombstones its old rows and
+    appends new ones, and deletes only tombstone. Tombstones are compacted
+    away once they make up a quarter of the matrix.
+
+    Queries are a vectorized dot product over every live row until the index
+    holds ``ivf_threshold`` rows; above that an IVF index (spherical k-means
+    over a sample, ``nprobe`` lists scanned per query) is trained lazily and
+    kept up to date incrementally, retraining once the corpus has doubled.
+    IVF state lives in memory only and is rebuilt after a restart.
+
+    Several processes may write (workers index, the API deletes): each write
+    takes an exclusive ``flock`` on the directory's lock file and reloads
+    whatever another process wrote before changing anything. Readers pick up
+    changes through ``refresh()``, which reloads when the id map changes.
+    """
+
+    GROWTH = 2
+    MIN_CAPACITY = 1024
+    COMPACT_RATIO = 0.25
+    TRAIN_SAMPLE = 20000
+    KMEANS_ITERATIONS = 10
+
+    def __init__(self, directory: str, dimension: int, model_id: str,
+                 ivf_threshold: int = 50000, nprobe: int = 8):
+        self.directory = directory
+        self.dimension = dimension
+        self.model_id = model_id
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._matrix_path = os.path.join(directory, "vectors.f32")
+        self._ids_path = os.path.join(directory, "ids.json")
+        self._lock_path = os.path.join(directory, "index.lock")
+        self._lock = threading.RLock()
+
+        self._matrix: Optional[np.memmap] = None
+        self._count = 0
+        self._keys: List[Optional[PassageKey]] = []
+        self._rows_by_document: Dict[str, List[int]] = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids_mtime: Optional[int] = None
+
+        self._centroids: Optional[np.ndarray] = None
+        self._lists = np.zeros(0, dtype=np.int32)  # IVF list of each row
+        self._trained_rows = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # ---- storage ----
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    def _open_matrix(self, capacity: int):
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        size = capacity * self.dimension * 4
+        with open(self._matrix_path, 'ab') as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode='r+', shape=(capacity, self.dimension))
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self._alive)] = self._alive[:capacity]
+        self._alive = alive
+
+    def _reset(self):
+        for path in (self._matrix_path, self._ids_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._matrix = None
+        self._count = 0
+        self._keys = []
+        self._rows_by_document = {}
+        self._alive = np.zeros(0, dtype=bool)
+        self._drop_ivf()
+        self._open_matrix(self.MIN_CAPACITY)
+
+    def _load(self):
+        with self._lock:
+            try:
+                with open(self._ids_path) as f:
+                    meta = json.load(f)
+                self._ids_mtime = os.stat(self._ids_path).st_mtime_ns
+            except FileNotFoundError:
+                meta = None
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Search index id map unreadable ({e}) - starting empty")
+                meta = None
+
+            if meta is None or meta.get('model_id') != self.model_id or meta.get('dimension') != self.dimension:
+                if meta is not None:
+                    logger.info(f"🔄 Search index was built with {meta.get('model_id')} - rebuilding for {self.model_id}")
+                self._reset()
+                return
+
+            self._keys = [tuple(key) if key else None for key in meta['keys']]
+            self._count = len(self._keys)
+            self._matrix = None
+            self._alive = np.array([key is not None for key in self._keys], dtype=bool)
+            self._open_matrix(max(self.MIN_CAPACITY, self._count))
+            self._rows_by_document = {}
+            for row, key in enumerate(self._keys):
+                if key is not None:
+                    self._rows_by_document.setdefault(key[0], []).append(row)
+            self._drop_ivf()
+
+    def _save(self):
+        self._matrix.flush()
+        tmp_path = self._ids_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'model_id': self.model_id, 'dimension': self.dimension,
+                       'keys': [list(key) if key else None for key in self._keys]}, f)
+        os.replace(tmp_path, self._ids_path)
+        self._ids_mtime = os.stat(self._ids_path).st_mtime_ns
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive across threads and processes, starting from the latest saved state"""
+        with self._lock, open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Reload if another process rewrote the index"""
+        try:
+            mtime = os.stat(self._ids_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._ids_mtime:
+            self._load()
+
+    # ---- updates ----
+
+    def _tombstone(self, document_id: str) -> int:
+        rows = self._rows_by_document.pop(document_id, [])
+        for row in rows:
+            self._keys[row] = None
+            self._alive[row] = False
+        return len(rows)
+
+    def add(self, document_id: str, vectors: np.ndarray, spans: Sequence[Tuple[int, int]]):
+        """Store a document's passage vectors, replacing any it already had"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimension or len(vectors) != len(spans):
+            raise ValueError(f"Expected {len(spans)} vectors of dimension {self.dimension}, got {vectors.shape}")
+
+        with self._writing():
+            self._tombstone(document_id)
+            needed = self._count + len(vectors)
+            if needed > self.capacity:
+                self._open_matrix(max(needed, self.capacity * self.GROWTH))
+
+            rows = list(range(self._count, needed))
+            self._matrix[self._count:needed] = vectors
+            self._alive[self._count:needed] = True
+            self._keys.extend((document_id, int(start), int(end)) for start, end in spans)
+            self._rows_by_document[document_id] = rows
+            self._count = needed
+
+            if self._centroids is not None:
+                self._lists = np.concatenate([self._lists, self._nearest_lists(vectors)])
+
+            self._maybe_compact()
+            self._save()
+
+    def delete(self, document_id: str) -> bool:
+        with self._writing():
+            if not self._tombstone(document_id):
+                return False
+            self._maybe_compact()
+            self._save()
+            return True
+
+    def _maybe_compact(self):
+        dead = self._count - int(self._alive[:self._count].sum())
+        if dead < max(self.MIN_CAPACITY, self._count * self.COMPACT_RATIO):
+            return
+
+        keep = np.flatnonzero(self._alive[:self._count])
+        vectors = np.array(self._matrix[keep])
+        lists = self._lists[keep] if self._centroids is not None else None
+
+        self._keys = [self._keys[row] for row in keep]
+        self._count = len(keep)
+        self._rows_by_document = {}
+        for row, key in enumerate(self._keys):
+            self._rows_by_document.setdefault(key[0], []).append(row)
+
+        self._matrix[:self._count] = vectors
+        self._alive[:] = False
+        self._alive[:self._count] = True
+        if lists is not None:
+            self._lists = lists
+        logger.info(f"🧹 Compacted search index to {self._count} passages")
+
+    # ---- IVF ----
+
+    def _drop_ivf(self):
+        self._centroids = None
+        self._lists = np.zeros(0, dtype=np.int32)
+        self._trained_rows = 0
+
+    def _nearest_lists(self, vectors: np.ndarray, block: int = 8192) -> np.ndarray:
+        lists = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), block):
+            lists[start:start + block] = np.argmax(vectors[start:start + block] @ self._centroids.T, axis=1)
+        return lists
+
+    def _train(self):
+        live = np.flatnonzero(self._alive[:self._count])
+        rng = np.random.default_rng(0)
+        sample = np.array(self._matrix[np.sort(rng.choice(live, min(len(live), self.TRAIN_SAMPLE), replace=False))])
+        nlist = min(int(np.clip(np.sqrt(len(live)), 16, 4096)), len(sample))
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(self.KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = ~np.any(sums, axis=1)
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+        self._centroids = centroids.astype(np.float32)
+        self._lists = self._nearest_lists(self._matrix[:self._count])
+        self._trained_rows = len(live)
+        logger.info(f"🗂️ Trained IVF search index: {nlist} lists over {len(live)} passages")
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Rows in the IVF lists nearest the query, or None to scan everything"""
+        live = int(self._alive[:self._count].sum())
+        if live < self.ivf_threshold:
+            if self._centroids is not None:
+                self._drop_ivf()
+            return None
+
+        if self._centroids is None or live >= self._trained_rows * self.GROWTH:
+            self._train()
+        probe = np.argsort(self._centroids @ query)[::-1][:self.nprobe]
+        return np.flatnonzero(np.isin(self._lists, probe) & self._alive[:self._count])
+
+    # ---- queries ----
+
+    def search(self, query: np.ndarray, k: int = 10) -> List[Tuple[str, int, int, float]]:
+        """Top ``k`` documents as (document_id, start, end, score) of each one's best passage"""
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            if self._count == 0:
+                return []
+            rows = self._candidate_rows(query)
+            if rows is None:
+                # One contiguous matrix-vector product beats gathering the live rows first
+                scores = self._matrix[:self._count] @ query
+                scores[~self._alive[:self._count]] = -np.inf
+                rows = np.arange(self._count)
+            else:
+                scores = self._matrix[rows] @ query
+            if len(rows) == 0:
+                return []
+
+            # Several passages can come from one document (a long upload has hundreds), so
+            # over-fetch and widen until k distinct documents turn up or every row is ranked
+            take = min(len(rows), k * 4)
+            while True:
+                top = np.argpartition(-scores, take - 1)[:take]
+                top = top[np.argsort(-scores[top])]
+
+                results = []
+                seen = set()
+                exhausted = take == len(rows)
+                for i in top:
+                    if self._keys[rows[i]] is None:
+                        exhausted = True  # Only tombstones (scored -inf) are left
+                        break
+                    document_id, start, end = self._keys[rows[i]]
+                    if document_id in seen:
+                        continue
+                    seen.add(document_id)
+                    results.append((document_id, start, end, float(scores[i])))
+                    if len(results) == k:
+                        break
+                if len(results) == k or exhausted:
+                    return results
+                take = min(len(rows), take * 4)
+
+    def document_vectors(self, document_id: str) -> np.ndarray:
+        with self._lock:
+            rows = self._rows_by_document.get(document_id, [])
+            return np.array(self._matrix[rows]) if rows else np.zeros((0, self.dimension), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return int(self._alive[:self._count].sum())
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "model_id": self.model_id,
+                "documents": len(self._rows_by_document),
+                "passages": len(self),
+                "rows": self._count,
+                "capacity": self.capacity,
+                "mode": "ivf" if self._centroids is not None else "brute_force",
+                "ivf_lists": 0 if self._centroids is None else len(self._centroids)
+            }
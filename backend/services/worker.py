@@ -0,0 +1,98 @@
+# backend/services/worker.py
+# Standalone LLM worker, scaled independently of the API:
+#   python -m services.worker [--max-concurrency N] [--health-port PORT]
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import time
+
+from config.settings import settings
+from services.background_processor import background_processor
+from services.concurrency_controller import concurrency_controller
+from services.llm_service import llm_service
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class Worker:
+    """Runs the BackgroundProcessor outside the API with a health probe and graceful shutdown"""
+
+    def __init__(self, health_port: int):
+        self.health_port = health_port
+        self.started_at = time.time()
+        self._shutdown = asyncio.Event()
+
+    def request_shutdown(self):
+        if not self._shutdown.is_set():
+            logger.info("🛑 Shutdown requested, draining worker...")
+            self._shutdown.set()
+
+    def health(self) -> dict:
+        return {
+            "status": "running" if background_processor.is_running else "stopped",
+            "worker_id": background_processor.worker_id,
+            "in_flight": len(background_processor.processing_tasks),
+            "concurrency_limit": concurrency_controller.limit,
+            "uptime": round(time.time() - self.started_at, 1)
+        }
+
+    async def _handle_health(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Minimal HTTP responder: 200 while processing, 503 otherwise, on any path"""
+        try:
+            await asyncio.wait_for(reader.readline(), timeout=5)
+            body = json.dumps(self.health()).encode()
+            status = "200 OK" if background_processor.is_running else "503 Service Unavailable"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"Health probe request failed: {e}")
+        finally:
+            writer.close()
+
+    async def run(self) -> int:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.request_shutdown)
+
+        server = await asyncio.start_server(self._handle_health, host="0.0.0.0", port=self.health_port)
+        logger.info(f"🩺 Worker health probe listening on :{self.health_port}")
+
+        processor = asyncio.create_task(background_processor.start())
+        shutdown = asyncio.create_task(self._shutdown.wait())
+        await asyncio.wait([processor, shutdown], return_when=asyncio.FIRST_COMPLETED)
+
+        exit_code = 0
+        if processor.done() and not self._shutdown.is_set():
+            # start() returns early when Gemini is unreachable - let the orchestrator restart us
+            logger.error("❌ Background processor exited unexpectedly")
+            exit_code = 1
+
+        await background_processor.stop()
+        shutdown.cancel()
+        await asyncio.gather(processor, return_exceptions=True)
+        await llm_service.transport.aclose()
+
+        server.close()
+        await server.wait_closed()
+        logger.info("👋 Worker stopped")
+        return exit_code
+
+def main():
+    parser = argparse.ArgumentParser(description="ClutterFlow background LLM worker")
+    parser.add_argument("--max-concurrency", type=int, default=settings.worker_max_concurrent_tasks,
+                        help="Upper bound for the adaptive LLM task concurrency")
+    parser.add_argument("--health-port", type=int, default=settings.worker_health_port)
+    args = parser.parse_args()
+
+    if args.max_concurrency:
+        concurrency_controller.set_bounds(max_limit=args.max_concurrency)
+
+    raise SystemExit(asyncio.run(Worker(args.health_port).run()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# backend/test_chunker.py
+# Checks the streaming chunker: offsets, punctuation, token limits and overlap
+
+import sys
+import os
+import random
+import time
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.chunker import TokenCounter, chunk_text, iter_sentence_spans
+
+SAMPLE = (
+    "Photosynthesis converts light into chemical energy. Does it need water? Yes! "
+    "Chlorophyll absorbs mostly \"red and blue\" light.\n\n"
+    "The Calvin cycle fixes carbon dioxide into sugars. "
+) * 50
+
+def test_sentences_keep_punctuation():
+    sentences = [SAMPLE[start:end] for start, end in iter_sentence_spans(SAMPLE)]
+    assert sentences[:4] == [
+        "Photosynthesis converts light into chemical energy.",
+        "Does it need water?",
+        "Yes!",
+        "Chlorophyll absorbs mostly \"red and blue\" light.",
+    ]
+
+def test_chunks_respect_limits_and_offsets():
+    counter = TokenCounter(ratio=1.0)
+    chunks = chunk_text(SAMPLE, max_tokens=60, overlap_tokens=15, counter=counter)
+    assert len(chunks) > 1
+
+    for i, chunk in enumerate(chunks):
+        assert chunk.index == i
+        assert SAMPLE[chunk.start:chunk.end] == chunk.text
+        assert chunk.token_count <= 60
+        assert chunk.text[-1] in ".?!\""
+
+    # Consecutive chunks overlap but always make progress
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.start < previous.end
+        assert current.end > previous.end
+    assert chunks[-1].end == len(SAMPLE.rstrip())
+
+def test_oversized_sentence_is_split():
+    text = " ".join(["token"] * 500) + "."
+    chunks = chunk_text(text, max_tokens=100, counter=TokenCounter(ratio=1.0))
+    assert all(chunk.token_count <= 100 for chunk in chunks)
+    assert chunks[0].start == 0 and chunks[-1].end == len(text)
+
+def test_early_edit_keeps_later_chunk_hashes():
+    rng = random.Random(0)
+    words = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu".split()
+    # Equal-length sentences: fixed-size packing would shift every later boundary by one sentence
+    sentences = [" ".join(rng.choice(words) for _ in range(12)).capitalize() + "." for _ in range(1000)]
+    counter = TokenCounter(ratio=1.0)
+    before = chunk_text(" ".join(sentences), max_tokens=400, overlap_tokens=40, counter=counter)
+    edited = sentences[:3] + ["Alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu."] + sentences[3:]
+    after = chunk_text(" ".join(edited), max_tokens=400, overlap_tokens=40, counter=counter)
+
+    # Boundaries follow content, so only the chunks around the edit change
+    kept = {chunk.chunk_hash for chunk in before} & {chunk.chunk_hash for chunk in after}
+    assert len(before) > 20
+    assert len(kept) >= len(before) - 2
+
+if __name__ == "__main__":
+    print("🔍 Testing streaming chunker...")
+    test_sentences_keep_punctuation()
+    test_chunks_respect_limits_and_offsets()
+    test_oversized_sentence_is_split()
+    test_early_edit_keeps_later_chunk_hashes()
+
+    text = SAMPLE * 100
+    start = time.time()
+    chunks = chunk_text(text, max_tokens=7500, overlap_tokens=200)
+    print(f"✅ {len(text):,} characters -> {len(chunks)} chunks in {time.time() - start:.2f}s")
+    print("🎉 Chunker tests passed.")
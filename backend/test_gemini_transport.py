@@ -0,0 +1,156 @@
+# backend/test_gemini_transport.py
+# Runs the async Gemini transport against a local stub server (no API key needed)
+
+import sys
+import os
+import asyncio
+import json
+import time
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.gemini_transport import GeminiAPIError, GeminiTimeoutError, GeminiTransport
+
+class StubGemini:
+    """Tiny HTTP/1.1 server answering generateContent/countTokens with canned payloads"""
+
+    def __init__(self):
+        self.requests = []
+        self.connections = 0
+        self.server = None
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle, host="127.0.0.1", port=0)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = json.loads(await reader.readexactly(int(headers.get("content-length", 0))) or b"{}")
+                path = request_line.decode().split()[1]
+                self.requests.append((path, headers, body))
+
+                if ":streamGenerateContent" in path:
+                    content_type, data = "text/event-stream", self._stream_events(body)
+                    status = "200 OK"
+                else:
+                    status, payload = await self._respond(path, body)
+                    content_type, data = "application/json", json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def _stream_events(self, body: dict) -> bytes:
+        words = body["contents"][0]["parts"][0]["text"].split()
+        events = []
+        for i, word in enumerate(words):
+            chunk = {"candidates": [{"content": {"parts": [{"text": word + " "}]}}]}
+            if i == len(words) - 1:
+                chunk["candidates"][0]["finishReason"] = "STOP"
+                chunk["usageMetadata"] = {"promptTokenCount": len(words), "candidatesTokenCount": len(words),
+                                          "totalTokenCount": 2 * len(words)}
+            events.append(f"data: {json.dumps(chunk)}\r\n\r\n")
+        return "".join(events).encode()
+
+    async def _respond(self, path: str, body: dict):
+        prompt = body["contents"][0]["parts"][0]["text"]
+        if path.endswith(":countTokens"):
+            return "200 OK", {"totalTokens": len(prompt.split())}
+        if prompt == "slow":
+            await asyncio.sleep(5)
+        if prompt == "quota":
+            return "429 Too Many Requests", {"error": {"code": 429, "message": "Resource has been exhausted"}}
+        return "200 OK", {
+            "candidates": [{"content": {"parts": [{"text": f"echo: {prompt}"}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": 3, "candidatesTokenCount": 4, "totalTokenCount": 7}
+        }
+
+async def run_checks():
+    stub = StubGemini()
+    base_url = await stub.start()
+    transport = GeminiTransport(api_key="test-key", base_url=base_url, timeout=0.5)
+    try:
+        response = await transport.generate("gemini-1.5-flash", "hello", {"max_output_tokens": 64})
+        assert response.text == "echo: hello"
+        assert (response.prompt_tokens, response.output_tokens, response.total_tokens) == (3, 4, 7)
+        assert response.finish_reason == "STOP"
+
+        path, headers, body = stub.requests[0]
+        assert path == "/v1beta/models/gemini-1.5-flash:generateContent"
+        assert headers["x-goog-api-key"] == "test-key"
+        assert body["generationConfig"] == {"maxOutputTokens": 64}
+
+        assert await transport.count_tokens("gemini-1.5-flash", "one two three") == 3
+
+        # Sequential calls reuse one pooled keep-alive connection
+        for _ in range(5):
+            await transport.generate("gemini-1.5-flash", "again")
+        assert stub.connections == 1
+
+        # Streaming yields each SSE chunk; usage metadata arrives with the last one
+        chunks = [chunk async for chunk in transport.stream_generate("gemini-1.5-flash", "one two three")]
+        assert "".join(chunk.text for chunk in chunks) == "one two three "
+        assert chunks[-1].finish_reason == "STOP" and chunks[-1].total_tokens == 6
+        assert stub.requests[-1][0] == "/v1beta/models/gemini-1.5-flash:streamGenerateContent?alt=sse"
+
+        # A consumer slower than the deadline doesn't trip it between chunks
+        pieces = []
+        async for chunk in transport.stream_generate("gemini-1.5-flash", "slow reader here"):
+            pieces.append(chunk.text)
+            await asyncio.sleep(0.7)
+        assert "".join(pieces) == "slow reader here "
+
+        # The deadline cancels a hung call instead of waiting for the server
+        start = time.monotonic()
+        try:
+            await transport.generate("gemini-1.5-flash", "slow")
+            raise AssertionError("expected a timeout")
+        except GeminiTimeoutError:
+            assert time.monotonic() - start < 2
+
+        try:
+            await transport.generate("gemini-1.5-flash", "quota")
+            raise AssertionError("expected a 429")
+        except GeminiAPIError as e:
+            assert e.rate_limited
+
+        # Cancelling the caller aborts the in-flight request
+        call = asyncio.create_task(transport.generate("gemini-1.5-flash", "slow", timeout=10))
+        await asyncio.sleep(0.1)
+        call.cancel()
+        try:
+            await call
+            raise AssertionError("expected cancellation")
+        except asyncio.CancelledError:
+            pass
+    finally:
+        await transport.aclose()
+        await stub.stop()
+
+def test_gemini_transport_against_stub():
+    asyncio.run(run_checks())
+
+if __name__ == "__main__":
+    print("🔍 Testing Gemini transport against a local stub server...")
+    test_gemini_transport_against_stub()
+    print("🎉 Transport handles responses, streaming, usage metadata, deadlines and cancellation.")
@@ -0,0 +1,78 @@
+# backend/test_keywords.py
+# Checks local keyphrase extraction and incremental corpus document frequencies
+
+import sys
+import os
+import tempfile
+import time
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.keywords import CorpusStats, KeywordExtractor
+
+BIOLOGY = (
+    "Photosynthesis converts light energy into chemical energy. The Calvin cycle fixes carbon dioxide "
+    "into sugars. Chlorophyll absorbs red and blue light. The Calvin cycle runs in the stroma, while "
+    "the light reactions happen in the thylakoid membrane of the chloroplast."
+)
+FINANCE = (
+    "Bank statement for March. Opening balance carried forward. Card payment to the grocery store. "
+    "Salary received from employer. Standing order for rent. Closing balance. The bank charges a "
+    "monthly account fee."
+)
+PHYSICS = (
+    "Kinetic energy depends on mass and velocity. Momentum is conserved in collisions, and energy is "
+    "conserved in elastic collisions. Force equals mass times acceleration."
+)
+
+def test_candidates_split_on_stopwords_and_punctuation():
+    phrases = KeywordExtractor().candidates("The Calvin cycle fixes carbon. It runs in the stroma!")
+    assert ("calvin", "cycle") in phrases
+    assert ("carbon",) in phrases
+    assert ("stroma",) in phrases
+    assert not any("the" in phrase or "in" in phrase for phrase in phrases)
+    assert ("carbon", "runs") not in phrases  # Never across a sentence boundary
+
+def test_keywords_reflect_each_document():
+    extractor = KeywordExtractor()
+    stats = CorpusStats()
+    texts = [BIOLOGY, FINANCE, PHYSICS]
+    for i, text in enumerate(texts):
+        stats.add(f"doc-{i}", extractor.terms(text))
+
+    biology, finance, physics = extractor.extract_batch(texts, stats.document_frequencies, stats.document_count, 5)
+    assert "calvin cycle" in biology
+    assert "bank" in finance and "balance" in finance
+    assert "conserved" in physics or "collisions" in physics
+    # Words shared across documents rank below distinctive ones
+    assert "energy" not in biology[:1]
+
+def test_corpus_stats_count_each_document_once_and_persist():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "keywords.sqlite3")
+        stats = CorpusStats(path)
+        assert stats.add("doc-1", {"energy", "light"})
+        assert not stats.add("doc-1", {"energy", "light"})
+        assert stats.add("doc-2", {"energy"})
+
+        reloaded = CorpusStats(path)
+        reloaded.refresh()
+        assert reloaded.document_count == 2
+        assert list(reloaded.document_frequencies(["energy", "light", "unseen"])) == [2, 1, 0]
+
+if __name__ == "__main__":
+    print("🔍 Testing keyword extraction...")
+    test_candidates_split_on_stopwords_and_punctuation()
+    test_keywords_reflect_each_document()
+    test_corpus_stats_count_each_document_once_and_persist()
+
+    extractor = KeywordExtractor()
+    stats = CorpusStats()
+    texts = [BIOLOGY * 40, FINANCE * 40, PHYSICS * 40] * 16
+    start = time.time()
+    for i, text in enumerate(texts):
+        stats.add(f"doc-{i}", extractor.terms(text))
+    extractor.extract_batch(texts, stats.document_frequencies, stats.document_count)
+    print(f"✅ {len(texts)} documents keyworded in {(time.time() - start) * 1000:.0f}ms")
+    print("🎉 Keyword tests passed.")
@@ -0,0 +1,100 @@
+# backend/test_model_router.py
+# Checks model routing, escalation thresholds and fallback between a route's models (no API key needed)
+
+import sys
+import os
+import asyncio
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.gemini_transport import GeminiAPIError, GeminiResponse
+from services.llm_service import LLMService
+from services.model_router import ModelRoute, ModelRouter
+
+PARAMS = {'temperature': 0.2, 'top_p': 0.9, 'max_output_tokens': 256}
+
+class StubTransport:
+    """Stands in for GeminiTransport: fails for the given models, answers for the rest"""
+
+    def __init__(self, failures: dict):
+        self.failures = failures  # model -> GeminiAPIError to raise
+        self.calls = []
+
+    async def generate(self, model, prompt, generation_config=None, timeout=None):
+        self.calls.append(model)
+        if model in self.failures:
+            raise self.failures[model]
+        return GeminiResponse(text=f"answer from {model}", finish_reason="STOP",
+                              prompt_tokens=12, output_tokens=4, total_tokens=16)
+
+def build_router() -> ModelRouter:
+    return ModelRouter(
+        routes={
+            'light': ModelRoute('light', ('flash-lite', 'flash'), PARAMS, 5.0),
+            'standard': ModelRoute('standard', ('flash', 'flash-lite'), PARAMS, 5.0),
+            'strong': ModelRoute('strong', ('pro', 'flash'), PARAMS, 10.0),
+        },
+        light_max_tokens=2000,
+        escalation_confidence=0.6,
+        prices={'pro': [1.25, 10.0]}
+    )
+
+def test_choose_routes_by_task_size_and_quality():
+    router = build_router()
+    assert router.choose('classify', 500).name == 'light'
+    assert router.choose('classify', 5000).name == 'standard'  # Too long for the light model
+    assert router.choose('enrich', 100).name == 'standard'  # Not a light task
+    assert router.choose('enrich', 100, quality='low').name == 'light'
+    assert router.choose('classify', 100, quality='high').name == 'strong'
+    assert abs(router.cost('pro', 1_000_000, 100_000) - 2.25) < 1e-9
+    assert router.cost('unpriced', 1_000_000, 1_000_000) == 0.0
+
+def test_should_escalate_below_threshold_unless_already_strong():
+    router = build_router()
+    assert router.should_escalate('light', 0.4)
+    assert router.should_escalate('standard', 0.59)
+    assert not router.should_escalate('standard', 0.6)
+    assert not router.should_escalate('strong', 0.1)  # Nothing stronger to ask
+
+async def run_fallback_checks():
+    route = build_router().routes['light']
+
+    # A server error on the preferred model falls back to the next one
+    service = LLMService()
+    service.transport = StubTransport({'flash-lite': GeminiAPIError("unavailable", 503)})
+    response, model, latency = await service._generate_routed(route, "classify this")
+    assert model == 'flash' and response.text == "answer from flash"
+    assert service.transport.calls == ['flash-lite', 'flash']
+    assert latency >= 0
+
+    # A bad request would fail on any model, so it is raised without trying the fallback
+    service.transport = StubTransport({'flash-lite': GeminiAPIError("bad request", 400)})
+    try:
+        await service._generate_routed(route, "classify this")
+        assert False, "expected GeminiAPIError"
+    except GeminiAPIError as e:
+        assert e.status_code == 400
+    assert service.transport.calls == ['flash-lite']
+
+    # When every model fails the last error is raised
+    service.transport = StubTransport({
+        'flash-lite': GeminiAPIError("unavailable", 503),
+        'flash': GeminiAPIError("quota", 429)
+    })
+    try:
+        await service._generate_routed(route, "classify this")
+        assert False, "expected GeminiAPIError"
+    except GeminiAPIError as e:
+        assert e.rate_limited
+    assert service.transport.calls == ['flash-lite', 'flash']
+
+def test_generate_routed_falls_back_on_retryable_errors():
+    asyncio.run(run_fallback_checks())
+
+if __name__ == "__main__":
+    print("🔍 Testing model routing, escalation and fallback...")
+    test_choose_routes_by_task_size_and_quality()
+    test_should_escalate_below_threshold_unless_already_strong()
+    test_generate_routed_falls_back_on_retryable_errors()
+    print("🎉 Model router picks, escalates and falls back as configured.")
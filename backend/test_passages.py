@@ -0,0 +1,56 @@
+# backend/test_passages.py
+# Checks that prompt excerpts keep to their token budget and favour informative passages
+
+import sys
+import os
+import time
+
+# Add the backend directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.chunker import TokenCounter
+from services.passages import PassageSelector
+
+COVER = "University of Somewhere. Department of Biology. Course Handbook 2024. Prepared by the teaching office. "
+CONTENTS = "".join(f"Chapter {i} .......... page {i * 7}\n" for i in range(1, 40))
+BODY = (
+    "Photosynthesis converts light energy into chemical energy in the chloroplast. The Calvin cycle fixes "
+    "carbon dioxide into sugars using ATP and NADPH from the light reactions. Chlorophyll absorbs red and "
+    "blue light, and the thylakoid membrane hosts both photosystems. "
+)
+ADMIN = (
+    "Students must submit coursework through the online portal before the deadline. Late submissions "
+    "receive a penalty unless an extension has been approved by the office. "
+)
+
+def test_short_text_is_returned_whole():
+    assert PassageSelector().select(BODY, 500) == BODY
+
+def test_excerpt_fits_budget_and_skips_contents():
+    counter = TokenCounter()
+    text = COVER + CONTENTS + ADMIN * 10 + BODY * 3 + ADMIN * 10
+    excerpt = PassageSelector(passage_tokens=48).select(text, 200, counter=counter)
+    assert counter.count(excerpt) <= 200
+    assert "Calvin cycle" in excerpt
+    assert "Chapter 20 " not in excerpt
+    assert excerpt.count("Calvin cycle") == 1  # Repeats don't spend the budget twice
+
+def test_subject_vocabulary_steers_the_excerpt():
+    selector = PassageSelector(passage_tokens=48)
+    text = ADMIN * 20 + BODY + ADMIN * 20
+    vocabulary = selector.vocabulary(["Biology: photosynthesis, cells, chlorophyll"])
+    assert "chlorophyll" in vocabulary
+    assert "Chlorophyll absorbs" in selector.select(text, 120, vocabulary)
+
+if __name__ == "__main__":
+    print("🔍 Testing prompt excerpts...")
+    test_short_text_is_returned_whole()
+    test_excerpt_fits_budget_and_skips_contents()
+    test_subject_vocabulary_steers_the_excerpt()
+
+    selector = PassageSelector()
+    text = (COVER + CONTENTS + (ADMIN + BODY) * 200) * 5
+    start = time.time()
+    excerpt = selector.select(text, 750)
+    print(f"✅ {len(text):,} characters -> {len(excerpt):,} character excerpt in {(time.time() - start) * 1000:.0f}ms")
+    print("🎉 Excerpt tests passed.")
@@ -1,6 +1,7 @@
 // src/components/DocumentLibrary.jsx
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
+import useSummaryStream from './useSummaryStream';
 
 const DocumentLibrary = () => {
   const navigate = useNavigate();
@@ -12,6 +13,7 @@ const DocumentLibrary = () => {
   const [showSummary, setShowSummary] = useState(false);
   const [showMoveModal, setShowMoveModal] = useState(false);
   const [documentToMove, setDocumentToMove] = useState(null);
+  const summaryStream = useSummaryStream(selectedDocument?.id);
 
   useEffect(() => {
     fetchAllData();
@@ -99,20 +101,33 @@ const DocumentLibrary = () => {
   };
 
   const handleSummary = async (document) => {
+    summaryStream.stop();
     try {
       const response = await fetch(`http://localhost:8000/documents/${document.id}/summary`);
       if (response.ok) {
         const summaryData = await response.json();
-        setSelectedDocument({
-          ...document,
-          summary: summaryData.summary_text
-        });
-        setShowSummary(true);
+        if (summaryData.summary_text) {
+          setSelectedDocument({
+            ...document,
+            summary: summaryData.summary_text
+          });
+          setShowSummary(true);
+          return;
+        }
       }
     } catch (error) {
       console.error('Failed to fetch summary:', error);
-      alert('Summary not available yet');
     }
+
+    // No stored summary yet: stream one so the first words show up right away
+    setSelectedDocument({ ...document, summary: null });
+    setShowSummary(true);
+    summaryStream.start('brief', document.id);
+  };
+
+  const closeSummary = () => {
+    summaryStream.stop();
+    setShowSummary(false);
   };
 
   const handleDelete = async (document) => {
@@ -409,10 +424,15 @@ const DocumentLibrary = () => {
               lineHeight: '1.6',
               color: '#374151'
             }}>
-              {selectedDocument.summary || 'Summary not available'}
+              {selectedDocument.summary
+                || summaryStream.summary?.summary_text
+                || summaryStream.text
+                || (summaryStream.isStreaming && '🔄 Generating summary...')
+                || (summaryStream.error && `❌ ${summaryStream.error}`)
+                || 'Summary not available'}
             </div>
             <button
-              onClick={() => setShowSummary(false)}
+              onClick={closeSummary}
               className="btn-primary"
               style={{ width: '100%' }}
             >
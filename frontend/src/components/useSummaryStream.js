@@ -0,0 +1,70 @@
+// Custom hook: useSummaryStream.js
+// Streams a summary from /documents/{id}/summarize/stream (Server-Sent Events)
+import { useState, useRef, useEffect, useCallback } from 'react';
+
+const useSummaryStream = (documentId) => {
+  const [text, setText] = useState('');
+  const [summary, setSummary] = useState(null);
+  const [status, setStatus] = useState('idle');
+  const [error, setError] = useState(null);
+  const sourceRef = useRef(null);
+
+  const stop = useCallback(() => {
+    if (sourceRef.current) {
+      sourceRef.current.close();
+      sourceRef.current = null;
+    }
+  }, []);
+
+  // targetId lets a caller stream for a document it has only just selected
+  const start = useCallback((summaryType = 'brief', targetId = documentId) => {
+    if (!targetId) return;
+    stop();
+
+    console.log('🚀 Streaming summary for document:', targetId);
+    setText('');
+    setSummary(null);
+    setError(null);
+    setStatus('streaming');
+
+    const source = new EventSource(
+      `http://localhost:8000/documents/${targetId}/summarize/stream?summary_type=${summaryType}`
+    );
+    sourceRef.current = source;
+
+    source.addEventListener('token', (event) => {
+      const { text: piece } = JSON.parse(event.data);
+      setText((previous) => previous + piece);
+    });
+
+    source.addEventListener('done', (event) => {
+      console.log('✅ Summary stream complete');
+      setSummary(JSON.parse(event.data));
+      setStatus('complete');
+      stop();
+    });
+
+    source.addEventListener('error', (event) => {
+      // Server-sent error events carry a detail; connection errors don't
+      const detail = event.data ? JSON.parse(event.data).detail : 'Connection lost';
+      console.error('❌ Summary stream failed:', detail);
+      setError(detail);
+      setStatus('error');
+      stop();
+    });
+  }, [documentId, stop]);
+
+  useEffect(() => stop, [stop]); // Close the stream on unmount
+
+  return {
+    text,
+    summary,
+    status,
+    error,
+    isStreaming: status === 'streaming',
+    start,
+    stop
+  };
+};
+
+export default useSummaryStream;